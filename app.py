@@ -17,42 +17,442 @@ Licencia: MIT
 """
 
 import os
+import gzip
+import hashlib
+import hmac
+import json
 import subprocess
+import threading
 from datetime import datetime
-from flask import Flask, render_template, request, jsonify, redirect, url_for, send_file, abort
+from functools import wraps
+from flask import Flask, render_template, request, jsonify, redirect, url_for, send_file, abort, Response, stream_with_context, make_response, g
+from flask.json.provider import DefaultJSONProvider
 import platform
 import re
 
+# Dependencias opcionales: compresión Brotli y serialización JSON rápida
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
 # Importar el nuevo sistema de almacenamiento SQLite
 from storage import get_storage
+from scanner import walk_drive, list_directories, get_volume_info_windows
+from maintenance import MaintenanceScheduler, DeletionReclaimer
+from watcher import DriveWatcher
+from profiling import RequestProfiler
+
+class FastJSONProvider(DefaultJSONProvider):
+    """
+    Serializador JSON para respuestas grandes.
+    
+    Salida compacta, sin ordenar claves y con UTF-8 sin escapar (más pequeña para
+    rutas con acentos). Usa orjson si está instalado, con las opciones que
+    reproducen la salida de Flask: las fechas pasan por ``default`` (formato
+    HTTP, no ISO 8601) y las claves no textuales se convierten a texto. La única
+    diferencia es que orjson escribe ``null`` para NaN e infinito.
+    """
+    compact = True
+    sort_keys = False
+    ensure_ascii = False
+    
+    def dumps(self, obj, **kwargs):
+        # Con opciones explícitas (ej: sort_keys) se usa el serializador estándar
+        if orjson is not None and not kwargs:
+            return orjson.dumps(obj, default=self.default,
+                                option=orjson.OPT_PASSTHROUGH_DATETIME
+                                | orjson.OPT_NON_STR_KEYS).decode('utf-8')
+        return super().dumps(obj, **kwargs)
+
 
 app = Flask(__name__)
+app.json = FastJSONProvider(app)
 
 # Configuración
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 
+# Compresión de respuestas: tamaño mínimo y tipos comprimibles
+COMPRESS_MIN_SIZE = 500
+COMPRESS_MIMETYPES = ('application/json', 'text/html', 'text/css', 'application/javascript')
+
+# Máximo de resultados devueltos por /search
+SEARCH_RESULTS_LIMIT = 100
+
+# Segundos disponibles para cada búsqueda antes de abandonarla sin resultados
+SEARCH_TIMEOUT = 2.0
+
+# Catálogos por página en el historial (la primera se incluye en la página principal)
+CATALOGS_PAGE_SIZE = 50
+CATALOGS_MAX_PAGE_SIZE = 500
+
+# Campos del historial que necesita la página principal
+HISTORY_FIELDS = ['serial_number', 'volume_name', 'drive_path', 'scan_date',
+                  'total_files', 'total_bytes']
+
 # Inicializar el sistema de almacenamiento
 storage = get_storage()
 
 print("Sistema de almacenamiento SQLite inicializado correctamente")
 
+# Mantenimiento de la base de datos en los periodos sin peticiones
+maintenance = MaintenanceScheduler(storage)
+
+# Borrado en segundo plano de los catálogos eliminados
+reclaimer = DeletionReclaimer(storage)
+reclaimer_checked = threading.Event()
+
+# Vigilancia en vivo de unidades conectadas (serial -> DriveWatcher)
+watchers = {}
+watchers_lock = threading.Lock()
+
+# Perfilado por muestreo bajo demanda (cabecera X-Profile, interruptor o umbral)
+profiler = RequestProfiler()
+
+# Token que habilita /admin/* y la cabecera X-Profile (cabecera X-Admin-Token).
+# Sin token configurado quedan desactivados: detrás de un proxy inverso todas
+# las peticiones llegan desde 127.0.0.1, así que la dirección no identifica al
+# administrador.
+ADMIN_TOKEN = os.environ.get('SCANFOLDER_ADMIN_TOKEN') or None
+
+def negotiate_encoding():
+    """
+    Elige la codificación de compresión según la cabecera Accept-Encoding.
+    
+    Returns:
+        str|None: 'br', 'gzip' o None si el cliente no acepta ninguna
+    """
+    accepted = request.accept_encodings
+    if brotli is not None and accepted['br']:
+        return 'br'
+    if accepted['gzip']:
+        return 'gzip'
+    return None
+
+def not_modified(etag):
+    """
+    Devuelve una respuesta 304 si el cliente ya tiene la versión indicada.
+    
+    Acepta tanto la ETag base como la variante con sufijo de compresión
+    ('-gzip', '-br') que añade ``compress_response``.
+    
+    Args:
+        etag (str): ETag fuerte de la representación actual
+        
+    Returns:
+        Response|None: Respuesta 304 o None si hay que generar el contenido
+    """
+    encoding = negotiate_encoding()
+    candidates = [etag] + ([f"{etag}-{encoding}"] if encoding else [])
+    for candidate in candidates:
+        if request.if_none_match.contains(candidate):
+            response = app.response_class(status=304)
+            response.set_etag(candidate)
+            response.headers['Cache-Control'] = 'no-cache'
+            response.vary.add('Accept-Encoding')
+            return response
+    return None
+
+def catalog_etag(view):
+    """
+    Decorador para vistas que solo dependen de los catálogos y de la URL.
+    
+    La ETag se deriva de ``storage.get_catalog_version()``, de modo que una
+    petición condicional que coincide recibe un 304 tras leer una sola fila, sin
+    ejecutar la consulta de la vista. Si la versión no se puede leer, la
+    respuesta se genera sin ETag.
+    """
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        etag = storage.get_catalog_version()
+        if not etag:
+            return view(*args, **kwargs)
+        cached = not_modified(etag)
+        if cached is not None:
+            return cached
+        
+        response = make_response(view(*args, **kwargs))
+        # Las búsquedas interrumpidas no se cachean: la siguiente puede completarse
+        if response.status_code == 200 and 'X-Search-Truncated' not in response.headers:
+            response.set_etag(etag)
+            response.headers['Cache-Control'] = 'no-cache'
+        return response
+    return wrapper
+
+class SearchRegistry:
+    """
+    Búsquedas en curso por sesión del navegador.
+    
+    Cuando llega una búsqueda nueva de la misma sesión, la anterior se cancela
+    (su consulta SQLite se interrumpe en el siguiente progress handler), así las
+    ráfagas de escritura no acumulan recorridos completos de la tabla.
+    """
+    
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._active = {}
+    
+    def start(self, session_id):
+        """Registra una búsqueda y cancela la anterior de la sesión."""
+        event = threading.Event()
+        if not session_id:
+            return event
+        with self._lock:
+            previous = self._active.get(session_id)
+            if previous is not None:
+                previous.set()
+            self._active[session_id] = event
+        return event
+    
+    def finish(self, session_id, event):
+        """Elimina la búsqueda del registro si sigue siendo la más reciente."""
+        if not session_id:
+            return
+        with self._lock:
+            if self._active.get(session_id) is event:
+                del self._active[session_id]
+
+searches = SearchRegistry()
+
+class _Flight:
+    """Ejecución compartida de una búsqueda y los eventos de cancelación de sus clientes."""
+    
+    def __init__(self, lock):
+        self.done = threading.Event()
+        self.outcome = None
+        # ``waiters`` crece bajo el bloqueo del SearchCoalescer mientras el
+        # progress handler de la consulta lo recorre desde otro hilo
+        self._lock = lock
+        self.waiters = []
+    
+    def is_set(self):
+        # La consulta compartida solo se cancela si todos sus clientes la abandonaron
+        with self._lock:
+            return all(event.is_set() for event in self.waiters)
+
+
+class SearchCoalescer:
+    """
+    Agrupa búsquedas idénticas simultáneas en una sola consulta (single-flight).
+    
+    La primera petición de una clave ejecuta la búsqueda; las que llegan
+    mientras está en curso esperan y reciben el mismo resultado en lugar de
+    competir por las mismas páginas de SQLite.
+    """
+    
+    def __init__(self, search):
+        self._search = search
+        self._lock = threading.Lock()
+        self._inflight = {}
+        self.executed = 0
+        self.coalesced = 0
+    
+    @staticmethod
+    def key(query, serial, generation, limit):
+        """Clave normalizada: la búsqueda ya ignora mayúsculas y espacios extremos."""
+        return (query.strip().lower(), serial, generation, limit)
+    
+    def run(self, key, cancel_event, **kwargs):
+        """
+        Ejecuta la búsqueda o se une a una idéntica en curso.
+        
+        Args:
+            key (tuple): Clave devuelta por ``SearchCoalescer.key``
+            cancel_event (threading.Event): Cancelación de esta petición
+            **kwargs: Argumentos para la función de búsqueda (sin ``cancel_event``)
+            
+        Returns:
+            Dict: Resultado de ``search_directories_bounded``
+        """
+        with self._lock:
+            flight = self._inflight.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._inflight[key] = _Flight(self._lock)
+                self.executed += 1
+            else:
+                self.coalesced += 1
+            flight.waiters.append(cancel_event)
+        
+        if leader:
+            try:
+                flight.outcome = self._search(cancel_event=flight, **kwargs)
+            finally:
+                with self._lock:
+                    del self._inflight[key]
+                flight.done.set()
+            return flight.outcome
+        
+        # Seguidor: esperar al resultado compartido salvo que esta petición se cancele
+        while not flight.done.wait(0.05):
+            if cancel_event.is_set():
+                return {'results': [], 'truncated': True, 'cancelled': True}
+        if flight.outcome is None:
+            return {'results': [], 'truncated': True, 'cancelled': False}
+        return flight.outcome
+    
+    def get_stats(self):
+        """Contadores de consultas ejecutadas y peticiones agrupadas."""
+        with self._lock:
+            return {
+                'executed': self.executed,
+                'coalesced': self.coalesced,
+                'in_flight': len(self._inflight)
+            }
+
+search_flights = SearchCoalescer(lambda **kwargs: storage.search_directories_bounded(**kwargs))
+
+@app.before_request
+def start_profile():
+    """Empieza a perfilar la petición si está activado o la pide un administrador."""
+    g.profile = profiler.begin(f"{request.method} {request.full_path.rstrip('?')}",
+                               force=request.headers.get('X-Profile') == '1' and is_admin_request())
+
+@app.teardown_request
+def end_profile(exc):
+    profiler.end(g.pop('profile', None), 500 if exc is not None else getattr(g, 'status', None))
+
+@app.before_request
+def track_activity():
+    """Arranca el planificador de mantenimiento y registra la petición en curso."""
+    maintenance.start()
+    if not reclaimer_checked.is_set():
+        # Borrados que quedaron a medias al detener el servidor
+        reclaimer_checked.set()
+        if storage.get_pending_deletions():
+            reclaimer.wake()
+    maintenance.request_started()
+
+@app.teardown_request
+def track_activity_end(exc):
+    maintenance.request_finished()
+
+@app.after_request
+def profile_response(response):
+    """Anota el estado de la respuesta y devuelve el id del perfil pedido por cabecera."""
+    g.status = response.status_code
+    capture = g.get('profile')
+    if capture is not None and capture.trigger == 'header':
+        response.headers['X-Profile-Id'] = str(capture.id)
+    return response
+
+@app.after_request
+def compress_response(response):
+    """
+    Comprime las respuestas JSON/HTML con Brotli o gzip según el cliente.
+    
+    Las respuestas en streaming (exportaciones), las pequeñas y las ya
+    codificadas se envían sin cambios. Si la respuesta tiene ETag fuerte, se le
+    añade el sufijo de la codificación para distinguir las representaciones.
+    """
+    response.vary.add('Accept-Encoding')
+    if (response.status_code != 200
+            or response.direct_passthrough
+            or response.is_streamed
+            or 'Content-Encoding' in response.headers
+            or response.mimetype not in COMPRESS_MIMETYPES):
+        return response
+    
+    encoding = negotiate_encoding()
+    if encoding is None:
+        return response
+    
+    data = response.get_data()
+    if len(data) < COMPRESS_MIN_SIZE:
+        return response
+    
+    if encoding == 'br':
+        data = brotli.compress(data, quality=5)
+    else:
+        data = gzip.compress(data, compresslevel=6)
+    
+    response.set_data(data)
+    response.headers['Content-Encoding'] = encoding
+    etag, weak = response.get_etag()
+    if etag and not weak:
+        response.set_etag(f"{etag}-{encoding}")
+    return response
+
 @app.route('/')
 def index():
     """
     Renderiza la página principal de la aplicación.
     
-    Carga el historial de escaneos desde la base de datos SQLite y las unidades
-    disponibles en el sistema para mostrar en la interfaz web.
+    Carga la primera página del historial de escaneos desde la base de datos
+    SQLite y las unidades disponibles en el sistema para mostrar en la interfaz
+    web. Las páginas siguientes las pide el navegador a ``/catalogs``.
     
     Returns:
         str: HTML renderizado de la página principal con historial y unidades
+    
+    Note:
+        La ETag combina la versión de los catálogos, las unidades conectadas, el
+        progreso de los borrados pendientes y el año del pie de página; si
+        coincide se responde 304 sin listar los catálogos ni renderizar la
+        plantilla.
     """
-    history = storage.get_scan_history()
     drives = get_drives()
     now = datetime.now()
-    return render_template('index.html', history=history, drives=drives, now=now)
+    pending_deletions = storage.get_pending_deletions()
+    page_hash = hashlib.blake2b(json.dumps([drives, pending_deletions], sort_keys=True,
+                                           default=str).encode('utf-8'),
+                                digest_size=8).hexdigest()
+    etag = f"{storage.get_catalog_version()}-{page_hash}-{now.year}"
+    cached = not_modified(etag)
+    if cached is not None:
+        return cached
+    
+    # Solo la primera página del historial; el resto se pide a /catalogs al desplazarse
+    history = storage.list_catalogs(limit=CATALOGS_PAGE_SIZE, fields=HISTORY_FIELDS)
+    history = history or {'catalogs': [], 'next': None, 'total': 0}
+    response = make_response(render_template('index.html', history=history, drives=drives, now=now,
+                                             pending_deletions=pending_deletions,
+                                             history_fields=HISTORY_FIELDS,
+                                             page_size=CATALOGS_PAGE_SIZE))
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+@app.route('/catalogs')
+@catalog_etag
+def list_catalogs():
+    """
+    Lista los catálogos por páginas.
+    
+    Query Parameters:
+        sort (str, optional): 'date' (por defecto), 'name' o 'size'
+        order (str, optional): 'desc' (por defecto) o 'asc'
+        q (str, optional): Texto contenido en el nombre o el serial
+        after (str, optional): Cursor ``next`` de la página anterior
+        limit (int, optional): Catálogos por página (por defecto 50, máximo 500)
+        fields (str, optional): Campos separados por comas (por defecto todos)
+        
+    Returns:
+        JSON: ``{'success': True, 'catalogs': [...], 'next': cursor|None}`` y,
+        en la primera página, ``total``
+    """
+    try:
+        limit = min(CATALOGS_MAX_PAGE_SIZE, max(1, int(request.args.get('limit', CATALOGS_PAGE_SIZE))))
+    except ValueError:
+        return jsonify({'success': False, 'error': 'Parámetros numéricos inválidos'}), 400
+    fields = [f.strip() for f in request.args.get('fields', '').split(',') if f.strip()] or None
+    
+    page = storage.list_catalogs(sort=request.args.get('sort', 'date'),
+                                 descending=request.args.get('order', 'desc') != 'asc',
+                                 name_filter=request.args.get('q', '').strip() or None,
+                                 after=request.args.get('after') or None,
+                                 limit=limit, fields=fields)
+    if page is None:
+        return jsonify({'success': False, 'error': 'Orden, campos o cursor no válidos'}), 400
+    return jsonify({'success': True, **page})
 
 @app.route('/search', methods=['GET'])
+@catalog_etag
 def search():
     """
     Realiza búsquedas de directorios en todos los catálogos almacenados.
@@ -62,6 +462,9 @@ def search():
     
     Args:
         q (str): Término de búsqueda obtenido de query parameter
+        serial (str, optional): Limitar la búsqueda a un catálogo
+        generation (int, optional): Buscar en una generación anterior del
+            catálogo indicado en 'serial' (404 si no existe o ya se compactó)
         
     Returns:
         JSON: Lista de resultados con formato compatible con el frontend
@@ -72,72 +475,55 @@ def search():
                 'full_path': str    # Ruta completa del directorio
             }
         ]
+    
+    Note:
+        Cada búsqueda dispone de ``SEARCH_TIMEOUT`` segundos. Si se agotan, o si
+        la misma sesión (cabecera ``X-Search-Session``) lanza una búsqueda nueva,
+        se devuelve una lista vacía con la cabecera ``X-Search-Truncated: 1``
+        (y ``X-Search-Cancelled: 1`` si fue sustituida): SQLite ordena todas las
+        coincidencias antes de devolver la primera, así que no hay resultados
+        parciales que enviar.
     """
     query = request.args.get('q', '').strip()
     if not query or len(query) < 2:
         return jsonify([])
 
-    results = storage.search_directories(query)
+    serial = request.args.get('serial') or None
+    generation = request.args.get('generation', type=int)
+    if generation is not None and not serial:
+        return jsonify({'error': 'La búsqueda por generación requiere un serial'}), 400
+    if generation is not None and not storage.has_generation(serial, generation):
+        # Una generación compactada ya no puede reconstruirse
+        return jsonify({'error': 'Generación no disponible (no existe o ya se compactó)'}), 404
+
+    session_id = request.headers.get('X-Search-Session')
+    cancel_event = searches.start(session_id)
+    try:
+        # Limitar resultados y tiempo en SQLite para evitar sobrecarga
+        # Las búsquedas idénticas simultáneas comparten una sola consulta
+        key = SearchCoalescer.key(query, serial, generation, SEARCH_RESULTS_LIMIT)
+        outcome = search_flights.run(key, cancel_event, search_term=query,
+                                     serial_number=serial, generation=generation,
+                                     limit=SEARCH_RESULTS_LIMIT, timeout=SEARCH_TIMEOUT)
+    finally:
+        searches.finish(session_id, cancel_event)
     
     # Formatear resultados para compatibilidad con el frontend
     formatted_results = []
-    for result in results:
+    for result in outcome['results']:
+        path = result['directory_path']
         formatted_results.append({
             'catalog': result.get('volume_name', 'Desconocido'),
-            'path': result['directory_path'].split('\\')[-1] if '\\' in result['directory_path'] else result['directory_path'].split('/')[-1],
-            'full_path': result['directory_path']
+            'path': path.rsplit('\\', 1)[-1] if '\\' in path else path.rsplit('/', 1)[-1],
+            'full_path': path
         })
 
-    return jsonify(formatted_results[:100])  # Limitar resultados para evitar sobrecarga
-
-def get_volume_info_windows(drive_letter):
-    """
-    Obtiene información del volumen de Windows usando el comando 'vol'.
-    
-    Extrae el número de serie único del volumen y su etiqueta/descripción
-    ejecutando el comando 'vol' del sistema y parseando su salida con
-    expresiones regulares.
-    
-    Args:
-        drive_letter (str): Letra de la unidad (ej: 'C', 'D', 'E')
-        
-    Returns:
-        tuple: (descripción, serial) donde:
-            - descripción (str|None): Etiqueta del volumen o None si no se encuentra
-            - serial (str|None): Número de serie del volumen o None si no se encuentra
-            
-    Note:
-        Específico para Windows. Usa codificación 'latin-1' para manejar
-        caracteres especiales en etiquetas de volumen.
-    """
-    try:
-        # Ejecutar comando 'vol' con codificación 'latin-1'
-        cmd = f'vol {drive_letter}:'
-        result = subprocess.run(cmd, shell=True, capture_output=True, text=True, encoding='latin-1', errors='ignore')
-        
-        print("=== Salida del comando 'vol' ===")
-        print(result.stdout)
-        print("================================")
-
-        if result.returncode != 0:
-            print("Error: Comando 'vol' falló.")
-            return None, None
-
-        # Extraer serial (ej: "44FA-62AA")
-        serial_match = re.search(r'([A-Z0-9]{4}-[A-Z0-9]{4})', result.stdout)
-        serial = serial_match.group(0) if serial_match else None
-
-        # Extraer descripción (ej: "Fotograf¡a DobleA")
-        desc_match = re.search(r'(?:es\s|is\s)(.+)', result.stdout)
-        description = desc_match.group(1).strip() if desc_match else None
-
-        print(f"Descripción extraída: {description}")
-        print(f"Serial extraído: {serial}")
-        return description, serial
-
-    except Exception as e:
-        print(f"Error en get_volume_info_windows: {str(e)}")
-        return None, None
+    response = jsonify(formatted_results)
+    if outcome['truncated']:
+        response.headers['X-Search-Truncated'] = '1'
+    if outcome['cancelled']:
+        response.headers['X-Search-Cancelled'] = '1'
+    return response
 
 @app.route('/scan', methods=['POST'])
 def scan_disk():
@@ -151,6 +537,8 @@ def scan_disk():
     Form Parameters:
         drive_path (str): Ruta de la unidad a escanear (ej: 'C:\\', 'D:\\')
         catalog_name (str, optional): Nombre personalizado para el catálogo
+        include_files (str, optional): 'true' para recopilar número y tamaño
+            de archivos por carpeta (recorrido más lento)
         
     Returns:
         JSON: Respuesta con el resultado de la operación
@@ -161,11 +549,13 @@ def scan_disk():
         - Usa comandos del sistema específicos por plataforma
         - Windows: 'dir /s /b /ad' para listar solo directorios  
         - Linux/macOS: 'find -type d' para búsqueda recursiva
+        - Con include_files se recorre la unidad con os.scandir
         - Actualiza escaneos existentes basándose en el número de serie del volumen
     """
     try:
         drive_path = request.form.get('drive_path')
         catalog_name = request.form.get('catalog_name', f"Disco_{datetime.now().strftime('%Y%m%d')}")
+        include_files = request.form.get('include_files', '').lower() in ('1', 'true', 'on')
 
         # Validar unidad
         if not drive_path or not os.path.exists(drive_path):
@@ -177,23 +567,21 @@ def scan_disk():
             return jsonify({"error": "No se pudo obtener el serial"}), 400
 
         # Escanear la estructura de carpetas
-        system = platform.system()
-        if system == 'Windows':
-            command = f'dir "{drive_path}" /s /b /ad'  # Solo directorios
-        elif system in ('Linux', 'Darwin'):
-            command = f'find "{drive_path}" -type d -print'
+        file_stats = None
+        if include_files:
+            folders, file_stats = walk_drive(drive_path)
         else:
-            return jsonify({"error": "Sistema no soportado"}), 400
-
-        result = subprocess.run(command, shell=True, capture_output=True, text=True, encoding='latin-1')
-        folders = [line.strip() for line in result.stdout.splitlines() if line.strip()]
+            folders = list_directories(drive_path)
+            if folders is None:
+                return jsonify({"error": "Sistema no soportado"}), 400
 
         # Guardar el escaneo usando el nuevo sistema de almacenamiento
         success = storage.add_scan(
             serial_number=serial,
             volume_name=description or catalog_name,
             drive_path=drive_path,
-            directories=folders
+            directories=folders,
+            file_stats=file_stats
         )
 
         if success:
@@ -267,8 +655,9 @@ def get_drives():
     return drives
 
 @app.route('/catalog/<serial>')
+@catalog_etag
 def view_catalog(serial):
-    """Ver detalles de un catálogo específico"""
+    """Ver detalles de un catálogo específico (opcionalmente en una generación anterior)"""
     try:
         # Obtener información del escaneo
         scan_info = storage.get_scan_by_serial(serial)
@@ -279,8 +668,23 @@ def view_catalog(serial):
                 "data": None
             }), 404
 
+        # Vista "a fecha de" una generación conservada
+        generation = request.args.get('generation', type=int)
+        if generation is not None and generation != scan_info.get('generation'):
+            generation_info = next((g for g in storage.list_generations(serial)
+                                    if g['generation'] == generation), None)
+            if not generation_info:
+                return jsonify({
+                    "status": "error",
+                    "message": "Generación no disponible",
+                    "data": None
+                }), 404
+            scan_info = {**scan_info, **generation_info}
+        else:
+            generation = None
+
         # Obtener algunos directorios de muestra
-        directories = storage.get_directories_by_scan(scan_info['id'])
+        directories = storage.get_directories_by_scan(scan_info['id'], generation=generation)
         sample_directories = directories[:10]  # Primeras 10 carpetas
 
         # Estructura de respuesta
@@ -290,6 +694,9 @@ def view_catalog(serial):
             "serial": serial,
             "scan_date": scan_info.get("scan_date", ""),
             "total_folders": scan_info.get("total_directories", 0),
+            "total_files": scan_info.get("total_files"),
+            "total_bytes": scan_info.get("total_bytes"),
+            "generation": scan_info.get("generation"),
             "sample_folders": sample_directories
         }
 
@@ -306,9 +713,103 @@ def view_catalog(serial):
             "data": None
         }), 500
 
+@app.route('/catalog/<serial>/generations')
+def catalog_generations(serial):
+    """Listar las generaciones conservadas de un catálogo"""
+    if not storage.get_scan_by_serial(serial):
+        return jsonify({'success': False, 'error': 'Catálogo no encontrado'}), 404
+    return jsonify({'success': True, 'generations': storage.list_generations(serial)})
+
+@app.route('/catalog/<serial>/diff')
+def catalog_diff(serial):
+    """
+    Comparar dos generaciones de un catálogo.
+    
+    Query Parameters:
+        from (int): Generación de origen
+        to (int, optional): Generación de destino (por defecto la vigente)
+    """
+    from_generation = request.args.get('from', type=int)
+    to_generation = request.args.get('to', type=int)
+    if from_generation is None:
+        return jsonify({'success': False, 'error': 'Generación de origen no especificada'}), 400
+    
+    diff = storage.diff_generations(serial, from_generation, to_generation)
+    if diff is None:
+        return jsonify({'success': False, 'error': 'Catálogo o generación no disponible'}), 404
+    return jsonify({'success': True, **diff})
+
+@app.route('/catalog/<serial>/size')
+def directory_size(serial):
+    """
+    Tamaño acumulado de una carpeta de un catálogo (parámetro 'path').
+    
+    Responde desde los acumulados precalculados, sin necesidad de que la
+    unidad esté conectada.
+    """
+    path = request.args.get('path', '')
+    if not path:
+        return jsonify({'success': False, 'error': 'Ruta no especificada'}), 400
+    
+    size_info = storage.get_directory_size(serial, path)
+    if not size_info:
+        return jsonify({'success': False, 'error': 'Carpeta no encontrada en el catálogo'}), 404
+    
+    return jsonify({'success': True, **size_info})
+
+@app.route('/duplicates')
+def duplicates():
+    """
+    Lista carpetas con contenido idéntico presentes en varios catálogos.
+    
+    Solo incluye los duplicados máximos: las subcarpetas de un subárbol
+    duplicado no forman grupos propios.
+    
+    Query Parameters:
+        min_dirs (int, optional): Mínimo de subcarpetas del subárbol (por defecto 1)
+        limit (int, optional): Máximo de grupos a devolver (por defecto 100)
+    """
+    try:
+        min_dirs = max(0, int(request.args.get('min_dirs', 1)))
+        limit = min(1000, max(1, int(request.args.get('limit', 100))))
+    except ValueError:
+        return jsonify({'success': False, 'error': 'Parámetros numéricos inválidos'}), 400
+    
+    groups = storage.find_duplicate_directories(min_directories=min_dirs, limit=limit)
+    return jsonify({'success': True, 'groups': groups})
+
+@app.route('/stats')
+def stats():
+    """
+    Estadísticas de la base de datos y del servidor de búsquedas.
+    
+    Con ``serve.py`` cada proceso de trabajo tiene su propia memoria: la base
+    de datos es común, pero ``search`` y ``worker`` describen solo el proceso que
+    atiende la petición (``scope: 'worker'`` y su ``pid``).
+    
+    Returns:
+        JSON: Estadísticas de ``storage.get_database_stats()`` (incluido el
+        historial de mantenimiento) más ``search`` con las consultas ejecutadas,
+        las peticiones agrupadas en una consulta idéntica en curso y las que
+        siguen en ejecución, y ``worker`` con el proceso, si planifica el
+        mantenimiento y sus unidades vigiladas
+    """
+    with watchers_lock:
+        watching = len(watchers)
+    return jsonify({
+        **storage.get_database_stats(),
+        'search': {**search_flights.get_stats(), 'scope': 'worker', 'pid': os.getpid()},
+        'worker': {'pid': os.getpid(), 'maintenance': maintenance.enabled, 'watchers': watching}
+    })
+
 @app.route('/delete_catalog', methods=['POST'])
 def delete_catalog():
-    """Eliminar un catálogo específico"""
+    """
+    Eliminar un catálogo específico.
+    
+    El catálogo deja de aparecer inmediatamente; el progreso del borrado de sus
+    directorios se consulta en ``/stats`` (``pending_deletions``).
+    """
     serial = request.form.get('serial')
     if not serial:
         return jsonify({'success': False, 'error': 'Serial no especificado'}), 400
@@ -320,14 +821,77 @@ def delete_catalog():
     
     try:
         # Eliminar el escaneo y todos sus directorios asociados
+        # El catálogo desaparece al instante; sus directorios se borran en segundo plano
         success = storage.delete_scan(serial)
         if success:
+            stop_watcher(serial)
+            reclaimer.wake()
             return jsonify({'success': True})
         else:
             return jsonify({'success': False, 'error': 'Error al eliminar el catálogo'}), 500
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
 
+def stop_watcher(serial):
+    """Detiene la vigilancia en vivo de un catálogo si está activa."""
+    with watchers_lock:
+        watcher = watchers.pop(serial, None)
+    if watcher is not None:
+        watcher.stop(timeout=5)
+
+@app.route('/watchers')
+def list_watchers():
+    """Estado de la vigilancia en vivo de cada unidad (solo las de este proceso)."""
+    with watchers_lock:
+        current = list(watchers.values())
+    return jsonify({'success': True, 'scope': 'worker', 'pid': os.getpid(),
+                    'watchers': [w.status() for w in current]})
+
+@app.route('/watch_catalog', methods=['POST'])
+def watch_catalog():
+    """
+    Inicia la vigilancia en vivo de la unidad de un catálogo.
+    
+    Form Parameters:
+        serial (str): Número de serie del catálogo
+        drive_path (str, optional): Punto de montaje actual de la unidad
+            (por defecto el guardado en el catálogo)
+        verify_serial (str, optional): '0' para no exigir que el serial del
+            volumen montado coincida con el del catálogo (seriales elegidos a
+            mano en Linux o macOS)
+    """
+    serial = request.form.get('serial')
+    if not serial:
+        return jsonify({'success': False, 'error': 'Serial no especificado'}), 400
+    
+    scan_info = storage.get_scan_by_serial(serial)
+    if not scan_info:
+        return jsonify({'success': False, 'error': 'Catálogo no encontrado'}), 404
+    
+    drive_path = request.form.get('drive_path') or scan_info['drive_path']
+    verify_serial = request.form.get('verify_serial', '1') != '0'
+    
+    with watchers_lock:
+        existing = watchers.get(serial)
+        if existing is not None and existing.running:
+            return jsonify({'success': True, 'watcher': existing.status()})
+        # El watcher comprueba que la unidad conectada es la del catálogo
+        watcher = DriveWatcher(storage, serial, root=drive_path, verify_serial=verify_serial)
+        if not watcher.start():
+            return jsonify({'success': False, 'error': watcher.last_error}), 409
+        watchers[serial] = watcher
+    
+    return jsonify({'success': True, 'watcher': watcher.status()})
+
+@app.route('/unwatch_catalog', methods=['POST'])
+def unwatch_catalog():
+    """Detiene la vigilancia en vivo de un catálogo (aplica los cambios pendientes)."""
+    serial = request.form.get('serial')
+    if not serial:
+        return jsonify({'success': False, 'error': 'Serial no especificado'}), 400
+    stop_watcher(serial)
+    return jsonify({'success': True})
+
 @app.route('/eject_drive', methods=['POST'])
 def eject_drive():
     drive_path = request.form.get('drive_path')
@@ -338,6 +902,13 @@ def eject_drive():
     if drive_path.strip().upper().startswith('C:') or drive_path.strip() == '/':
         return jsonify({'success': False, 'error': 'No se puede expulsar la unidad del sistema'}), 400
 
+    # Aplicar los cambios pendientes de la vigilancia antes de desmontar
+    with watchers_lock:
+        watched = [serial for serial, w in watchers.items()
+                   if w.root and w.root.upper().startswith(drive_path.strip().rstrip('\\/').upper())]
+    for serial in watched:
+        stop_watcher(serial)
+
     system = platform.system()
     try:
         if system == 'Windows':
@@ -379,8 +950,18 @@ def eject_drive():
 
 @app.route('/get_drives')
 def get_drives_api():
+    """Unidades disponibles; responde 304 si no han cambiado desde la última consulta"""
     drives = get_drives()
-    return jsonify(drives)
+    etag = hashlib.blake2b(json.dumps(drives, sort_keys=True).encode('utf-8'),
+                           digest_size=8).hexdigest()
+    cached = not_modified(etag)
+    if cached is not None:
+        return cached
+    
+    response = jsonify(drives)
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
 
 @app.route('/update_catalog', methods=['POST'])
 def update_catalog():
@@ -399,24 +980,22 @@ def update_catalog():
         return jsonify({'success': False, 'error': 'La unidad original no está conectada'}), 400
     
     try:
-        # Rescanear la unidad
-        system = platform.system()
-        if system == 'Windows':
-            command = f'dir "{drive_path}" /s /b /ad'
-        elif system in ('Linux', 'Darwin'):
-            command = f'find "{drive_path}" -type d -print'
+        # Rescanear la unidad (con archivos si el catálogo original los incluía)
+        file_stats = None
+        if scan_info.get('total_bytes') is not None:
+            folders, file_stats = walk_drive(drive_path)
         else:
-            return jsonify({'success': False, 'error': 'Sistema operativo no soportado'}), 500
-        
-        result = subprocess.run(command, shell=True, capture_output=True, text=True, encoding='latin-1')
-        folders = [line.strip() for line in result.stdout.splitlines() if line.strip()]
+            folders = list_directories(drive_path)
+            if folders is None:
+                return jsonify({'success': False, 'error': 'Sistema operativo no soportado'}), 500
         
         # Actualizar el escaneo con los nuevos directorios
         success = storage.add_scan(
             serial_number=serial,
             volume_name=scan_info.get('volume_name', ''),
             drive_path=drive_path,
-            directories=folders
+            directories=folders,
+            file_stats=file_stats
         )
         
         if success:
@@ -444,16 +1023,8 @@ def rename_catalog():
         return jsonify({'success': False, 'error': 'Catálogo no encontrado'}), 404
     
     try:
-        # Obtener todos los directorios del escaneo actual
-        directories = storage.get_directories_by_scan(scan_info['id'])
-        
-        # Actualizar el escaneo con el nuevo nombre
-        success = storage.add_scan(
-            serial_number=serial,
-            volume_name=new_name,
-            drive_path=scan_info.get('drive_path', ''),
-            directories=directories
-        )
+        # Actualizar solo el nombre; los directorios y sus tamaños no cambian
+        success = storage.rename_scan(serial, new_name)
         
         if success:
             return jsonify({'success': True, 'new_name': new_name})
@@ -463,5 +1034,123 @@ def rename_catalog():
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
 
+@app.route('/export_catalog/<serial>')
+def export_catalog(serial):
+    """
+    Descarga un catálogo como archivo NDJSON comprimido con gzip.
+    
+    La respuesta se genera en streaming desde la base de datos, por lo que
+    el uso de memoria no depende del tamaño del catálogo.
+    """
+    scan_info = storage.get_scan_by_serial(serial)
+    if not scan_info:
+        return jsonify({'success': False, 'error': 'Catálogo no encontrado'}), 404
+    
+    filename = f"{re.sub(r'[^A-Za-z0-9_.-]', '_', serial)}.ndjson.gz"
+    return Response(
+        stream_with_context(storage.iter_catalog_export(serial)),
+        mimetype='application/gzip',
+        headers={'Content-Disposition': f'attachment; filename="{filename}"'}
+    )
+
+@app.route('/import_catalog', methods=['POST'])
+def import_catalog():
+    """Importar un catálogo exportado previamente con /export_catalog"""
+    upload = request.files.get('file')
+    if not upload:
+        return jsonify({'success': False, 'error': 'Archivo no especificado'}), 400
+    
+    try:
+        result = storage.import_catalog(upload.stream)
+        if result:
+            return jsonify({'success': True, **result})
+        else:
+            return jsonify({'success': False, 'error': 'Archivo de catálogo inválido'}), 400
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+def is_admin_request():
+    """True si hay token de administración configurado y la petición lo trae."""
+    if ADMIN_TOKEN is None:
+        return False
+    token = request.headers.get('X-Admin-Token', '')
+    return hmac.compare_digest(token.encode('utf-8'), ADMIN_TOKEN.encode('utf-8'))
+
+def admin_only(view):
+    """Restringe una ruta de administración a peticiones con el token."""
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        if not is_admin_request():
+            abort(403)
+        return view(*args, **kwargs)
+    return wrapper
+
+@app.route('/admin/profiles')
+@admin_only
+def list_profiles():
+    """Configuración del perfilador y resumen de los perfiles guardados (de este proceso)."""
+    return jsonify({
+        'success': True,
+        'scope': 'worker',
+        'pid': os.getpid(),
+        'enabled': profiler.enabled,
+        'threshold_ms': None if profiler.threshold is None else profiler.threshold * 1000,
+        'interval_ms': profiler.interval * 1000,
+        'capacity': profiler.profiles.maxlen,
+        'profiles': profiler.list_profiles()
+    })
+
+@app.route('/admin/profiles/<int:profile_id>')
+@admin_only
+def download_profile(profile_id):
+    """
+    Descarga un perfil.
+    
+    Query Parameters:
+        format (str): 'folded' (por defecto, para flamegraph.pl/speedscope) o
+            'json' (resumen con las funciones más costosas)
+    """
+    profile = profiler.get_profile(profile_id)
+    if profile is None:
+        return jsonify({'success': False, 'error': 'Perfil no encontrado'}), 404
+    
+    if request.args.get('format') == 'json':
+        summary = {key: value for key, value in profile.items() if key != 'stacks'}
+        return jsonify({'success': True, **summary,
+                        'top_functions': profiler.top_functions(profile)})
+    return Response(
+        profiler.folded(profile),
+        mimetype='text/plain',
+        headers={'Content-Disposition': f'attachment; filename="profile-{profile_id}.folded"'}
+    )
+
+@app.route('/admin/profiling', methods=['POST'])
+@admin_only
+def configure_profiling():
+    """
+    Activa o desactiva el perfilado (solo en el proceso que atiende la petición).
+    
+    Form Parameters:
+        enabled (str, optional): '1' para perfilar todas las peticiones, '0' para dejar de hacerlo
+        threshold_ms (str, optional): Milisegundos a partir de los cuales se
+            perfila una petición lenta (vacío para desactivarlo)
+    """
+    threshold = profiler.threshold
+    if 'threshold_ms' in request.form:
+        value = request.form['threshold_ms'].strip()
+        try:
+            threshold = float(value) / 1000 if value else None
+        except ValueError:
+            return jsonify({'success': False, 'error': 'Umbral inválido'}), 400
+        if threshold is not None and threshold <= 0:
+            return jsonify({'success': False, 'error': 'Umbral inválido'}), 400
+    
+    profiler.threshold = threshold
+    if 'enabled' in request.form:
+        profiler.enabled = request.form['enabled'] == '1'
+    return jsonify({'success': True, 'scope': 'worker', 'pid': os.getpid(),
+                    'enabled': profiler.enabled,
+                    'threshold_ms': None if profiler.threshold is None else profiler.threshold * 1000})
+
 if __name__ == '__main__':
     app.run(debug=True)
\ No newline at end of file
@@ -0,0 +1,426 @@
+"""
+Interfaz de línea de comandos de ScanFolder
+===========================================
+
+Permite catalogar y consultar discos sin la interfaz web, pensada para tareas
+programadas (cron) e ingestas masivas. Usa ``ScanStorage`` directamente y no
+carga Flask; los módulos se importan solo cuando el comando los necesita, de
+modo que ``search`` arranca en pocas decenas de milisegundos.
+
+Uso:
+    python cli.py scan RUTA [--serial SERIAL] [--name NOMBRE] [--files]
+    python cli.py rescan SERIAL [--path RUTA] [--files | --no-files]
+    python cli.py import ARCHIVO [ARCHIVO ...]
+    python cli.py export SERIAL [-o ARCHIVO]
+    python cli.py search TÉRMINO [--serial SERIAL] [--generation N] [--json]
+    python cli.py stats [--json]
+    python cli.py maintenance [--vacuum-pages N] [--analysis-limit N] [--convert]
+    python cli.py watch SERIAL [--path RUTA] [--poll] [--poll-interval S]
+                           [--no-verify-serial]
+
+El progreso se escribe en stderr y los resultados en stdout.
+
+Códigos de salida:
+    0  Operación completada
+    1  Error durante la operación
+    2  Uso incorrecto (argumentos inválidos)
+    3  Catálogo no encontrado o búsqueda sin resultados
+
+Autor: Paulo Felix
+Versión: 1.0.0
+Licencia: MIT
+"""
+
+import argparse
+import json
+import logging
+import os
+import platform
+import sys
+import time
+
+EXIT_OK = 0
+EXIT_FAILURE = 1
+EXIT_USAGE = 2
+EXIT_NOT_FOUND = 3
+
+
+class Progress:
+    """
+    Indicador de progreso en stderr.
+
+    En una terminal reescribe la misma línea; redirigido a un archivo escribe
+    como mucho una línea por segundo para no inflar los logs de cron.
+    """
+
+    def __init__(self, label: str, unit: str = 'directorios', enabled: bool = True):
+        self.label = label
+        self.unit = unit
+        self.enabled = enabled
+        self.interactive = sys.stderr.isatty()
+        self.interval = 0.1 if self.interactive else 1.0
+        self._last = 0.0
+        self._count = 0
+        self._written = None
+
+    def __call__(self, count: int):
+        self._count = count
+        now = time.monotonic()
+        if self.enabled and now - self._last >= self.interval:
+            self._last = now
+            self._write()
+
+    def _write(self):
+        if self._count == self._written:
+            return
+        self._written = self._count
+        message = f"{self.label}: {self._count:,} {self.unit}"
+        if self.interactive:
+            sys.stderr.write(f"\r{message}")
+        else:
+            sys.stderr.write(f"{message}\n")
+        sys.stderr.flush()
+
+    def done(self):
+        if self.enabled:
+            self._write()
+            if self.interactive and self._written is not None:
+                sys.stderr.write("\n")
+            sys.stderr.flush()
+
+
+def _open_storage(args):
+    """Crea el almacenamiento solo cuando el comando lo necesita."""
+    from storage import ScanStorage
+    return ScanStorage(args.db) if args.db else ScanStorage()
+
+
+def _info(args, message: str):
+    if not args.quiet:
+        print(message, file=sys.stderr)
+
+
+def cmd_scan(args) -> int:
+    """Escanea una unidad y la guarda como catálogo (o nueva generación)."""
+    import scanner
+
+    if not os.path.exists(args.path):
+        _info(args, f"Error: la ruta {args.path} no existe o no es accesible")
+        return EXIT_FAILURE
+
+    serial, name = args.serial, args.name
+    if not serial:
+        # Solo Windows expone el serial del volumen (comando vol)
+        if platform.system() != 'Windows':
+            _info(args, "Error: --serial es obligatorio fuera de Windows")
+            return EXIT_USAGE
+        description, serial = scanner.get_volume_info_windows(args.path[0].upper())
+        name = name or description
+        if not serial:
+            _info(args, "Error: no se pudo obtener el serial del volumen; use --serial")
+            return EXIT_USAGE
+
+    return _scan_into(args, serial, name or serial, args.path, args.files)
+
+
+def cmd_rescan(args) -> int:
+    """Vuelve a escanear la unidad de un catálogo existente."""
+    storage = _open_storage(args)
+    scan_info = storage.get_scan_by_serial(args.serial)
+    if not scan_info:
+        _info(args, f"Error: catálogo {args.serial} no encontrado")
+        return EXIT_NOT_FOUND
+
+    drive_path = args.path or scan_info['drive_path']
+    if not drive_path or not os.path.exists(drive_path):
+        _info(args, f"Error: la unidad {drive_path} no está conectada")
+        return EXIT_FAILURE
+
+    include_files = args.files
+    if include_files is None:
+        include_files = scan_info.get('total_bytes') is not None
+
+    return _scan_into(args, args.serial, scan_info['volume_name'], drive_path,
+                      include_files, storage)
+
+
+def _scan_into(args, serial: str, name: str, drive_path: str,
+               include_files: bool, storage=None) -> int:
+    import scanner
+
+    started = time.monotonic()
+    progress = Progress(f"Escaneando {drive_path}", enabled=not args.quiet)
+    file_stats = None
+    if include_files:
+        folders, file_stats = scanner.walk_drive(drive_path, progress=progress)
+    else:
+        folders = scanner.list_directories(drive_path, progress=progress)
+        if folders is None:
+            progress.done()
+            _info(args, "Error: sistema operativo no soportado")
+            return EXIT_FAILURE
+    progress.done()
+
+    storage = storage or _open_storage(args)
+    progress = Progress(f"Guardando {serial}", enabled=not args.quiet)
+    success = storage.add_scan(serial, name, drive_path, folders, file_stats,
+                               progress=progress)
+    progress.done()
+    if not success:
+        _info(args, f"Error: no se pudo guardar el catálogo {serial}")
+        return EXIT_FAILURE
+
+    _info(args, f"Catálogo {serial}: {len(folders):,} directorios en "
+                f"{time.monotonic() - started:.1f} s")
+    return EXIT_OK
+
+
+def cmd_import(args) -> int:
+    """Importa uno o varios catálogos exportados (.ndjson.gz)."""
+    storage = _open_storage(args)
+    status = EXIT_OK
+
+    for path in args.files:
+        progress = Progress(f"Importando {path}", enabled=not args.quiet)
+        try:
+            if path == '-':
+                result = storage.import_catalog(sys.stdin.buffer, progress=progress)
+            else:
+                with open(path, 'rb') as fileobj:
+                    result = storage.import_catalog(fileobj, progress=progress)
+        except OSError as e:
+            result = None
+            _info(args, f"Error: {e}")
+        progress.done()
+
+        if result:
+            _info(args, f"Catálogo {result['serial_number']}: "
+                        f"{result['total_directories']:,} directorios importados")
+        else:
+            _info(args, f"Error: no se pudo importar {path}")
+            status = EXIT_FAILURE
+
+    return status
+
+
+def cmd_export(args) -> int:
+    """Exporta un catálogo a un archivo .ndjson.gz (o a stdout con '-')."""
+    storage = _open_storage(args)
+    if not storage.get_scan_by_serial(args.serial):
+        _info(args, f"Error: catálogo {args.serial} no encontrado")
+        return EXIT_NOT_FOUND
+
+    output = args.output or f"{args.serial}.ndjson.gz"
+    progress = Progress(f"Exportando {args.serial}", unit='bytes', enabled=not args.quiet)
+    written = 0
+    try:
+        fileobj = sys.stdout.buffer if output == '-' else open(output, 'wb')
+        try:
+            for chunk in storage.iter_catalog_export(args.serial):
+                fileobj.write(chunk)
+                written += len(chunk)
+                progress(written)
+        finally:
+            if fileobj is not sys.stdout.buffer:
+                fileobj.close()
+    except (OSError, KeyError) as e:
+        progress.done()
+        _info(args, f"Error al exportar: {e}")
+        return EXIT_FAILURE
+
+    progress.done()
+    return EXIT_OK
+
+
+def cmd_search(args) -> int:
+    """Busca carpetas en los catálogos y escribe una por línea en stdout."""
+    if args.generation is not None and not args.serial:
+        _info(args, "Error: --generation requiere --serial")
+        return EXIT_USAGE
+
+    storage = _open_storage(args)
+    if args.generation is not None and not storage.has_generation(args.serial, args.generation):
+        _info(args, f"Error: la generación {args.generation} no existe o ya se compactó")
+        return EXIT_NOT_FOUND
+    results = storage.search_directories(args.term, serial_number=args.serial,
+                                         generation=args.generation, limit=args.limit)
+
+    out = sys.stdout
+    for result in results:
+        if args.json:
+            out.write(json.dumps({
+                'serial_number': result['serial_number'],
+                'volume_name': result['volume_name'],
+                'directory_path': result['directory_path']
+            }, ensure_ascii=False) + "\n")
+        else:
+            out.write(f"{result['volume_name']}\t{result['serial_number']}\t"
+                      f"{result['directory_path']}\n")
+
+    return EXIT_OK if results else EXIT_NOT_FOUND
+
+
+def cmd_stats(args) -> int:
+    """Muestra las estadísticas de la base de datos."""
+    storage = _open_storage(args)
+    stats = storage.get_database_stats()
+    if not stats:
+        return EXIT_FAILURE
+
+    if args.json:
+        print(json.dumps(stats, ensure_ascii=False, default=str))
+    else:
+        for key, value in stats.items():
+            print(f"{key}: {value}")
+    return EXIT_OK
+
+
+def cmd_maintenance(args) -> int:
+    """Ejecuta una pasada de mantenimiento de la base de datos (para cron)."""
+    storage = _open_storage(args)
+    run = storage.run_maintenance(vacuum_pages=args.vacuum_pages,
+                                  analysis_limit=args.analysis_limit,
+                                  checkpoint=args.checkpoint,
+                                  convert_auto_vacuum=args.convert)
+    if run is None:
+        return EXIT_FAILURE
+
+    _info(args, f"Mantenimiento ({run['steps'] or 'sin pasos'}) en {run['duration_ms']} ms: "
+                f"{run['bytes_reclaimed']:,} bytes liberados")
+    return EXIT_OK
+
+
+def cmd_watch(args) -> int:
+    """Mantiene al día un catálogo con los cambios de carpetas hasta Ctrl+C."""
+    from watcher import DriveWatcher
+
+    storage = _open_storage(args)
+    watcher = DriveWatcher(storage, args.serial, root=args.path, use_inotify=not args.poll,
+                           poll_interval=args.poll_interval,
+                           verify_serial=not args.no_verify_serial)
+    if not watcher.start():
+        _info(args, f"Error: {watcher.last_error}")
+        return EXIT_NOT_FOUND if not storage.get_scan_by_serial(args.serial) else EXIT_FAILURE
+
+    _info(args, f"Vigilando {watcher.root} (Ctrl+C para terminar)")
+    reported = 0
+    try:
+        while watcher.running:
+            time.sleep(1)
+            if watcher.operations_applied != reported:
+                reported = watcher.operations_applied
+                _info(args, f"{reported:,} cambios aplicados en {watcher.batches} lotes")
+    except KeyboardInterrupt:
+        pass  # Ctrl+C es la forma normal de terminar
+    finally:
+        watcher.stop()
+
+    status = watcher.status()
+    _info(args, f"Vigilancia terminada ({status['backend']}): "
+                f"{status['operations_applied']:,} cambios aplicados")
+    return EXIT_OK if not status['last_error'] else EXIT_FAILURE
+
+
+def build_parser() -> argparse.ArgumentParser:
+    """Construye el analizador de argumentos con todos los subcomandos."""
+    parser = argparse.ArgumentParser(
+        prog='scanfolder',
+        description='Catalogación y búsqueda de discos sin la interfaz web'
+    )
+    parser.add_argument('--db', help='Base de datos SQLite (por defecto scandata.db)')
+    parser.add_argument('-q', '--quiet', action='store_true',
+                        help='No mostrar progreso ni mensajes en stderr')
+    parser.add_argument('-v', '--verbose', action='store_true',
+                        help='Mostrar el log detallado del almacenamiento')
+    subparsers = parser.add_subparsers(dest='command', metavar='COMANDO')
+    subparsers.required = True
+
+    scan = subparsers.add_parser('scan', help='Escanear una unidad')
+    scan.add_argument('path', help='Ruta de la unidad (ej: D:\\ o /media/disco)')
+    scan.add_argument('--serial', help='Número de serie (obligatorio fuera de Windows)')
+    scan.add_argument('--name', help='Nombre del catálogo')
+    scan.add_argument('--files', action='store_true',
+                      help='Recopilar número y tamaño de archivos por carpeta')
+    scan.set_defaults(func=cmd_scan)
+
+    rescan = subparsers.add_parser('rescan', help='Reescanear un catálogo existente')
+    rescan.add_argument('serial', help='Número de serie del catálogo')
+    rescan.add_argument('--path', help='Ruta actual de la unidad (por defecto la guardada)')
+    files = rescan.add_mutually_exclusive_group()
+    files.add_argument('--files', dest='files', action='store_true', default=None,
+                       help='Recopilar tamaños de archivos')
+    files.add_argument('--no-files', dest='files', action='store_false',
+                       help='Solo directorios')
+    rescan.set_defaults(func=cmd_rescan)
+
+    import_ = subparsers.add_parser('import', help='Importar catálogos .ndjson.gz')
+    import_.add_argument('files', nargs='+', metavar='ARCHIVO',
+                         help="Archivos a importar ('-' para stdin)")
+    import_.set_defaults(func=cmd_import)
+
+    export = subparsers.add_parser('export', help='Exportar un catálogo a .ndjson.gz')
+    export.add_argument('serial', help='Número de serie del catálogo')
+    export.add_argument('-o', '--output', help="Archivo de salida ('-' para stdout)")
+    export.set_defaults(func=cmd_export)
+
+    search = subparsers.add_parser('search', help='Buscar carpetas en los catálogos')
+    search.add_argument('term', help='Término de búsqueda')
+    search.add_argument('--serial', help='Limitar a un catálogo')
+    search.add_argument('--generation', type=int, help='Generación del catálogo (requiere --serial)')
+    search.add_argument('--limit', type=int, default=None, help='Máximo de resultados')
+    search.add_argument('--json', action='store_true', help='Salida NDJSON')
+    search.set_defaults(func=cmd_search)
+
+    stats = subparsers.add_parser('stats', help='Estadísticas de la base de datos')
+    stats.add_argument('--json', action='store_true', help='Salida JSON')
+    stats.set_defaults(func=cmd_stats)
+
+    maintenance = subparsers.add_parser('maintenance',
+                                        help='Liberar espacio, ANALYZE y checkpoint del WAL')
+    maintenance.add_argument('--vacuum-pages', type=int, default=2000,
+                             help='Máximo de páginas a liberar (por defecto 2000)')
+    maintenance.add_argument('--analysis-limit', type=int, default=1000,
+                             help='Filas por índice para ANALYZE (0 = todas)')
+    maintenance.add_argument('--checkpoint', default='PASSIVE',
+                             choices=['PASSIVE', 'FULL', 'RESTART', 'TRUNCATE'],
+                             help='Modo del checkpoint del WAL')
+    maintenance.add_argument('--convert', action='store_true',
+                             help='Convertir una base de datos antigua a auto_vacuum '
+                                  'incremental (VACUUM completo: bloquea la escritura)')
+    maintenance.set_defaults(func=cmd_maintenance)
+
+    watch = subparsers.add_parser('watch', help='Mantener un catálogo al día en vivo')
+    watch.add_argument('serial', help='Número de serie del catálogo')
+    watch.add_argument('--path', help='Punto de montaje actual (por defecto el guardado)')
+    watch.add_argument('--poll', action='store_true',
+                       help='Usar sondeo en lugar de inotify')
+    watch.add_argument('--poll-interval', type=float, default=30.0,
+                       help='Segundos entre pasadas del sondeo (por defecto 30)')
+    watch.add_argument('--no-verify-serial', action='store_true',
+                       help='No exigir que el serial del volumen coincida con el catálogo')
+    watch.set_defaults(func=cmd_watch)
+
+    return parser
+
+
+def main(argv=None) -> int:
+    """Punto de entrada de la CLI; devuelve el código de salida."""
+    args = build_parser().parse_args(argv)
+
+    # Configurar el log antes de importar storage (su basicConfig queda sin efecto)
+    logging.basicConfig(stream=sys.stderr,
+                        level=logging.INFO if args.verbose else logging.WARNING)
+
+    try:
+        return args.func(args)
+    except KeyboardInterrupt:
+        _info(args, "Interrumpido")
+        return 130
+    except BrokenPipeError:
+        # Salida cortada (ej: '| head'); no es un error del comando
+        sys.stderr.close()
+        return EXIT_OK
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,519 @@
+"""
+Prueba de carga HTTP de ScanFolder
+==================================
+
+Arranca la aplicación Flask en un proceso aparte contra un catálogo sintético y
+le envía una mezcla configurable de peticiones a ``/search``,
+``/catalog/<serial>``, ``/get_drives`` y ``/scan`` a un ritmo objetivo, como
+varios usuarios buscando mientras se escanea un disco grande. Al terminar
+muestra por ruta la latencia p50/p95/p99, el rendimiento y la tasa de errores,
+y termina con código 1 si se supera algún SLO.
+
+Las búsquedas que agotan ``SEARCH_TIMEOUT`` responden 200 pero vacías (cabecera
+``X-Search-Truncated``): se cuentan aparte como truncadas, no suman al
+rendimiento y su tasa tiene el mismo límite que la de errores, para que una
+prueba no pase el SLO de latencia sin devolver resultados.
+
+Las llegadas siguen un ritmo constante e independiente de las respuestas
+(carga abierta): la latencia se mide desde el instante en que la petición
+debía salir, así que incluye la espera cuando todos los usuarios están
+ocupados y el servidor no oculta su retraso frenando al cliente.
+
+Las unidades se sustituyen por un directorio local generado al arrancar
+(``/get_drives`` lo devuelve como única unidad y ``/scan`` lo recorre con su
+serial), así la prueba funciona igual en cualquier sistema y sin discos.
+
+Uso:
+    python loadtest.py [--rate 50] [--duration 30] [--concurrency 50]
+                       [--mix search=70,catalog=20,drives=8,scan=2]
+                       [--slo search.p95=300 ...] [--db sintetico.db] [--json]
+                       [--workers N]
+
+Códigos de salida:
+    0  Todos los SLO cumplidos
+    1  Algún SLO superado o el servidor no arrancó
+    2  Uso incorrecto (argumentos inválidos)
+
+Autor: Paulo Felix
+Versión: 1.0.0
+Licencia: MIT
+"""
+
+import argparse
+import http.client
+import json
+import logging
+import math
+import multiprocessing
+import os
+import random
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import quote, urlencode
+
+EXIT_OK = 0
+EXIT_FAILURE = 1
+EXIT_USAGE = 2
+
+# Peso de cada ruta en la mezcla de tráfico
+ROUTE_MIX = {'search': 70, 'catalog': 20, 'drives': 8, 'scan': 2}
+
+# Ritmo objetivo (peticiones/s), duración (s) y usuarios simultáneos
+RATE = 50
+DURATION = 30
+CONCURRENCY = 50
+
+# Segundos de calentamiento cuyas medidas se descartan
+WARMUP = 2
+
+# Escaneos simultáneos como máximo; los que tocan con otro en curso se omiten
+MAX_SCANS = 1
+
+# SLO de latencia por ruta (milisegundos) y tasa de errores máxima por ruta
+SLOS = {
+    'search': {'p95': 300, 'p99': 1000},
+    'catalog': {'p95': 300, 'p99': 1000},
+    'drives': {'p95': 100, 'p99': 500},
+    'scan': {'p99': 60000}
+}
+MAX_ERROR_RATE = 0.01
+
+# Tamaño del catálogo sintético y de la unidad de prueba
+CATALOGS = 20
+DIRS_PER_CATALOG = 5000
+DRIVE_DIRS = 20000
+
+# Serial de la unidad de prueba que devuelve la información de volumen simulada
+STANDIN_SERIAL = 'LT00-0000'
+
+# Vocabulario de los nombres de carpeta y de los términos de búsqueda
+WORDS = ['fotos', 'musica', 'videos', 'proyectos', 'backup', 'documentos', 'viajes',
+         'familia', 'trabajo', 'clientes', 'facturas', 'series', 'peliculas', 'juegos',
+         'codigo', 'libros', 'escaneos', 'diseño', 'playa', 'montaña', 'navidad',
+         'cumpleaños', 'informes', 'raw', 'export', 'archivo', 'temporal', 'descargas']
+
+PERCENTILES = ('p50', 'p95', 'p99')
+
+
+def _synthetic_tree(rng: random.Random, root: str, count: int, sep: str = '/') -> List[str]:
+    """Árbol aleatorio de ``count`` rutas bajo ``root`` (los padres antes que los hijos)."""
+    paths = [root]
+    depths = [0]
+    for index in range(1, count):
+        parent = rng.randrange(len(paths))
+        while depths[parent] >= 8:
+            parent = rng.randrange(len(paths))
+        paths.append(f"{paths[parent]}{sep}{rng.choice(WORDS)}_{index}")
+        depths.append(depths[parent] + 1)
+    return paths
+
+
+def build_catalog(db_path: str, catalogs: int, dirs_per_catalog: int, seed: int) -> List[str]:
+    """
+    Crea (o reutiliza) la base de datos con los catálogos sintéticos.
+
+    Returns:
+        List[str]: Seriales de los catálogos sintéticos
+    """
+    from storage import ScanStorage
+
+    storage = ScanStorage(db_path)
+    serials = [f"LT{number:02d}-{number:04X}" for number in range(1, catalogs + 1)]
+    existing = {scan['serial_number'] for scan in storage.get_scan_history()}
+    rng = random.Random(seed)
+    for number, serial in enumerate(serials, 1):
+        if serial in existing:
+            continue
+        root = f"/media/disco{number}"
+        storage.add_scan(serial_number=serial, volume_name=f"Disco sintético {number}",
+                         drive_path=root,
+                         directories=_synthetic_tree(rng, root, dirs_per_catalog))
+    return serials
+
+
+def build_drive(root: str, dirs: int, seed: int):
+    """Crea en disco el árbol de carpetas de la unidad de prueba."""
+    for path in _synthetic_tree(random.Random(seed), root, dirs, os.sep)[1:]:
+        os.makedirs(path, exist_ok=True)
+
+
+def _install_standin(drive_root: str, scanfolder):
+    """Sustituye en el módulo ``app`` las unidades por la unidad de prueba."""
+    drive = {'letter': 'T', 'path': drive_root, 'name': os.path.basename(drive_root),
+             'free_gb': None, 'description': 'Unidad de prueba'}
+    scanfolder.get_drives = lambda: [drive]
+    scanfolder.get_volume_info_windows = lambda letter: ('Unidad de prueba', STANDIN_SERIAL)
+
+
+def _serve(db_path: str, drive_root: str, workers: int, conn):
+    """
+    Proceso servidor: la aplicación sobre la base sintética y la unidad de prueba.
+
+    Con ``workers`` 0 usa el servidor de desarrollo de Werkzeug (un proceso con
+    hilos, como ``app.run``); con más, el servidor de producción de ``serve.py``.
+    """
+    # Los mensajes del servidor no deben mezclarse con el informe en stdout
+    sys.stdout = open(os.devnull, 'w')
+    logging.basicConfig(level=logging.WARNING)
+    logging.getLogger('werkzeug').setLevel(logging.ERROR)
+
+    import storage
+    if workers:
+        from serve import PreforkServer
+        server = PreforkServer(port=0, workers=workers, db_path=db_path,
+                               worker_setup=lambda scanfolder: _install_standin(drive_root, scanfolder))
+        conn.send(server.bind())
+        server.run()
+        return
+
+    storage._storage = storage.ScanStorage(db_path)
+    import app as scanfolder
+    from werkzeug.serving import make_server
+
+    _install_standin(drive_root, scanfolder)
+    server = make_server('127.0.0.1', 0, scanfolder.app, threaded=True)
+    conn.send(server.port)
+    server.serve_forever()
+
+
+class LoadGenerator:
+    """
+    Generador de carga abierta contra un servidor ScanFolder.
+
+    Cada petición se programa en ``inicio + i / rate`` y se entrega a un hilo
+    libre de ``concurrency``; su latencia cuenta desde el instante programado.
+    """
+
+    def __init__(self, host: str, port: int, serials: List[str], drive_root: str,
+                 mix: Dict[str, int], concurrency: int = CONCURRENCY,
+                 timeout: float = 60.0, max_scans: int = MAX_SCANS, seed: int = 0):
+        self.host = host
+        self.port = port
+        self.serials = serials
+        self.drive_root = drive_root
+        self.routes = [route for route, weight in mix.items() if weight > 0]
+        self.weights = [mix[route] for route in self.routes]
+        self.concurrency = concurrency
+        self.timeout = timeout
+        self.rng = random.Random(seed)
+
+        self._scan_slots = threading.Semaphore(max_scans)
+        self._lock = threading.Lock()
+        self._samples: List[Tuple[str, float, float, bool, bool]] = []
+        self.skipped = 0
+
+    def _request_for(self, route: str) -> Tuple[str, str, Optional[str]]:
+        """Método, ruta y cuerpo de una petición de ``route``."""
+        if route == 'search':
+            term = self.rng.choice(WORDS)
+            if self.rng.random() < 0.5:
+                term += f"_{self.rng.randrange(1, DIRS_PER_CATALOG)}"
+            return 'GET', f"/search?{urlencode({'q': term})}", None
+        if route == 'catalog':
+            return 'GET', f"/catalog/{quote(self.rng.choice(self.serials))}", None
+        if route == 'drives':
+            return 'GET', '/get_drives', None
+        return 'POST', '/scan', urlencode({'drive_path': self.drive_root,
+                                           'catalog_name': 'Unidad de prueba'})
+
+    def _send(self, route: str, method: str, path: str, body: Optional[str], scheduled: float):
+        ok = False
+        truncated = False
+        try:
+            conn = http.client.HTTPConnection(self.host, self.port, timeout=self.timeout)
+            try:
+                headers = {'Content-Type': 'application/x-www-form-urlencoded'} if body else {}
+                conn.request(method, path, body=body, headers=headers)
+                response = conn.getresponse()
+                response.read()
+                ok = response.status < 400
+                truncated = response.getheader('X-Search-Truncated') == '1'
+            finally:
+                conn.close()
+        except (OSError, http.client.HTTPException):
+            pass
+        finally:
+            if route == 'scan':
+                self._scan_slots.release()
+        finished = time.perf_counter()
+        with self._lock:
+            self._samples.append((route, scheduled, finished, ok, truncated))
+
+    def run(self, rate: float, duration: float) -> List[Tuple[str, float, float, bool, bool]]:
+        """
+        Envía ``rate * duration`` peticiones y espera a que terminen.
+
+        Returns:
+            List[Tuple[str, float, float, bool, bool]]: ``(ruta, programada, fin,
+            ok, truncada)`` de cada petición, con tiempos de ``time.perf_counter``
+        """
+        with self._lock:
+            self._samples = []
+            self.skipped = 0
+        total = int(rate * duration)
+        with ThreadPoolExecutor(max_workers=self.concurrency) as executor:
+            start = time.perf_counter()
+            for index in range(total):
+                scheduled = start + index / rate
+                delay = scheduled - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+                route = self.rng.choices(self.routes, self.weights)[0]
+                if route == 'scan' and not self._scan_slots.acquire(blocking=False):
+                    self.skipped += 1
+                    continue
+                executor.submit(self._send, route, *self._request_for(route), scheduled)
+        with self._lock:
+            return list(self._samples)
+
+    def get_json(self, path: str) -> Optional[Dict]:
+        """GET de una ruta JSON del servidor (None si falla)."""
+        try:
+            conn = http.client.HTTPConnection(self.host, self.port, timeout=self.timeout)
+            try:
+                conn.request('GET', path)
+                response = conn.getresponse()
+                return json.loads(response.read()) if response.status == 200 else None
+            finally:
+                conn.close()
+        except (OSError, http.client.HTTPException, ValueError):
+            return None
+
+
+def _percentile(ordered: List[float], fraction: float) -> float:
+    """Percentil por rango más cercano de una lista ordenada."""
+    return ordered[max(0, math.ceil(fraction * len(ordered)) - 1)]
+
+
+def summarize(samples: List[Tuple[str, float, float, bool, bool]]) -> Dict[str, Dict]:
+    """
+    Latencia (ms), rendimiento, errores y respuestas truncadas por ruta y en total.
+
+    El rendimiento es el número de respuestas correctas y completas dividido por
+    el tiempo entre la primera petición programada y la última respuesta.
+    """
+    if not samples:
+        return {}
+    start = min(sample[1] for sample in samples)
+    elapsed = max(sample[2] for sample in samples) - start
+
+    groups: Dict[str, List] = {}
+    for sample in samples:
+        groups.setdefault(sample[0], []).append(sample)
+    groups['total'] = samples
+
+    report = {}
+    for route, group in groups.items():
+        latencies = sorted((finished - scheduled) * 1000 for _, scheduled, finished, _, _ in group)
+        errors = sum(1 for _, _, _, ok, _ in group if not ok)
+        truncated = sum(1 for _, _, _, ok, cut in group if ok and cut)
+        complete = len(group) - errors - truncated
+        report[route] = {
+            'requests': len(group),
+            'errors': errors,
+            'error_rate': round(errors / len(group), 4),
+            'truncated': truncated,
+            'truncated_rate': round(truncated / len(group), 4),
+            'throughput': round(complete / elapsed, 1) if elapsed > 0 else None,
+            **{name: round(_percentile(latencies, int(name[1:]) / 100), 1) for name in PERCENTILES},
+            'max': round(latencies[-1], 1)
+        }
+    return report
+
+
+def check_slos(report: Dict[str, Dict], slos: Dict[str, Dict[str, float]],
+               max_error_rate: float) -> List[str]:
+    """
+    Lista de SLO superados (vacía si se cumplen todos).
+
+    Las respuestas truncadas tienen el mismo límite que los errores: son rápidas
+    pero no traen resultados.
+    """
+    violations = []
+    for route, stats in report.items():
+        if route == 'total':
+            continue
+        for name, limit in slos.get(route, {}).items():
+            if stats[name] > limit:
+                violations.append(f"{route}: {name} {stats[name]} ms > {limit} ms")
+        if stats['error_rate'] > max_error_rate:
+            violations.append(f"{route}: tasa de errores {stats['error_rate']:.2%} > {max_error_rate:.2%}")
+        if stats['truncated_rate'] > max_error_rate:
+            violations.append(f"{route}: respuestas truncadas {stats['truncated_rate']:.2%} "
+                              f"> {max_error_rate:.2%}")
+    return violations
+
+
+def _parse_pairs(text: str) -> Dict[str, str]:
+    pairs = {}
+    for item in filter(None, (part.strip() for part in text.split(','))):
+        key, sep, value = item.partition('=')
+        if not sep:
+            raise argparse.ArgumentTypeError(f"se esperaba RUTA=PESO en '{item}'")
+        pairs[key.strip()] = value.strip()
+    return pairs
+
+
+def parse_mix(text: str) -> Dict[str, int]:
+    """Convierte ``search=70,scan=2`` en pesos por ruta."""
+    mix = {route: 0 for route in ROUTE_MIX}
+    for route, weight in _parse_pairs(text).items():
+        if route not in ROUTE_MIX:
+            raise argparse.ArgumentTypeError(f"ruta desconocida '{route}'")
+        try:
+            mix[route] = int(weight)
+        except ValueError:
+            raise argparse.ArgumentTypeError(f"peso inválido '{weight}'")
+        if mix[route] < 0:
+            raise argparse.ArgumentTypeError(f"peso inválido '{weight}'")
+    if not any(mix.values()):
+        raise argparse.ArgumentTypeError("ninguna ruta con peso")
+    return mix
+
+
+def parse_slo(text: str) -> Tuple[str, str, float]:
+    """Convierte ``search.p95=300`` en ``('search', 'p95', 300.0)``."""
+    target, sep, value = text.partition('=')
+    route, _, name = target.partition('.')
+    if not sep or route not in ROUTE_MIX or name not in PERCENTILES:
+        raise argparse.ArgumentTypeError(f"se esperaba RUTA.pNN=MS (ej: search.p95=300), no '{text}'")
+    try:
+        return route, name, float(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"milisegundos inválidos '{value}'")
+
+
+def print_report(report: Dict[str, Dict], skipped: int, violations: List[str]):
+    """Tabla de resultados en stdout."""
+    header = f"{'ruta':<8} {'peticiones':>10} {'errores':>8} {'truncadas':>9} {'req/s':>7} " \
+             f"{'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'máx ms':>8}"
+    print(header)
+    print('-' * len(header))
+    for route in [*ROUTE_MIX, 'total']:
+        stats = report.get(route)
+        if stats is None:
+            continue
+        print(f"{route:<8} {stats['requests']:>10} {stats['errors']:>8} {stats['truncated']:>9} "
+              f"{stats['throughput'] or 0:>7} {stats['p50']:>8} {stats['p95']:>8} "
+              f"{stats['p99']:>8} {stats['max']:>8}")
+    if skipped:
+        print(f"\nEscaneos omitidos (otro en curso): {skipped}")
+    print()
+    if violations:
+        print("SLO superados:")
+        for violation in violations:
+            print(f"  - {violation}")
+    else:
+        print("Todos los SLO cumplidos")
+
+
+def build_parser() -> argparse.ArgumentParser:
+    """Construye el analizador de argumentos."""
+    parser = argparse.ArgumentParser(
+        prog='loadtest',
+        description='Prueba de carga HTTP de ScanFolder con informe de SLO'
+    )
+    parser.add_argument('--rate', type=float, default=RATE, help='Peticiones por segundo')
+    parser.add_argument('--duration', type=float, default=DURATION, help='Segundos de medición')
+    parser.add_argument('--warmup', type=float, default=WARMUP,
+                        help='Segundos de calentamiento descartados')
+    parser.add_argument('--concurrency', type=int, default=CONCURRENCY,
+                        help='Usuarios (peticiones en curso) como máximo')
+    parser.add_argument('--mix', type=parse_mix,
+                        default=dict(ROUTE_MIX),
+                        help='Pesos por ruta (por defecto search=70,catalog=20,drives=8,scan=2)')
+    parser.add_argument('--slo', type=parse_slo, action='append', default=[],
+                        metavar='RUTA.pNN=MS', help='Sustituye un SLO de latencia (repetible)')
+    parser.add_argument('--max-error-rate', type=float, default=MAX_ERROR_RATE,
+                        help='Tasa de errores máxima por ruta (0-1)')
+    parser.add_argument('--max-scans', type=int, default=MAX_SCANS,
+                        help='Escaneos simultáneos como máximo')
+    parser.add_argument('--workers', type=int, default=0,
+                        help='Procesos del servidor de producción (serve.py); '
+                             '0 = servidor de desarrollo')
+    parser.add_argument('--timeout', type=float, default=60.0, help='Tiempo máximo por petición')
+    parser.add_argument('--db', help='Base de datos sintética (se reutiliza si existe; '
+                                     'por defecto una temporal)')
+    parser.add_argument('--catalogs', type=int, default=CATALOGS, help='Catálogos sintéticos')
+    parser.add_argument('--dirs', type=int, default=DIRS_PER_CATALOG,
+                        help='Directorios por catálogo sintético')
+    parser.add_argument('--drive-dirs', type=int, default=DRIVE_DIRS,
+                        help='Directorios de la unidad de prueba que recorre /scan')
+    parser.add_argument('--seed', type=int, default=1, help='Semilla de los datos y la mezcla')
+    parser.add_argument('--json', action='store_true', help='Informe en JSON')
+    return parser
+
+
+def main(argv=None) -> int:
+    """Punto de entrada de la prueba de carga; devuelve el código de salida."""
+    args = build_parser().parse_args(argv)
+    if (args.rate <= 0 or args.duration <= 0 or args.concurrency < 1 or args.max_scans < 1
+            or args.workers < 0):
+        print("Error: --rate, --duration, --concurrency y --max-scans deben ser positivos "
+              "y --workers no puede ser negativo", file=sys.stderr)
+        return EXIT_USAGE
+    logging.basicConfig(stream=sys.stderr, level=logging.WARNING)
+
+    slos = {route: dict(limits) for route, limits in SLOS.items()}
+    for route, name, limit in args.slo:
+        slos.setdefault(route, {})[name] = limit
+
+    workdir = tempfile.mkdtemp(prefix='scanfolder-loadtest-')
+    server = None
+    try:
+        db_path = args.db or os.path.join(workdir, 'loadtest.db')
+        print(f"Preparando catálogo sintético ({args.catalogs} x {args.dirs} directorios)...",
+              file=sys.stderr)
+        serials = build_catalog(db_path, args.catalogs, args.dirs, args.seed)
+        drive_root = os.path.join(workdir, 'unidad')
+        build_drive(drive_root, args.drive_dirs, args.seed)
+
+        context = multiprocessing.get_context('spawn')
+        parent_conn, child_conn = context.Pipe()
+        server = context.Process(target=_serve, args=(db_path, drive_root, args.workers,
+                                                      child_conn),
+                                 daemon=True)
+        server.start()
+        if not parent_conn.poll(60):
+            print("Error: el servidor no arrancó", file=sys.stderr)
+            return EXIT_FAILURE
+        port = parent_conn.recv()
+
+        generator = LoadGenerator('127.0.0.1', port, serials, drive_root, args.mix,
+                                  concurrency=args.concurrency, timeout=args.timeout,
+                                  max_scans=args.max_scans, seed=args.seed)
+        if args.warmup > 0:
+            print(f"Calentando {args.warmup:g} s...", file=sys.stderr)
+            generator.run(args.rate, args.warmup)
+        print(f"Midiendo {args.duration:g} s a {args.rate:g} peticiones/s "
+              f"con {args.concurrency} usuarios...", file=sys.stderr)
+        samples = generator.run(args.rate, args.duration)
+
+        report = summarize(samples)
+        violations = check_slos(report, slos, args.max_error_rate)
+        stats = generator.get_json('/stats') or {}
+        if args.json:
+            print(json.dumps({'routes': report, 'skipped_scans': generator.skipped,
+                              'slos': slos, 'max_error_rate': args.max_error_rate,
+                              'violations': violations, 'server_search': stats.get('search')},
+                             ensure_ascii=False))
+        else:
+            print_report(report, generator.skipped, violations)
+        return EXIT_FAILURE if violations or not report else EXIT_OK
+    except KeyboardInterrupt:
+        print("Interrumpido", file=sys.stderr)
+        return 130
+    finally:
+        if server is not None:
+            server.terminate()
+            server.join(10)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,220 @@
+"""
+Mantenimiento automático de la base de datos de ScanFolder
+==========================================================
+
+Programa en segundo plano las tareas que SQLite no hace por sí solo: aplicar
+la retención de generaciones (``KEEP_GENERATIONS``), devolver al sistema de
+archivos las páginas liberadas por ``delete_scan`` y la compactación
+(incremental vacuum), actualizar las estadísticas del planificador (ANALYZE) y
+hacer checkpoint del WAL. ``DeletionReclaimer``
+borra por lotes los directorios de los catálogos eliminados.
+
+El trabajo se ejecuta solo en las ventanas horarias configuradas y cuando el
+servidor lleva un tiempo sin peticiones; si llega una petición durante la
+pasada, se detiene en el siguiente lote. Cada ejecución queda registrada en
+``maintenance_runs`` y aparece en ``get_database_stats()``.
+
+Autor: Paulo Felix
+Versión: 1.0.0
+Licencia: MIT
+"""
+
+import logging
+import threading
+import time
+from datetime import datetime
+from typing import List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Ventanas horarias ("HH:MM", "HH:MM") en las que se permite el mantenimiento;
+# vacío = a cualquier hora. Una ventana puede cruzar la medianoche.
+MAINTENANCE_WINDOWS: List[Tuple[str, str]] = []
+
+# Segundos sin peticiones para considerar el servidor inactivo
+IDLE_SECONDS = 300
+
+# Segundos mínimos entre dos pasadas de mantenimiento
+MIN_INTERVAL = 6 * 3600
+
+# Cada cuántos segundos comprueba el planificador si puede ejecutar
+CHECK_INTERVAL = 60
+
+# Presupuesto de E/S por pasada: páginas liberadas y filas de ANALYZE por índice
+VACUUM_PAGES = 2000
+ANALYSIS_LIMIT = 1000
+
+# Pausa entre lotes al borrar catálogos eliminados, para ceder el bloqueo de escritura
+DELETE_PAUSE = 0.05
+
+
+def _parse_window(window: Tuple[str, str]) -> Tuple[int, int]:
+    """Convierte una ventana ("HH:MM", "HH:MM") a minutos desde medianoche."""
+    start, end = (int(h) * 60 + int(m) for h, m in (part.split(':') for part in window))
+    return start, end
+
+
+class MaintenanceScheduler:
+    """
+    Planificador del mantenimiento de una ``ScanStorage``.
+
+    El servidor notifica el inicio y fin de cada petición con
+    ``request_started``/``request_finished``; el hilo del planificador solo
+    ejecuta ``storage.run_maintenance`` cuando no hay peticiones en curso desde
+    hace ``idle_seconds`` y la hora actual cae dentro de alguna ventana.
+    """
+
+    def __init__(self, storage, windows: Optional[List[Tuple[str, str]]] = None,
+                 idle_seconds: float = IDLE_SECONDS, min_interval: float = MIN_INTERVAL,
+                 check_interval: float = CHECK_INTERVAL, vacuum_pages: int = VACUUM_PAGES,
+                 analysis_limit: int = ANALYSIS_LIMIT, checkpoint: str = 'PASSIVE'):
+        """
+        Args:
+            storage (ScanStorage): Almacenamiento a mantener
+            windows (Optional[List[Tuple[str, str]]]): Ventanas horarias permitidas
+                (por defecto ``MAINTENANCE_WINDOWS``)
+            idle_seconds (float): Inactividad necesaria antes de empezar
+            min_interval (float): Separación mínima entre pasadas
+            check_interval (float): Periodo de comprobación del hilo
+            vacuum_pages (int): Páginas que puede liberar cada pasada
+            analysis_limit (int): Límite de filas por índice para ANALYZE
+            checkpoint (str): Modo de ``PRAGMA wal_checkpoint``
+        """
+        self.storage = storage
+        self.windows = [_parse_window(w) for w in (MAINTENANCE_WINDOWS if windows is None else windows)]
+        self.idle_seconds = idle_seconds
+        self.min_interval = min_interval
+        self.check_interval = check_interval
+        self.vacuum_pages = vacuum_pages
+        self.analysis_limit = analysis_limit
+        self.checkpoint = checkpoint
+        # Con varios procesos de servidor solo uno debe planificar el mantenimiento
+        self.enabled = True
+
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        self._last_activity = time.monotonic()
+        self._last_run = None
+        self._thread = None
+        self._stop = threading.Event()
+
+    def request_started(self):
+        """Registra el inicio de una petición (interrumpe una pasada en curso)."""
+        with self._lock:
+            self._in_flight += 1
+            self._last_activity = time.monotonic()
+
+    def request_finished(self):
+        """Registra el fin de una petición."""
+        with self._lock:
+            self._in_flight = max(0, self._in_flight - 1)
+            self._last_activity = time.monotonic()
+
+    def is_busy(self) -> bool:
+        """True si hay peticiones en curso."""
+        with self._lock:
+            return self._in_flight > 0
+
+    def in_window(self, now: Optional[datetime] = None) -> bool:
+        """Comprueba si la hora actual está dentro de alguna ventana permitida."""
+        if not self.windows:
+            return True
+        now = now or datetime.now()
+        minute = now.hour * 60 + now.minute
+        for start, end in self.windows:
+            if start <= end and start <= minute < end:
+                return True
+            if start > end and (minute >= start or minute < end):
+                return True
+        return False
+
+    def is_due(self) -> bool:
+        """Comprueba ventana, inactividad y separación desde la última pasada."""
+        with self._lock:
+            idle = self._in_flight == 0 and time.monotonic() - self._last_activity >= self.idle_seconds
+        if not idle or not self.in_window():
+            return False
+        return self._last_run is None or time.monotonic() - self._last_run >= self.min_interval
+
+    def run_once(self):
+        """Ejecuta una pasada de mantenimiento inmediatamente."""
+        self._last_run = time.monotonic()
+        # Nunca el VACUUM completo de conversión: bloquearía las escrituras
+        return self.storage.run_maintenance(vacuum_pages=self.vacuum_pages,
+                                            analysis_limit=self.analysis_limit,
+                                            checkpoint=self.checkpoint,
+                                            convert_auto_vacuum=False,
+                                            should_stop=lambda: self.is_busy() or self._stop.is_set())
+
+    def start(self):
+        """Arranca el hilo del planificador (idempotente; nada si no está habilitado)."""
+        with self._lock:
+            if self._thread is not None or not self.enabled:
+                return
+            self._thread = threading.Thread(target=self._loop, name='scanfolder-maintenance',
+                                            daemon=True)
+        self._thread.start()
+        logger.info("Planificador de mantenimiento iniciado")
+
+    def stop(self, timeout: Optional[float] = None):
+        """Detiene el hilo del planificador y espera a que termine."""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def _loop(self):
+        while not self._stop.wait(self.check_interval):
+            if self.is_due():
+                try:
+                    self.run_once()
+                except Exception as e:
+                    logger.error(f"Error en el planificador de mantenimiento: {e}")
+
+
+class DeletionReclaimer:
+    """
+    Hilo que borra los directorios de los catálogos eliminados.
+
+    ``delete_scan`` solo oculta el catálogo; este hilo llama a
+    ``storage.reclaim_deleted_scans`` en lotes pequeños con una pausa entre
+    ellos hasta vaciar ``pending_deletions`` y después espera a ``wake``.
+    """
+
+    def __init__(self, storage, pause: float = DELETE_PAUSE):
+        """
+        Args:
+            storage (ScanStorage): Almacenamiento con borrados pendientes
+            pause (float): Segundos de espera entre lotes
+        """
+        self.storage = storage
+        self.pause = pause
+        self._lock = threading.Lock()
+        self._thread = None
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+
+    def wake(self):
+        """Arranca el hilo si hace falta y le avisa de que hay trabajo."""
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._loop, name='scanfolder-reclaim',
+                                                daemon=True)
+                self._thread.start()
+        self._wake.set()
+
+    def stop(self, timeout: Optional[float] = None):
+        """Detiene el hilo al terminar el lote en curso."""
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def _loop(self):
+        while not self._stop.is_set():
+            self._wake.wait()
+            self._wake.clear()
+            try:
+                self.storage.reclaim_deleted_scans(should_stop=self._stop.is_set,
+                                                   pause=self.pause)
+            except Exception as e:
+                logger.error(f"Error al borrar catálogos eliminados: {e}")
@@ -0,0 +1,233 @@
+"""
+Perfilado bajo demanda de peticiones lentas
+===========================================
+
+Perfilador por muestreo sin dependencias: un hilo toma cada ``SAMPLE_INTERVAL``
+segundos la pila de los hilos que atienden las peticiones perfiladas
+(``sys._current_frames``) y cuenta cuántas veces aparece cada pila. El
+resultado se descarga en formato "folded" (una línea ``f1;f2;f3 N`` por pila),
+que entienden flamegraph.pl, speedscope o inferno.
+
+Activación:
+    - Por petición: cabecera ``X-Profile: 1``
+    - Global: ``profiler.enabled = True`` (interruptor de administración)
+    - Automática: las peticiones que superan ``threshold`` segundos empiezan a
+      muestrearse en ese momento, así se ve en qué se va el resto del tiempo
+
+Sin ninguna activación, ``begin`` devuelve None tras una comprobación y no
+existe el hilo de muestreo; con solo el umbral activo, el coste por petición
+es registrar su inicio en un diccionario.
+
+Autor: Paulo Felix
+Versión: 1.0.0
+Licencia: MIT
+"""
+
+import itertools
+import os
+import sys
+import threading
+import time
+from collections import Counter, deque
+from datetime import datetime
+from typing import Dict, List, Optional
+
+# Segundos entre muestras de la pila
+SAMPLE_INTERVAL = 0.005
+
+# Perfiles que se conservan (los más antiguos se descartan)
+PROFILE_CAPACITY = 20
+
+# Segundos a partir de los cuales una petición se perfila sola (None = desactivado)
+SLOW_REQUEST_THRESHOLD = None
+
+# Profundidad máxima de pila que se guarda por muestra
+MAX_STACK_DEPTH = 128
+
+
+def _frame_label(code) -> str:
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+class _Capture:
+    """Perfil en curso de una petición."""
+
+    def __init__(self, capture_id: int, label: str, thread_id: int, trigger: Optional[str]):
+        self.id = capture_id
+        self.label = label
+        self.thread_id = thread_id
+        self.trigger = trigger  # None hasta que empieza el muestreo
+        self.started = time.monotonic()
+        self.started_at = datetime.now()
+        self.stacks = Counter()
+        self.samples = 0
+
+
+class RequestProfiler:
+    """
+    Perfilador por muestreo de las peticiones de la aplicación.
+
+    ``begin`` se llama al empezar cada petición y ``end`` al terminar; los
+    perfiles completos quedan en un búfer circular de ``capacity`` elementos.
+    """
+
+    def __init__(self, interval: float = SAMPLE_INTERVAL, capacity: int = PROFILE_CAPACITY,
+                 threshold: Optional[float] = SLOW_REQUEST_THRESHOLD):
+        """
+        Args:
+            interval (float): Segundos entre muestras
+            capacity (int): Perfiles que se conservan
+            threshold (Optional[float]): Segundos para perfilar automáticamente
+                una petición lenta (None para desactivarlo)
+        """
+        self.interval = interval
+        self.threshold = threshold
+        self.enabled = False
+        self.profiles = deque(maxlen=capacity)
+
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+        self._active: Dict[int, _Capture] = {}
+        self._wake = threading.Event()
+        self._thread = None
+
+    def begin(self, label: str, force: bool = False) -> Optional[_Capture]:
+        """
+        Registra el inicio de una petición si algún modo de perfilado está activo.
+
+        Args:
+            label (str): Descripción de la petición (método y ruta)
+            force (bool): Perfilar aunque no esté activado globalmente (cabecera)
+
+        Returns:
+            Optional[_Capture]: Perfil en curso o None si no se perfila
+        """
+        if not (force or self.enabled or self.threshold is not None):
+            return None
+        trigger = 'header' if force else 'toggle' if self.enabled else None
+        capture = _Capture(next(self._ids), label, threading.get_ident(), trigger)
+        with self._lock:
+            self._active[capture.thread_id] = capture
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._sample_loop, daemon=True,
+                                                name='scanfolder-profiler')
+                self._thread.start()
+        self._wake.set()
+        return capture
+
+    def end(self, capture: Optional[_Capture], status: Optional[int] = None) -> Optional[Dict]:
+        """
+        Termina el perfil de una petición y lo guarda si llegó a muestrearse.
+
+        Returns:
+            Optional[Dict]: Resumen del perfil guardado o None
+        """
+        if capture is None:
+            return None
+        with self._lock:
+            # Fuera de _active el hilo de muestreo ya no toca la captura
+            if self._active.get(capture.thread_id) is capture:
+                del self._active[capture.thread_id]
+            trigger, samples = capture.trigger, capture.samples
+        if trigger is None or not samples:
+            return None
+
+        profile = {
+            'id': capture.id,
+            'label': capture.label,
+            'trigger': trigger,
+            'started_at': capture.started_at.isoformat(timespec='seconds'),
+            'duration_ms': round((time.monotonic() - capture.started) * 1000, 1),
+            'status': status,
+            'samples': samples,
+            'interval_ms': self.interval * 1000,
+            'stacks': capture.stacks
+        }
+        with self._lock:
+            self.profiles.append(profile)
+        return {key: value for key, value in profile.items() if key != 'stacks'}
+
+    def list_profiles(self) -> List[Dict]:
+        """Resumen de los perfiles guardados, del más reciente al más antiguo."""
+        # Copia bajo el cerrojo: end() añade perfiles desde otros hilos
+        with self._lock:
+            profiles = list(self.profiles)
+        return [{key: value for key, value in profile.items() if key != 'stacks'}
+                for profile in reversed(profiles)]
+
+    def get_profile(self, profile_id: int) -> Optional[Dict]:
+        """Perfil completo (con las pilas) o None si ya se descartó."""
+        with self._lock:
+            profiles = list(self.profiles)
+        for profile in profiles:
+            if profile['id'] == profile_id:
+                return profile
+        return None
+
+    @staticmethod
+    def folded(profile: Dict) -> str:
+        """Pilas en formato folded (``raíz;...;hoja muestras`` por línea)."""
+        return ''.join(f"{';'.join(stack)} {count}\n"
+                       for stack, count in profile['stacks'].most_common())
+
+    @staticmethod
+    def top_functions(profile: Dict, limit: int = 30) -> List[Dict]:
+        """
+        Funciones ordenadas por muestras propias (en la hoja de la pila) y
+        después por muestras totales (en cualquier punto de la pila).
+        """
+        own = Counter()
+        total = Counter()
+        for stack, count in profile['stacks'].items():
+            own[stack[-1]] += count
+            for label in set(stack):
+                total[label] += count
+        ranked = sorted(total, key=lambda label: (own[label], total[label]), reverse=True)
+        return [{'function': label, 'self': own[label], 'total': total[label]}
+                for label in ranked[:limit]]
+
+    def _sample_loop(self):
+        while True:
+            now = time.monotonic()
+            sampling = []
+            next_due = None
+            with self._lock:
+                active = bool(self._active)
+                for capture in self._active.values():
+                    if capture.trigger is None:
+                        if self.threshold is None:
+                            continue
+                        due = capture.started + self.threshold
+                        if now < due:
+                            next_due = due if next_due is None else min(next_due, due)
+                            continue
+                        # Bajo el cerrojo: end() lee el disparador al retirar la captura
+                        capture.trigger = 'threshold'
+                    sampling.append(capture)
+            if not active:
+                # Sin peticiones perfiladas el hilo espera al siguiente begin
+                self._wake.wait()
+                self._wake.clear()
+                continue
+
+            if not sampling:
+                # Ninguna petición ha llegado al umbral: dormir hasta la primera
+                self._wake.wait(None if next_due is None else max(next_due - now, self.interval))
+                self._wake.clear()
+                continue
+
+            frames = sys._current_frames()
+            for capture in sampling:
+                frame = frames.get(capture.thread_id)
+                if frame is None:
+                    continue
+                stack = []
+                while frame is not None and len(stack) < MAX_STACK_DEPTH:
+                    stack.append(_frame_label(frame.f_code))
+                    frame = frame.f_back
+                with self._lock:
+                    if self._active.get(capture.thread_id) is capture:
+                        capture.stacks[tuple(reversed(stack))] += 1
+                        capture.samples += 1
+            del frames
+            time.sleep(self.interval)
@@ -0,0 +1,169 @@
+"""
+Módulo de escaneo de unidades para ScanFolder
+=============================================
+
+Recorre el sistema de archivos de una unidad y devuelve su estructura de
+directorios. Opcionalmente recopila, por cada directorio, el número de
+archivos y los bytes que contiene directamente (sin guardar una fila por
+archivo), para que el almacenamiento pueda calcular los acumulados por
+carpeta en el momento de la ingesta.
+
+No depende de Flask: lo usan tanto la aplicación web como la CLI.
+
+Autor: Paulo Felix
+Versión: 1.0.0
+Licencia: MIT
+"""
+
+import os
+import platform
+import re
+import subprocess
+from typing import Callable, Dict, List, Optional, Tuple
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Cada cuántos directorios se notifica el progreso del escaneo
+PROGRESS_EVERY = 1000
+
+
+def get_volume_info_windows(drive_letter):
+    """
+    Obtiene información del volumen de Windows usando el comando 'vol'.
+    
+    Extrae el número de serie único del volumen y su etiqueta/descripción
+    ejecutando el comando 'vol' del sistema y parseando su salida con
+    expresiones regulares.
+    
+    Args:
+        drive_letter (str): Letra de la unidad (ej: 'C', 'D', 'E')
+        
+    Returns:
+        tuple: (descripción, serial) donde:
+            - descripción (str|None): Etiqueta del volumen o None si no se encuentra
+            - serial (str|None): Número de serie del volumen o None si no se encuentra
+            
+    Note:
+        Específico para Windows. Usa codificación 'latin-1' para manejar
+        caracteres especiales en etiquetas de volumen.
+    """
+    try:
+        # Ejecutar comando 'vol' con codificación 'latin-1'
+        cmd = f'vol {drive_letter}:'
+        result = subprocess.run(cmd, shell=True, capture_output=True, text=True, encoding='latin-1', errors='ignore')
+        
+        logger.debug(f"Salida del comando 'vol':\n{result.stdout}")
+
+        if result.returncode != 0:
+            logger.warning("Comando 'vol' falló")
+            return None, None
+
+        # Extraer serial (ej: "44FA-62AA")
+        serial_match = re.search(r'([A-Z0-9]{4}-[A-Z0-9]{4})', result.stdout)
+        serial = serial_match.group(0) if serial_match else None
+
+        # Extraer descripción (ej: "Fotograf¡a DobleA")
+        desc_match = re.search(r'(?:es\s|is\s)(.+)', result.stdout)
+        description = desc_match.group(1).strip() if desc_match else None
+
+        logger.info(f"Volumen {drive_letter}: descripción={description}, serial={serial}")
+        return description, serial
+
+    except Exception as e:
+        logger.error(f"Error en get_volume_info_windows: {e}")
+        return None, None
+
+
+def list_directories(drive_path: str,
+                     progress: Optional[Callable[[int], None]] = None) -> Optional[List[str]]:
+    """
+    Lista todos los directorios de una unidad con las herramientas del sistema.
+    
+    - Windows: 'dir /s /b /ad' para listar solo directorios
+    - Linux/macOS: 'find -type d' para búsqueda recursiva
+    
+    La salida del comando se lee línea a línea, así que ``progress`` recibe el
+    número de directorios encontrados mientras el escaneo avanza.
+    
+    Args:
+        drive_path (str): Ruta de la unidad a escanear
+        progress (Optional[Callable[[int], None]]): Función de progreso
+    
+    Returns:
+        Optional[List[str]]: Rutas de directorios, o None si el sistema
+        operativo no está soportado
+    """
+    system = platform.system()
+    if system == 'Windows':
+        command = f'dir "{drive_path}" /s /b /ad'  # Solo directorios
+    elif system in ('Linux', 'Darwin'):
+        command = f'find "{drive_path}" -type d -print'
+    else:
+        return None
+    
+    folders = []
+    with subprocess.Popen(command, shell=True, stdout=subprocess.PIPE,
+                          stderr=subprocess.DEVNULL, text=True,
+                          encoding='latin-1') as process:
+        for line in process.stdout:
+            line = line.strip()
+            if line:
+                folders.append(line)
+                if progress and len(folders) % PROGRESS_EVERY == 0:
+                    progress(len(folders))
+    
+    if progress:
+        progress(len(folders))
+    return folders
+
+
+def walk_drive(drive_path: str, progress: Optional[Callable[[int], None]] = None
+               ) -> Tuple[List[str], Dict[str, Tuple[int, int]]]:
+    """
+    Recorre una unidad recopilando directorios y estadísticas de archivos.
+    
+    El recorrido es iterativo (sin recursión) y usa ``os.scandir``, que en
+    Windows obtiene el tamaño de cada archivo sin llamadas adicionales al
+    sistema. Los enlaces simbólicos no se siguen.
+    
+    Args:
+        drive_path (str): Ruta raíz a recorrer (ej: 'D:\\', '/media/disco')
+        progress (Optional[Callable[[int], None]]): Función que recibe el número
+            de directorios recorridos cada ``PROGRESS_EVERY`` directorios
+    
+    Returns:
+        Tuple[List[str], Dict[str, Tuple[int, int]]]: Lista de directorios
+        (incluida la raíz) y, por cada uno, ``(archivos, bytes)`` directos
+    """
+    directories = []
+    file_stats = {}
+    pending = [drive_path]
+    
+    while pending:
+        current = pending.pop()
+        files = 0
+        size = 0
+        try:
+            with os.scandir(current) as entries:
+                for entry in entries:
+                    try:
+                        if entry.is_dir(follow_symlinks=False):
+                            pending.append(entry.path)
+                        elif entry.is_file(follow_symlinks=False):
+                            files += 1
+                            size += entry.stat(follow_symlinks=False).st_size
+                    except OSError:
+                        continue
+        except OSError as e:
+            logger.warning(f"No se pudo leer el directorio {current}: {e}")
+        
+        directories.append(current)
+        file_stats[current] = (files, size)
+        if progress and len(directories) % PROGRESS_EVERY == 0:
+            progress(len(directories))
+    
+    if progress:
+        progress(len(directories))
+    logger.info(f"Recorrido de {drive_path}: {len(directories)} directorios")
+    return directories, file_stats
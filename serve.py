@@ -0,0 +1,449 @@
+"""
+Servidor de producción de ScanFolder
+====================================
+
+Alternativa a ``app.run(debug=True)`` para servir la aplicación a varios
+usuarios: un proceso maestro prepara la base de datos una sola vez (esquema y
+migraciones, modo WAL y precarga de tablas e índices en la caché del sistema),
+abre el puerto y crea con ``fork`` los procesos de trabajo, que comparten el
+socket y atienden cada uno sus peticiones en hilos.
+
+Cada proceso abre sus propias conexiones a ``scandata.db``: en modo WAL las
+búsquedas no esperan a los escaneos y los escritores se turnan con una espera
+de bloqueo más larga (``BUSY_TIMEOUT``). Solo el primer proceso planifica el
+mantenimiento automático y reanuda los borrados pendientes; tras una recarga,
+el nuevo primer proceso lo hace cuando el anterior ha terminado (SIGUSR1).
+
+Experimental: la agrupación de búsquedas, la vigilancia en vivo y el
+perfilador viven en la memoria de cada proceso y no se comparten.
+
+Señales del proceso maestro:
+    SIGTERM / SIGINT  Parada ordenada: los procesos dejan de aceptar conexiones
+                      y terminan las peticiones en curso (escaneos incluidos)
+                      durante ``--graceful-timeout`` segundos. Una segunda
+                      señal los detiene inmediatamente.
+    SIGHUP            Recarga: vuelve a preparar la base de datos, arranca
+                      procesos nuevos con el código actual y retira los
+                      anteriores de forma ordenada, sin cortar el servicio.
+
+En sistemas sin ``fork`` (Windows) se usa un único proceso con la misma
+preparación y parada ordenada.
+
+Uso:
+    python serve.py [--host 127.0.0.1] [--port 5000] [--workers N] [--db scandata.db]
+                    [--graceful-timeout 600] [--access-log]
+
+Autor: Paulo Felix
+Versión: 1.0.0
+Licencia: MIT
+"""
+
+import argparse
+import importlib
+import logging
+import os
+import signal
+import socket
+import sys
+import threading
+import time
+from typing import Callable, Dict, Optional
+
+from werkzeug.serving import ThreadedWSGIServer, WSGIRequestHandler
+
+import storage
+
+logger = logging.getLogger(__name__)
+
+EXIT_OK = 0
+EXIT_FAILURE = 1
+EXIT_USAGE = 2
+
+HOST = '127.0.0.1'
+PORT = 5000
+
+# Procesos de trabajo por defecto
+WORKERS = min(4, os.cpu_count() or 1)
+
+# Segundos que se espera a las peticiones en curso al parar o recargar
+GRACEFUL_TIMEOUT = 600
+
+# Segundos que una conexión keep-alive puede estar inactiva (y espera máxima
+# de lectura/escritura del socket)
+KEEPALIVE_TIMEOUT = 5
+
+# Conexiones pendientes de aceptar en el socket compartido
+BACKLOG = 128
+
+# Espera por el bloqueo de escritura de SQLite entre procesos
+BUSY_TIMEOUT = 30.0
+
+# Un proceso que muere antes de este tiempo se reinicia tras una pausa
+MIN_WORKER_LIFETIME = 1.0
+
+
+class _RequestHandler(WSGIRequestHandler):
+    """Manejador HTTP/1.1 que cierra la conexión tras la respuesta al drenar."""
+
+    protocol_version = 'HTTP/1.1'
+    timeout = KEEPALIVE_TIMEOUT
+    access_log = False
+
+    def handle_one_request(self):
+        super().handle_one_request()
+        if self.server.draining:
+            self.close_connection = True
+
+    def log_request(self, code='-', size='-'):
+        if self.access_log:
+            super().log_request(code, size)
+
+    def log_error(self, format, *args):
+        # Las conexiones keep-alive inactivas se cierran por tiempo: no es un error
+        if not format.startswith('Request timed out'):
+            super().log_error(format, *args)
+
+
+class _WorkerServer(ThreadedWSGIServer):
+    """
+    Servidor WSGI de un proceso de trabajo sobre el socket compartido.
+
+    Cuenta las conexiones en curso para que ``drain`` pueda esperar a que
+    terminen después de dejar de aceptar nuevas.
+    """
+
+    def __init__(self, sock: socket.socket, app, handler=_RequestHandler):
+        host, port = sock.getsockname()[:2]
+        super().__init__(host, port, app, handler=handler, fd=sock.fileno())
+        self.draining = False
+        self._active = 0
+        self._idle = threading.Condition()
+
+    def process_request(self, request, client_address):
+        with self._idle:
+            self._active += 1
+        try:
+            super().process_request(request, client_address)
+        except Exception:
+            self._finished()
+            raise
+
+    def process_request_thread(self, request, client_address):
+        try:
+            super().process_request_thread(request, client_address)
+        finally:
+            self._finished()
+
+    def _finished(self):
+        with self._idle:
+            self._active -= 1
+            self._idle.notify_all()
+
+    def drain(self, timeout: float) -> bool:
+        """
+        Deja de aceptar conexiones y espera a que terminen las activas.
+
+        Returns:
+            bool: True si todas terminaron antes de ``timeout`` segundos
+        """
+        self.draining = True
+        self.shutdown()
+        with self._idle:
+            return self._idle.wait_for(lambda: self._active == 0, timeout)
+
+
+class PreforkServer:
+    """
+    Proceso maestro: preparación compartida, procesos de trabajo y señales.
+
+    ``worker_setup`` recibe el módulo ``app`` de cada proceso recién creado,
+    antes de que atienda peticiones (lo usa ``loadtest.py`` para simular las
+    unidades).
+    """
+
+    def __init__(self, host: str = HOST, port: int = PORT, workers: int = WORKERS,
+                 db_path: str = storage.DB_PATH, graceful_timeout: float = GRACEFUL_TIMEOUT,
+                 busy_timeout: float = BUSY_TIMEOUT, access_log: bool = False,
+                 worker_setup: Optional[Callable] = None):
+        self.host = host
+        self.port = port
+        self.workers = workers if hasattr(os, 'fork') else 1
+        self.db_path = db_path
+        self.graceful_timeout = graceful_timeout
+        self.busy_timeout = busy_timeout
+        self.access_log = access_log
+        self.worker_setup = worker_setup
+
+        self.socket = None
+        self._workers: Dict[int, tuple] = {}   # pid -> (índice, arranque)
+        self._retiring: Dict[int, float] = {}  # pid -> fin del plazo de parada
+        self._respawn: Dict[int, float] = {}   # índice -> instante de reinicio
+        self._old_leader: Optional[int] = None  # pid del primer proceso anterior a una recarga
+        self._actions = []
+
+    def bind(self) -> int:
+        """
+        Abre el socket compartido por los procesos de trabajo.
+
+        Returns:
+            int: Puerto en escucha (útil con ``port=0``)
+        """
+        family = socket.AF_INET6 if ':' in self.host else socket.AF_INET
+        self.socket = socket.create_server((self.host, self.port), family=family,
+                                           backlog=BACKLOG)
+        self.port = self.socket.getsockname()[1]
+        return self.port
+
+    def prepare(self) -> bool:
+        """
+        Preparación compartida antes de crear los procesos de trabajo.
+
+        Crea o migra el esquema (los procesos encuentran ``user_version`` al
+        día y se lo saltan), activa el modo WAL y precarga la base de datos.
+        """
+        db = storage.ScanStorage(self.db_path, busy_timeout=self.busy_timeout)
+        wal = db.enable_wal()
+        warm = db.warm_up()
+        logger.info(f"Base de datos {self.db_path} preparada (WAL: {'sí' if wal else 'no'}, "
+                    f"{warm['bytes'] / 1024 ** 2:.1f} MB precargados en {warm['duration_ms']} ms)")
+        return wal
+
+    def run(self) -> int:
+        """Prepara, arranca los procesos y atiende señales hasta la parada."""
+        if self.socket is None:
+            self.bind()
+        self.prepare()
+        logger.info(f"ScanFolder en http://{self.host}:{self.port} con {self.workers} proceso(s)")
+
+        if not hasattr(os, 'fork'):
+            return self._serve_inline()
+
+        signal.signal(signal.SIGTERM, self._on_stop)
+        signal.signal(signal.SIGINT, self._on_stop)
+        signal.signal(signal.SIGHUP, self._on_reload)
+        # Los procesos heredan SIGUSR1 bloqueada: un aviso de relevo que llegue
+        # antes de instalar su manejador queda pendiente en lugar de matarlos
+        signal.pthread_sigmask(signal.SIG_BLOCK, {signal.SIGUSR1})
+
+        for index in range(self.workers):
+            self._spawn(index)
+
+        while True:
+            self._reap()
+            if 'kill' in self._actions or 'stop' in self._actions:
+                break
+            if 'reload' in self._actions:
+                self._actions.remove('reload')
+                self._reload()
+            now = time.monotonic()
+            for index, due in list(self._respawn.items()):
+                if now >= due:
+                    del self._respawn[index]
+                    self._spawn(index)
+            time.sleep(0.2)
+
+        return self._shutdown()
+
+    def _on_stop(self, signum, frame):
+        self._actions.append('kill' if 'stop' in self._actions else 'stop')
+
+    def _on_reload(self, signum, frame):
+        self._actions.append('reload')
+
+    def _spawn(self, index: int):
+        # El primer proceso de una recarga espera a que termine el anterior
+        leader = index == 0 and self._old_leader is None
+        pid = os.fork()
+        if pid == 0:
+            code = EXIT_FAILURE
+            try:
+                signal.signal(signal.SIGINT, signal.SIG_IGN)
+                signal.signal(signal.SIGHUP, signal.SIG_IGN)
+                code = self._worker_main(index, leader)
+            except BaseException:
+                logger.exception(f"Error en el proceso {index}")
+            finally:
+                logging.shutdown()
+                os._exit(code)
+        self._workers[pid] = (index, time.monotonic())
+        logger.info(f"Proceso {index} arrancado (pid {pid})")
+
+    def _reap(self):
+        """Recoge los procesos terminados y programa el reinicio de los caídos."""
+        while True:
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                return
+            if pid == 0:
+                return
+            code = os.waitstatus_to_exitcode(status)
+            if pid in self._retiring:
+                del self._retiring[pid]
+                logger.info(f"Proceso {pid} retirado (código {code})")
+                if pid == self._old_leader:
+                    self._old_leader = None
+                    self._promote()
+            elif pid in self._workers:
+                index, started = self._workers.pop(pid)
+                logger.warning(f"Proceso {index} (pid {pid}) terminó inesperadamente (código {code})")
+                delay = MIN_WORKER_LIFETIME if time.monotonic() - started < MIN_WORKER_LIFETIME else 0
+                self._respawn[index] = time.monotonic() + delay
+
+    def _reload(self):
+        """Arranca procesos nuevos con el código actual y retira los anteriores."""
+        logger.info("Recargando...")
+        try:
+            importlib.reload(storage)
+            self.prepare()
+        except Exception as e:
+            logger.error(f"Recarga cancelada, se mantienen los procesos actuales: {e}")
+            return
+        old = self._workers
+        if self._old_leader is None:
+            # Si el anterior aún no ha terminado, sigue siendo el que se espera
+            self._old_leader = next((pid for pid, (index, _) in old.items() if index == 0), None)
+        self._workers = {}
+        self._respawn.clear()
+        for index in range(self.workers):
+            self._spawn(index)
+        self._retire(old)
+
+    def _promote(self):
+        """Avisa al primer proceso actual de que ya puede hacer el mantenimiento."""
+        for pid, (index, _) in self._workers.items():
+            if index == 0:
+                try:
+                    os.kill(pid, signal.SIGUSR1)
+                except ProcessLookupError:
+                    pass  # se reinicia como primer proceso al recogerlo
+
+    def _retire(self, workers: Dict[int, tuple]):
+        deadline = time.monotonic() + self.graceful_timeout + KEEPALIVE_TIMEOUT
+        for pid in workers:
+            self._retiring[pid] = deadline
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    def _shutdown(self) -> int:
+        """Parada ordenada de todos los procesos (inmediata con una segunda señal)."""
+        logger.info("Deteniendo ScanFolder (esperando a las peticiones en curso)...")
+        self._retire(self._workers)
+        self._workers = {}
+        self.socket.close()
+        while self._retiring:
+            self._reap()
+            overdue = time.monotonic() > max(self._retiring.values(), default=0)
+            if 'kill' in self._actions or overdue:
+                for pid in list(self._retiring):
+                    try:
+                        os.kill(pid, signal.SIGKILL)
+                    except ProcessLookupError:
+                        pass
+                self._actions = [action for action in self._actions if action != 'kill']
+            time.sleep(0.2)
+        logger.info("ScanFolder detenido")
+        return EXIT_OK
+
+    def _serve_inline(self) -> int:
+        """Un único proceso (sistemas sin fork) con la misma parada ordenada."""
+        code = self._worker_main(0, True)
+        self.socket.close()
+        return code
+
+    def _worker_main(self, index: int, leader: bool) -> int:
+        """
+        Cuerpo de un proceso de trabajo; devuelve su código de salida.
+
+        Solo el proceso ``leader`` ejecuta el mantenimiento y reanuda los
+        borrados pendientes. El primer proceso de una recarga empieza sin
+        hacerlo y lo asume al recibir SIGUSR1.
+        """
+        stop = threading.Event()
+        promoted = threading.Event()
+        signal.signal(signal.SIGTERM, lambda signum, frame: stop.set())
+        if hasattr(os, 'fork'):
+            signal.signal(signal.SIGUSR1, lambda signum, frame: promoted.set())
+            signal.pthread_sigmask(signal.SIG_UNBLOCK, {signal.SIGUSR1})
+        else:
+            signal.signal(signal.SIGINT, lambda signum, frame: stop.set())
+
+        # Almacenamiento propio del proceso (sus conexiones no se comparten)
+        storage._storage = storage.ScanStorage(self.db_path, busy_timeout=self.busy_timeout)
+        import app as scanfolder
+        scanfolder.maintenance.enabled = leader
+        if not leader:
+            # Los borrados pendientes los reanuda el proceso con el mantenimiento
+            scanfolder.reclaimer_checked.set()
+        if self.worker_setup is not None:
+            self.worker_setup(scanfolder)
+
+        # Compila las plantillas y carga los módulos antes de la primera petición
+        with scanfolder.app.test_client() as client:
+            client.get('/')
+
+        handler = type('RequestHandler', (_RequestHandler,), {'access_log': self.access_log})
+        server = _WorkerServer(self.socket, scanfolder.app, handler)
+        thread = threading.Thread(target=server.serve_forever, name='scanfolder-http')
+        thread.start()
+
+        while not stop.wait(1.0):
+            if promoted.is_set() and not scanfolder.maintenance.enabled:
+                logger.info(f"Proceso {index}: asume el mantenimiento")
+                scanfolder.maintenance.enabled = True
+                scanfolder.maintenance.start()
+                if storage._storage.get_pending_deletions():
+                    scanfolder.reclaimer.wake()
+
+        drained = server.drain(self.graceful_timeout)
+        if not drained:
+            logger.warning(f"Proceso {index}: peticiones sin terminar tras {self.graceful_timeout} s")
+        with scanfolder.watchers_lock:
+            serials = list(scanfolder.watchers)
+        for serial in serials:
+            scanfolder.stop_watcher(serial)
+        scanfolder.maintenance.stop(timeout=5)
+        scanfolder.reclaimer.stop(timeout=5)
+        thread.join()
+        server.server_close()
+        return EXIT_OK if drained else EXIT_FAILURE
+
+
+def build_parser() -> argparse.ArgumentParser:
+    """Construye el analizador de argumentos."""
+    parser = argparse.ArgumentParser(
+        prog='serve',
+        description='Servidor de producción de ScanFolder (varios procesos)'
+    )
+    parser.add_argument('--host', default=HOST, help='Dirección de escucha')
+    parser.add_argument('--port', type=int, default=PORT, help='Puerto de escucha')
+    parser.add_argument('--workers', type=int, default=WORKERS, help='Procesos de trabajo')
+    parser.add_argument('--db', default=storage.DB_PATH, help='Base de datos SQLite')
+    parser.add_argument('--graceful-timeout', type=float, default=GRACEFUL_TIMEOUT,
+                        help='Segundos de espera a las peticiones en curso al parar')
+    parser.add_argument('--access-log', action='store_true', help='Registrar cada petición')
+    return parser
+
+
+def main(argv=None) -> int:
+    """Punto de entrada del servidor; devuelve el código de salida."""
+    args = build_parser().parse_args(argv)
+    if args.workers < 1:
+        print("Error: --workers debe ser al menos 1", file=sys.stderr)
+        return EXIT_USAGE
+    logging.getLogger().setLevel(logging.INFO)
+
+    server = PreforkServer(args.host, args.port, args.workers, args.db,
+                           graceful_timeout=args.graceful_timeout, access_log=args.access_log)
+    try:
+        server.bind()
+    except OSError as e:
+        print(f"Error: no se pudo abrir {args.host}:{args.port}: {e.strerror}", file=sys.stderr)
+        return EXIT_FAILURE
+    return server.run()
+
+
+if __name__ == '__main__':
+    sys.exit(main())
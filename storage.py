@@ -25,8 +25,15 @@ Licencia: MIT
 
 import sqlite3
 import os
+import base64
+import gzip
+import hashlib
+import json
+import threading
+import time
 from datetime import datetime
-from typing import List, Dict, Optional, Tuple
+from itertools import islice
+from typing import List, Dict, Optional, Tuple, Iterator, BinaryIO, Callable
 import logging
 
 # Configurar logging
@@ -36,6 +43,46 @@ logger = logging.getLogger(__name__)
 # Ruta de la base de datos
 DB_PATH = 'scandata.db'
 
+# Segundos que espera una conexión a que otra (de este u otro proceso) libere
+# el bloqueo de escritura antes de fallar con "database is locked"
+BUSY_TIMEOUT = 5.0
+
+# Bytes del archivo de base de datos que ``warm_up`` lee como máximo
+WARM_UP_BYTES = 1024 ** 3
+
+# Versión del esquema (PRAGMA user_version). Incrementar con cada cambio de
+# esquema para que init_db vuelva a ejecutar la creación y las migraciones.
+SCHEMA_VERSION = 5
+
+# Formato de exportación de catálogos (NDJSON comprimido con gzip)
+EXPORT_FORMAT = 'scanfolder-catalog'
+EXPORT_VERSION = 2
+
+# Tamaño de lote para inserciones masivas e iteración de cursores
+BATCH_SIZE = 5000
+
+# Instrucciones de la VM de SQLite entre comprobaciones del plazo de una búsqueda
+SEARCH_PROGRESS_STEPS = 10000
+
+# Generaciones de cada catálogo que se conservan al compactar (0 = todas)
+KEEP_GENERATIONS = 10
+
+# Ejecuciones de mantenimiento que se conservan en maintenance_runs
+MAINTENANCE_HISTORY = 100
+
+# Filas de directorios borradas por transacción al recuperar catálogos eliminados
+DELETE_CHUNK_SIZE = 2000
+
+# Listado paginado de catálogos: expresión de ordenación de cada criterio (cada
+# una tiene su índice sobre scans) y campos que se pueden proyectar
+CATALOG_SORT_KEYS = {
+    'date': "COALESCE(scan_date, '')",
+    'name': "COALESCE(volume_name, '') COLLATE NOCASE",
+    'size': "COALESCE(total_bytes, -1)"
+}
+CATALOG_FIELDS = ('serial_number', 'volume_name', 'drive_path', 'scan_date',
+                  'total_directories', 'total_files', 'total_bytes', 'generation')
+
 
 class ScanStorage:
     """
@@ -43,14 +90,21 @@ class ScanStorage:
     Encapsula todas las operaciones de base de datos y proporciona una interfaz limpia.
     """
     
-    def __init__(self, db_path: str = DB_PATH):
+    def __init__(self, db_path: str = DB_PATH, keep_generations: int = KEEP_GENERATIONS,
+                 busy_timeout: float = BUSY_TIMEOUT):
         """
         Inicializa la conexión a la base de datos.
         
         Args:
             db_path (str): Ruta al archivo de base de datos SQLite
+            keep_generations (int): Generaciones por catálogo que conserva la
+                política de retención, aplicada por ``run_maintenance``
+                (0 para no compactar nunca)
+            busy_timeout (float): Segundos de espera por el bloqueo de escritura
         """
         self.db_path = db_path
+        self.keep_generations = keep_generations
+        self.busy_timeout = busy_timeout
         self.init_db()
     
     def init_db(self):
@@ -65,19 +119,64 @@ class ScanStorage:
           * drive_path: Ruta de la unidad escaneada (ej: C:\\, D:\\)
           * scan_date: Fecha y hora del escaneo
           * total_directories: Número total de directorios encontrados
+          * total_files / total_bytes: Archivos y bytes de toda la unidad
+            (NULL si el escaneo no incluyó archivos)
+          * generation: Generación vigente del catálogo (1 en el primer escaneo)
+        
+        - scan_generations: Una fila por generación conservada de cada catálogo
+          * scan_id / generation: Catálogo y número de generación
+          * scan_date, total_directories, total_files, total_bytes
+          * added_directories / removed_directories: Rutas que aparecen y
+            desaparecen respecto a la generación anterior
         
         - directories: Almacena cada ruta de directorio encontrada
           * id: Clave primaria autoincremental
           * scan_id: Clave foránea que referencia scans.id
           * directory_path: Ruta completa del directorio
+          * file_count / total_bytes: Archivos y bytes directos del directorio
+          * tree_file_count / tree_bytes: Acumulados recursivos del subárbol,
+            calculados una sola vez al guardar el escaneo
+          * fingerprint: Huella del subárbol (nombres de subcarpetas y tamaños),
+            igual para copias idénticas de una carpeta en cualquier disco
+          * tree_dir_count: Número de subcarpetas descendientes
+          * gen_added / gen_removed: Generaciones en que la fila aparece y deja
+            de estar vigente (NULL mientras siga vigente). Cada generación solo
+            añade filas para los directorios nuevos o modificados
+        
+        - maintenance_runs: Registro de cada ejecución de ``run_maintenance``
+          (duración, pasos realizados y bytes devueltos al sistema de archivos)
+        
+        - pending_deletions: Catálogos eliminados cuyos directorios aún se están
+          borrando en segundo plano (``reclaim_deleted_scans``)
+          * scan_id: Id del escaneo eliminado (AUTOINCREMENT: nunca se reutiliza)
+          * total_rows / deleted_rows: Progreso del borrado
+        
+        - catalog_state: Una única fila con ``version``, el contador que
+          incrementa cada transacción que modifica los catálogos (ETags)
+        
+        Las bases de datos nuevas se crean con ``auto_vacuum = INCREMENTAL`` para
+        que el mantenimiento pueda liberar páginas sin un VACUUM completo. Las
+        anteriores solo se convierten a petición (``cli.py maintenance --convert``).
         """
         try:
-            conn = sqlite3.connect(self.db_path)
+            conn = self._connect()
             cursor = conn.cursor()
             
+            # Esquema ya actualizado: evitar la transacción de creación/migración
+            # (arranque rápido de la CLI y de cada proceso del servidor)
+            cursor.execute("PRAGMA user_version")
+            if cursor.fetchone()[0] == SCHEMA_VERSION:
+                conn.close()
+                logger.debug("Esquema de la base de datos al día")
+                return
+            
             # Habilitar claves foráneas
             cursor.execute("PRAGMA foreign_keys = ON")
             
+            # Solo tiene efecto en una base de datos vacía; las existentes se
+            # convierten con ``cli.py maintenance --convert`` (requiere un VACUUM)
+            cursor.execute("PRAGMA auto_vacuum = INCREMENTAL")
+            
             # Tabla para almacenar información de escaneos
             cursor.execute("""
                 CREATE TABLE IF NOT EXISTS scans (
@@ -87,7 +186,10 @@ class ScanStorage:
                     drive_path TEXT NOT NULL,
                     scan_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
                     total_directories INTEGER DEFAULT 0,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    total_files INTEGER,
+                    total_bytes INTEGER,
+                    generation INTEGER NOT NULL DEFAULT 1
                 )
             """)
             
@@ -97,10 +199,100 @@ class ScanStorage:
                     id INTEGER PRIMARY KEY AUTOINCREMENT,
                     scan_id INTEGER NOT NULL,
                     directory_path TEXT NOT NULL,
+                    file_count INTEGER,
+                    total_bytes INTEGER,
+                    tree_file_count INTEGER,
+                    tree_bytes INTEGER,
+                    fingerprint TEXT,
+                    tree_dir_count INTEGER,
+                    gen_added INTEGER NOT NULL DEFAULT 1,
+                    gen_removed INTEGER,
+                    FOREIGN KEY (scan_id) REFERENCES scans (id) ON DELETE CASCADE
+                )
+            """)
+            
+            # Historial de generaciones de cada catálogo
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS scan_generations (
+                    scan_id INTEGER NOT NULL,
+                    generation INTEGER NOT NULL,
+                    scan_date TIMESTAMP,
+                    total_directories INTEGER DEFAULT 0,
+                    total_files INTEGER,
+                    total_bytes INTEGER,
+                    added_directories INTEGER DEFAULT 0,
+                    removed_directories INTEGER DEFAULT 0,
+                    PRIMARY KEY (scan_id, generation),
                     FOREIGN KEY (scan_id) REFERENCES scans (id) ON DELETE CASCADE
                 )
             """)
             
+            # Historial de ejecuciones de mantenimiento
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS maintenance_runs (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    started_at TIMESTAMP NOT NULL,
+                    duration_ms INTEGER NOT NULL,
+                    steps TEXT NOT NULL,
+                    pages_vacuumed INTEGER DEFAULT 0,
+                    bytes_before INTEGER,
+                    bytes_after INTEGER,
+                    bytes_reclaimed INTEGER DEFAULT 0,
+                    interrupted INTEGER DEFAULT 0
+                )
+            """)
+            
+            # Catálogos eliminados pendientes de borrar sus directorios
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS pending_deletions (
+                    scan_id INTEGER PRIMARY KEY,
+                    serial_number TEXT NOT NULL,
+                    volume_name TEXT,
+                    total_rows INTEGER NOT NULL DEFAULT 0,
+                    deleted_rows INTEGER NOT NULL DEFAULT 0,
+                    requested_at TIMESTAMP NOT NULL
+                )
+            """)
+            
+            # Versión de los catálogos, compartida por todos los procesos
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS catalog_state (
+                    id INTEGER PRIMARY KEY CHECK (id = 1),
+                    version INTEGER NOT NULL DEFAULT 0
+                )
+            """)
+            cursor.execute("INSERT OR IGNORE INTO catalog_state (id, version) VALUES (1, 0)")
+            
+            # Migrar bases de datos creadas con versiones anteriores del esquema
+            self._ensure_columns(cursor, 'scans', {
+                'total_files': 'INTEGER',
+                'total_bytes': 'INTEGER',
+                'generation': 'INTEGER NOT NULL DEFAULT 1'
+            })
+            self._ensure_columns(cursor, 'directories', {
+                'file_count': 'INTEGER',
+                'total_bytes': 'INTEGER',
+                'tree_file_count': 'INTEGER',
+                'tree_bytes': 'INTEGER',
+                'fingerprint': 'TEXT',
+                'tree_dir_count': 'INTEGER',
+                'gen_added': 'INTEGER NOT NULL DEFAULT 1',
+                'gen_removed': 'INTEGER'
+            })
+            
+            # Catálogos anteriores al historial de generaciones: registrar la primera
+            cursor.execute("""
+                INSERT INTO scan_generations (scan_id, generation, scan_date,
+                                              total_directories, total_files,
+                                              total_bytes, added_directories)
+                SELECT id, generation, scan_date, total_directories, total_files,
+                       total_bytes, total_directories
+                FROM scans s
+                WHERE NOT EXISTS (
+                    SELECT 1 FROM scan_generations g WHERE g.scan_id = s.id
+                )
+            """)
+            
             # Crear índices para mejorar el rendimiento de las búsquedas
             cursor.execute("""
                 CREATE INDEX IF NOT EXISTS idx_serial_number 
@@ -117,6 +309,29 @@ class ScanStorage:
                 ON directories (directory_path)
             """)
             
+            # Consulta de tamaño de una carpeta concreta de un catálogo
+            cursor.execute("""
+                CREATE INDEX IF NOT EXISTS idx_scan_directory 
+                ON directories (scan_id, directory_path)
+            """)
+            
+            # Detección de duplicados: GROUP BY fingerprint cubierto por un índice
+            # parcial que solo contiene los directorios vigentes
+            cursor.execute("DROP INDEX IF EXISTS idx_fingerprint")
+            cursor.execute("""
+                CREATE INDEX IF NOT EXISTS idx_fingerprint_live 
+                ON directories (fingerprint, scan_id, tree_dir_count)
+                WHERE gen_removed IS NULL
+            """)
+            
+            # Listado paginado de catálogos (keyset sobre clave de orden + id)
+            for sort, expression in CATALOG_SORT_KEYS.items():
+                cursor.execute(f"""
+                    CREATE INDEX IF NOT EXISTS idx_scans_{sort}
+                    ON scans ({expression}, id)
+                """)
+            
+            cursor.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
             conn.commit()
             conn.close()
             logger.info("Base de datos inicializada correctamente")
@@ -127,78 +342,331 @@ class ScanStorage:
                 conn.close()
             raise
     
+    def _connect(self, **kwargs) -> sqlite3.Connection:
+        """Abre una conexión nueva con la espera de bloqueo configurada."""
+        return sqlite3.connect(self.db_path, timeout=self.busy_timeout, **kwargs)
+    
+    def enable_wal(self) -> bool:
+        """
+        Cambia la base de datos al modo WAL (persistente en el archivo).
+        
+        En modo WAL las lecturas no esperan a las escrituras, así que varios
+        procesos pueden buscar mientras otro guarda un escaneo; solo los
+        escritores se turnan (``busy_timeout``).
+        
+        Returns:
+            bool: True si la base de datos queda en modo WAL
+        """
+        try:
+            with self._connect() as conn:
+                mode = conn.execute("PRAGMA journal_mode = WAL").fetchone()[0]
+            if mode != 'wal':
+                logger.warning(f"No se pudo activar el modo WAL (modo actual: {mode})")
+                return False
+            return True
+        except sqlite3.Error as e:
+            logger.error(f"Error al activar el modo WAL: {e}")
+            return False
+    
+    def warm_up(self, max_bytes: int = WARM_UP_BYTES) -> Dict:
+        """
+        Lee la base de datos para cargar tablas e índices en la caché del sistema.
+        
+        Se hace una sola vez antes de arrancar los procesos del servidor, de
+        modo que las primeras búsquedas no pagan las lecturas de disco.
+        
+        Args:
+            max_bytes (int): Bytes a leer como máximo (por archivo)
+        
+        Returns:
+            Dict: ``bytes`` leídos y ``duration_ms``
+        """
+        started = time.monotonic()
+        total = 0
+        for suffix in ('', '-wal'):
+            try:
+                with open(self.db_path + suffix, 'rb') as db_file:
+                    remaining = max_bytes
+                    while remaining > 0:
+                        chunk = db_file.read(min(remaining, 1024 * 1024))
+                        if not chunk:
+                            break
+                        total += len(chunk)
+                        remaining -= len(chunk)
+            except OSError:
+                continue
+        
+        try:
+            with self._connect() as conn:
+                # Carga el esquema y las estadísticas del planificador
+                conn.execute("SELECT COUNT(*) FROM scans").fetchone()
+        except sqlite3.Error as e:
+            logger.error(f"Error al precargar la base de datos: {e}")
+        
+        return {'bytes': total, 'duration_ms': round((time.monotonic() - started) * 1000, 1)}
+    
+    def get_catalog_version(self) -> str:
+        """
+        Obtiene el identificador de versión de los catálogos.
+        
+        Es el contador de ``catalog_state``, que incrementa dentro de su propia
+        transacción cada escritura que modifica los catálogos, así que cambia
+        igual con independencia del proceso que escribe. Leerlo es una consulta
+        de una fila por clave primaria. Sirve como ETag para las respuestas que
+        dependen de los catálogos.
+        
+        Returns:
+            str: Identificador que cambia con cada modificación de los catálogos
+                (vacío si no se puede leer, para no servir un 304 incorrecto)
+        """
+        try:
+            with self._connect() as conn:
+                row = conn.execute("SELECT version FROM catalog_state WHERE id = 1").fetchone()
+                return format(row[0], 'x') if row else ''
+        except sqlite3.Error as e:
+            logger.error(f"Error al leer la versión de los catálogos: {e}")
+            return ''
+    
+    @staticmethod
+    def _bump_catalog_version(cursor: sqlite3.Cursor):
+        """Marca los catálogos como modificados dentro de la transacción en curso."""
+        cursor.execute("UPDATE catalog_state SET version = version + 1 WHERE id = 1")
+    
+    @staticmethod
+    def _ensure_columns(cursor: sqlite3.Cursor, table: str, columns: Dict[str, str]):
+        """
+        Añade a una tabla existente las columnas que le falten.
+        
+        Args:
+            cursor (sqlite3.Cursor): Cursor de la conexión activa
+            table (str): Nombre de la tabla
+            columns (Dict[str, str]): Nombre y tipo SQL de cada columna
+        """
+        cursor.execute(f"PRAGMA table_info({table})")
+        existing = {row[1] for row in cursor.fetchall()}
+        for name, sql_type in columns.items():
+            if name not in existing:
+                cursor.execute(f"ALTER TABLE {table} ADD COLUMN {name} {sql_type}")
+                logger.info(f"Columna {table}.{name} añadida")
+    
     def add_scan(self, serial_number: str, volume_name: str, drive_path: str, 
-                 directories: List[str]) -> bool:
+                 directories: List[str],
+                 file_stats: Optional[Dict[str, Tuple[int, int]]] = None,
+                 progress: Optional[Callable[[int], None]] = None) -> bool:
         """
         Añade un nuevo escaneo a la base de datos junto con todos sus directorios.
         
+        Si se proporcionan estadísticas de archivos, los acumulados recursivos de
+        cada carpeta se calculan aquí, una sola vez, para que las consultas de
+        tamaño sobre catálogos desconectados sean una búsqueda indexada. También
+        se calcula la huella de cada subárbol para la detección de duplicados.
+        
+        Si el disco ya estaba catalogado, el escaneo se guarda como una nueva
+        generación: solo se registran los directorios añadidos y eliminados
+        respecto a la anterior (ver ``_store_generation``).
+        
         Args:
             serial_number (str): Número de serie único del volumen
             volume_name (str): Nombre del volumen del disco
             drive_path (str): Ruta de la unidad escaneada
             directories (List[str]): Lista de rutas de directorios encontrados
+            file_stats (Optional[Dict[str, Tuple[int, int]]]): ``(archivos, bytes)``
+                directos por directorio, o None si no se recopilaron
+            progress (Optional[Callable[[int], None]]): Recibe el número de
+                directorios guardados tras cada lote
         
         Returns:
             bool: True si el escaneo se guardó correctamente, False en caso contrario
         """
+        rollups = compute_size_rollups(directories, file_stats) if file_stats is not None else {}
+        fingerprints = compute_fingerprints(directories, file_stats)
+        if file_stats is not None:
+            total_files = sum(files for files, _ in file_stats.values())
+            total_bytes = sum(size for _, size in file_stats.values())
+        else:
+            total_files = total_bytes = None
+        
+        def directory_rows():
+            for directory in directories:
+                direct = file_stats.get(directory) if file_stats is not None else None
+                tree = rollups.get(directory)
+                fingerprint, tree_dirs = fingerprints[directory]
+                yield (
+                    directory, fingerprint, tree_dirs,
+                    direct[0] if direct else None, direct[1] if direct else None,
+                    tree[0] if tree else None, tree[1] if tree else None
+                )
+        
         try:
-            with sqlite3.connect(self.db_path) as conn:
+            with self._connect() as conn:
                 cursor = conn.cursor()
                 
-                # Verificar si ya existe un escaneo con este número de serie
-                cursor.execute("""
-                    SELECT id FROM scans WHERE serial_number = ?
-                """, (serial_number,))
-                
-                existing_scan = cursor.fetchone()
-                
-                if existing_scan:
-                    # Actualizar escaneo existente
-                    scan_id = existing_scan[0]
-                    
-                    # Eliminar directorios antiguos
-                    cursor.execute("""
-                        DELETE FROM directories WHERE scan_id = ?
-                    """, (scan_id,))
-                    
-                    # Actualizar información del escaneo
-                    cursor.execute("""
-                        UPDATE scans 
-                        SET volume_name = ?, drive_path = ?, scan_date = ?, 
-                            total_directories = ?
-                        WHERE id = ?
-                    """, (volume_name, drive_path, datetime.now(), 
-                          len(directories), scan_id))
-                    
-                    logger.info(f"Escaneo actualizado para el disco {serial_number}")
-                    
-                else:
-                    # Crear nuevo escaneo
-                    cursor.execute("""
-                        INSERT INTO scans (serial_number, volume_name, drive_path, 
-                                         scan_date, total_directories)
-                        VALUES (?, ?, ?, ?, ?)
-                    """, (serial_number, volume_name, drive_path, 
-                          datetime.now(), len(directories)))
-                    
-                    scan_id = cursor.lastrowid
-                    logger.info(f"Nuevo escaneo creado para el disco {serial_number}")
-                
-                # Insertar todos los directorios
-                directory_data = [(scan_id, directory) for directory in directories]
-                cursor.executemany("""
-                    INSERT INTO directories (scan_id, directory_path)
-                    VALUES (?, ?)
-                """, directory_data)
+                scan_id, generation, _ = self._store_generation(
+                    cursor, serial_number, volume_name, drive_path, directory_rows(),
+                    datetime.now(), total_files, total_bytes, progress=progress
+                )
                 
                 conn.commit()
-                logger.info(f"Se guardaron {len(directories)} directorios para el escaneo {scan_id}")
-                return True
+                logger.info(f"Se guardaron {len(directories)} directorios para el escaneo "
+                            f"{scan_id} (generación {generation})")
+            
+            return True
                 
         except sqlite3.Error as e:
             logger.error(f"Error al guardar el escaneo: {e}")
             return False
     
+    def _store_generation(self, cursor: sqlite3.Cursor, serial_number: str,
+                          volume_name: Optional[str], drive_path: str,
+                          rows: Iterator[tuple], scan_date,
+                          total_files: Optional[int],
+                          total_bytes: Optional[int],
+                          progress: Optional[Callable[[int], None]] = None
+                          ) -> Tuple[int, int, int]:
+        """
+        Guarda un escaneo como nueva generación de un catálogo, almacenando deltas.
+        
+        Las filas entrantes se vuelcan por lotes a una tabla temporal y se comparan
+        en SQL con los directorios vigentes: las filas vigentes que ya no aparecen
+        (o cuya huella cambió) se marcan con ``gen_removed`` y solo se insertan las
+        rutas nuevas o modificadas con ``gen_added``. Los directorios sin cambios
+        no se reescriben. No hace commit; la transacción la gestiona el llamador.
+        
+        Args:
+            cursor (sqlite3.Cursor): Cursor de la conexión activa
+            serial_number (str): Número de serie del volumen
+            volume_name (Optional[str]): Nombre del volumen
+            drive_path (str): Ruta de la unidad
+            rows (Iterator[tuple]): ``(ruta, huella, subcarpetas, archivos, bytes,
+                archivos_subárbol, bytes_subárbol)`` por directorio
+            scan_date: Fecha del escaneo
+            total_files (Optional[int]): Archivos de toda la unidad
+            total_bytes (Optional[int]): Bytes de toda la unidad
+            progress (Optional[Callable[[int], None]]): Recibe el número de
+                directorios cargados tras cada lote
+        
+        Returns:
+            Tuple[int, int, int]: ``(scan_id, generación, directorios)``
+        """
+        cursor.execute("""
+            SELECT id, generation FROM scans WHERE serial_number = ?
+        """, (serial_number,))
+        existing_scan = cursor.fetchone()
+        
+        if existing_scan:
+            scan_id, generation = existing_scan[0], existing_scan[1] + 1
+            logger.info(f"Escaneo actualizado para el disco {serial_number}")
+        else:
+            cursor.execute("""
+                INSERT INTO scans (serial_number, volume_name, drive_path, generation)
+                VALUES (?, ?, ?, 1)
+            """, (serial_number, volume_name, drive_path))
+            scan_id, generation = cursor.lastrowid, 1
+            logger.info(f"Nuevo escaneo creado para el disco {serial_number}")
+        
+        cursor.execute("""
+            CREATE TEMP TABLE IF NOT EXISTS incoming_directories (
+                directory_path TEXT NOT NULL,
+                fingerprint TEXT,
+                tree_dir_count INTEGER,
+                file_count INTEGER,
+                total_bytes INTEGER,
+                tree_file_count INTEGER,
+                tree_bytes INTEGER
+            )
+        """)
+        cursor.execute("""
+            CREATE INDEX IF NOT EXISTS temp.idx_incoming_path
+            ON incoming_directories (directory_path, fingerprint)
+        """)
+        cursor.execute("DELETE FROM incoming_directories")
+        
+        total = 0
+        while True:
+            batch = list(islice(rows, BATCH_SIZE))
+            if not batch:
+                break
+            cursor.executemany("""
+                INSERT INTO incoming_directories (directory_path, fingerprint,
+                                                  tree_dir_count, file_count, total_bytes,
+                                                  tree_file_count, tree_bytes)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+            """, batch)
+            total += len(batch)
+            if progress:
+                progress(total)
+        
+        # Tamaño del delta: rutas que aparecen o desaparecen. Las carpetas que
+        # siguen existiendo con otra huella (ej: los antecesores de un cambio)
+        # se reescriben abajo pero no cuentan como añadidas ni eliminadas
+        cursor.execute("""
+            SELECT COUNT(*) FROM directories d
+            WHERE d.scan_id = ? AND d.gen_removed IS NULL
+              AND NOT EXISTS (
+                  SELECT 1 FROM incoming_directories i
+                  WHERE i.directory_path = d.directory_path
+              )
+        """, (scan_id,))
+        removed = cursor.fetchone()[0]
+        cursor.execute("""
+            SELECT COUNT(*) FROM incoming_directories i
+            WHERE NOT EXISTS (
+                SELECT 1 FROM directories d
+                WHERE d.scan_id = ? AND d.directory_path = i.directory_path
+                  AND d.gen_removed IS NULL
+            )
+        """, (scan_id,))
+        added = cursor.fetchone()[0]
+        
+        # Directorios que desaparecen o cambian respecto a la generación anterior
+        cursor.execute("""
+            UPDATE directories SET gen_removed = ?
+            WHERE scan_id = ? AND gen_removed IS NULL
+              AND NOT EXISTS (
+                  SELECT 1 FROM incoming_directories i
+                  WHERE i.directory_path = directories.directory_path
+                    AND i.fingerprint IS directories.fingerprint
+              )
+        """, (generation, scan_id))
+        
+        # Directorios nuevos o modificados (sin versión vigente tras el paso anterior)
+        cursor.execute("""
+            INSERT INTO directories (scan_id, directory_path, fingerprint, tree_dir_count,
+                                     file_count, total_bytes, tree_file_count,
+                                     tree_bytes, gen_added)
+            SELECT ?, i.directory_path, i.fingerprint, i.tree_dir_count, i.file_count,
+                   i.total_bytes, i.tree_file_count, i.tree_bytes, ?
+            FROM incoming_directories i
+            WHERE NOT EXISTS (
+                SELECT 1 FROM directories d
+                WHERE d.scan_id = ? AND d.directory_path = i.directory_path
+                  AND d.gen_removed IS NULL
+            )
+        """, (scan_id, generation, scan_id))
+        cursor.execute("DELETE FROM incoming_directories")
+        
+        cursor.execute("""
+            UPDATE scans 
+            SET volume_name = ?, drive_path = ?, scan_date = ?, 
+                total_directories = ?, total_files = ?, total_bytes = ?,
+                generation = ?
+            WHERE id = ?
+        """, (volume_name, drive_path, scan_date, total, total_files, total_bytes,
+              generation, scan_id))
+        
+        cursor.execute("""
+            INSERT INTO scan_generations (scan_id, generation, scan_date,
+                                          total_directories, total_files, total_bytes,
+                                          added_directories, removed_directories)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+        """, (scan_id, generation, scan_date, total, total_files, total_bytes,
+              added, removed))
+        self._bump_catalog_version(cursor)
+        
+        logger.info(f"Generación {generation} del disco {serial_number}: "
+                    f"{added} añadidos, {removed} eliminados")
+        return scan_id, generation, total
+    
     def get_scan_history(self) -> List[Dict]:
         """
         Obtiene el historial completo de escaneos realizados.
@@ -207,12 +675,13 @@ class ScanStorage:
             List[Dict]: Lista de diccionarios con información de cada escaneo
         """
         try:
-            with sqlite3.connect(self.db_path) as conn:
+            with self._connect() as conn:
                 cursor = conn.cursor()
                 
                 cursor.execute("""
                     SELECT id, serial_number, volume_name, drive_path, 
-                           scan_date, total_directories
+                           scan_date, total_directories, total_files, total_bytes,
+                           generation
                     FROM scans 
                     ORDER BY scan_date DESC
                 """)
@@ -226,6 +695,9 @@ class ScanStorage:
                         'drive_path': row[3],
                         'scan_date': row[4],
                         'total_directories': row[5],
+                        'total_files': row[6],
+                        'total_bytes': row[7],
+                        'generation': row[8],
                         # Mantener compatibilidad con el formato anterior
                         'catalog_name': row[1],  # usar serial_number como catalog_name
                         'fecha': row[4],
@@ -240,45 +712,119 @@ class ScanStorage:
             logger.error(f"Error al obtener el historial de escaneos: {e}")
             return []
     
-    def search_directories(self, search_term: str) -> List[Dict]:
+    def list_catalogs(self, sort: str = 'date', descending: bool = True,
+                      name_filter: Optional[str] = None, after: Optional[str] = None,
+                      limit: int = 50, fields: Optional[List[str]] = None) -> Optional[Dict]:
+        """
+        Lista los catálogos por páginas (paginación por clave, sin OFFSET).
+        
+        Cada página continúa a partir del cursor opaco ``next`` de la anterior,
+        de modo que el coste no crece con el número de página y los catálogos
+        añadidos entre peticiones no desplazan los resultados.
+        
+        Args:
+            sort (str): Criterio de orden: 'date', 'name' o 'size'
+            descending (bool): Orden descendente
+            name_filter (Optional[str]): Texto contenido en el nombre o el serial
+            after (Optional[str]): Cursor ``next`` de la página anterior
+            limit (int): Catálogos por página
+            fields (Optional[List[str]]): Campos a devolver (por defecto todos los
+                de ``CATALOG_FIELDS``)
+        
+        Returns:
+            Optional[Dict]: ``catalogs``, ``next`` (None en la última página) y,
+                en la primera página, ``total`` de catálogos que cumplen el filtro.
+                None si el criterio, los campos o el cursor no son válidos
+        """
+        if sort not in CATALOG_SORT_KEYS:
+            return None
+        fields = list(fields or CATALOG_FIELDS)
+        if any(field not in CATALOG_FIELDS for field in fields):
+            return None
+        
+        sort_sql = CATALOG_SORT_KEYS[sort]
+        direction = 'DESC' if descending else 'ASC'
+        conditions = []
+        params = []
+        if name_filter:
+            conditions.append("(volume_name LIKE ? ESCAPE '\\' OR serial_number LIKE ? ESCAPE '\\')")
+            pattern = f"%{_escape_like(name_filter)}%"
+            params.extend((pattern, pattern))
+        filter_params = list(params)
+        if after is not None:
+            try:
+                key, last_id = _decode_cursor(after)
+            except ValueError:
+                return None
+            # Equivale a (clave, id) < (?, ?), escrito de forma que SQLite busque
+            # directamente en el índice en lugar de recorrerlo desde el principio
+            op = '<' if descending else '>'
+            conditions.append(f"{sort_sql} {op}= ? AND ({sort_sql} {op} ? OR id {op} ?)")
+            params.extend((key, key, last_id))
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ''
+        
+        try:
+            with self._connect() as conn:
+                cursor = conn.cursor()
+                cursor.execute(f"""
+                    SELECT {sort_sql}, id, {', '.join(fields)}
+                    FROM scans
+                    {where}
+                    ORDER BY {sort_sql} {direction}, id {direction}
+                    LIMIT ?
+                """, (*params, limit + 1))
+                rows = cursor.fetchall()
+                
+                page = {'catalogs': [dict(zip(fields, row[2:])) for row in rows[:limit]],
+                        'next': None}
+                if len(rows) > limit:
+                    page['next'] = _encode_cursor(rows[limit - 1][0], rows[limit - 1][1])
+                if after is None:
+                    cursor.execute(f"SELECT COUNT(*) FROM scans {where}", filter_params)
+                    page['total'] = cursor.fetchone()[0]
+                return page
+                
+        except sqlite3.Error as e:
+            logger.error(f"Error al listar catálogos: {e}")
+            return None
+    
+    def search_directories(self, search_term: str, serial_number: Optional[str] = None,
+                           generation: Optional[int] = None,
+                           limit: Optional[int] = None) -> List[Dict]:
         """
         Busca directorios que contengan el término especificado en todos los escaneos.
         
         Args:
             search_term (str): Término de búsqueda para filtrar directorios
+            serial_number (Optional[str]): Limitar la búsqueda a un catálogo
+            generation (Optional[int]): Buscar en el catálogo tal y como estaba en
+                esa generación (requiere ``serial_number``); por defecto la vigente
+            limit (Optional[int]): Máximo de resultados (se aplica en SQLite)
         
         Returns:
-            List[Dict]: Lista de diccionarios con información de directorios encontrados
+            List[Dict]: Lista de diccionarios con información de directorios
+                encontrados (vacía si la generación no existe o ya se compactó;
+                ``has_generation`` permite distinguirlo)
         """
+        if generation is not None and serial_number is None:
+            logger.warning("La búsqueda por generación requiere un número de serie")
+            return []
+        
         try:
-            with sqlite3.connect(self.db_path) as conn:
+            with self._connect() as conn:
                 cursor = conn.cursor()
+                if not _generation_available(cursor, serial_number, generation):
+                    return []
                 
-                # Búsqueda case-insensitive usando LIKE con comodines
-                search_pattern = f"%{search_term.lower()}%"
-                
-                cursor.execute("""
-                    SELECT s.serial_number, s.volume_name, s.drive_path, 
-                           d.directory_path, s.scan_date
-                    FROM directories d
-                    JOIN scans s ON d.scan_id = s.id
-                    WHERE LOWER(d.directory_path) LIKE ?
-                    ORDER BY s.volume_name, d.directory_path
-                """, (search_pattern,))
+                sql, params = _search_query(search_term, serial_number, generation)
+                limit_sql = ''
+                if limit is not None:
+                    limit_sql = 'LIMIT ?'
+                    params.append(limit)
                 
-                results = []
-                for row in cursor.fetchall():
-                    result_data = {
-                        'serial_number': row[0],
-                        'volume_name': row[1] or 'Desconocido',
-                        'drive_path': row[2],
-                        'directory_path': row[3],
-                        'scan_date': row[4],
-                        # Mantener compatibilidad con el formato anterior
-                        'catalog_name': row[0],  # usar serial_number como catalog_name
-                        'ruta': row[3]
-                    }
-                    results.append(result_data)
+                cursor.execute(f"{sql} ORDER BY s.volume_name, d.directory_path {limit_sql}",
+                               params)
+                results = [_search_result(row) for row in cursor.fetchall()]
                 
                 logger.info(f"Búsqueda '{search_term}': {len(results)} resultados encontrados")
                 return results
@@ -287,6 +833,87 @@ class ScanStorage:
             logger.error(f"Error al buscar directorios: {e}")
             return []
     
+    def search_directories_bounded(self, search_term: str, serial_number: Optional[str] = None,
+                                   generation: Optional[int] = None, limit: int = 100,
+                                   timeout: Optional[float] = None,
+                                   cancel_event: Optional[threading.Event] = None) -> Dict:
+        """
+        Búsqueda con presupuesto de tiempo y cancelable desde otro hilo.
+        
+        El orden y el límite se aplican en SQLite (``ORDER BY`` volumen, ruta
+        y ``LIMIT``), igual que en ``search_directories``. Un progress handler
+        de SQLite solo se encarga de abortar la consulta cuando se agota
+        ``timeout`` o se activa ``cancel_event``. Como SQLite tiene que ordenar
+        todas las coincidencias antes de devolver la primera, una búsqueda
+        interrumpida no devuelve resultados: ``results`` queda vacío y
+        ``truncated`` indica que la ausencia no significa "sin coincidencias".
+        
+        Args:
+            search_term (str): Término de búsqueda
+            serial_number (Optional[str]): Limitar la búsqueda a un catálogo
+            generation (Optional[int]): Generación del catálogo (requiere serial)
+            limit (int): Máximo de resultados
+            timeout (Optional[float]): Segundos disponibles para la consulta
+            cancel_event (Optional[threading.Event]): Cancela la consulta al activarse
+                (sirve cualquier objeto con ``is_set()``)
+            
+        Returns:
+            Dict: ``results`` (misma forma que ``search_directories``; vacío
+                si se interrumpió), ``truncated`` (la consulta no llegó al final)
+                y ``cancelled`` (se detuvo por ``cancel_event``)
+        """
+        outcome = {'results': [], 'truncated': False, 'cancelled': False}
+        if generation is not None and serial_number is None:
+            logger.warning("La búsqueda por generación requiere un número de serie")
+            return outcome
+        
+        deadline = time.monotonic() + timeout if timeout is not None else None
+        stopped = []
+        
+        def should_stop():
+            if cancel_event is not None and cancel_event.is_set():
+                stopped.append('cancelled')
+                return 1
+            if deadline is not None and time.monotonic() > deadline:
+                stopped.append('timeout')
+                return 1
+            return 0
+        
+        rows = []
+        try:
+            conn = self._connect()
+            try:
+                if not _generation_available(conn.cursor(), serial_number, generation):
+                    return outcome
+                conn.set_progress_handler(should_stop, SEARCH_PROGRESS_STEPS)
+                sql, params = _search_query(search_term, serial_number, generation)
+                cursor = conn.execute(f"{sql} ORDER BY s.volume_name, d.directory_path LIMIT ?",
+                                      (*params, limit))
+                while True:
+                    batch = cursor.fetchmany(BATCH_SIZE)
+                    if not batch:
+                        break
+                    rows.extend(batch)
+            finally:
+                conn.close()
+        except sqlite3.OperationalError as e:
+            # La interrupción llega como OperationalError; otros errores se registran
+            if not stopped:
+                logger.error(f"Error al buscar directorios: {e}")
+                return outcome
+        except sqlite3.Error as e:
+            logger.error(f"Error al buscar directorios: {e}")
+            return outcome
+        
+        if stopped:
+            # Un resultado incompleto del orden no sería el principio de la lista
+            outcome['truncated'] = True
+            outcome['cancelled'] = 'cancelled' in stopped
+            logger.info(f"Búsqueda '{search_term}' detenida ({stopped[0]}) sin resultados")
+            return outcome
+        outcome['results'] = [_search_result(row) for row in rows]
+        return outcome
+    
     def get_scan_by_serial(self, serial_number: str) -> Optional[Dict]:
         """
         Obtiene información de un escaneo específico por su número de serie.
@@ -298,12 +925,13 @@ class ScanStorage:
             Optional[Dict]: Información del escaneo o None si no se encuentra
         """
         try:
-            with sqlite3.connect(self.db_path) as conn:
+            with self._connect() as conn:
                 cursor = conn.cursor()
                 
                 cursor.execute("""
                     SELECT id, serial_number, volume_name, drive_path, 
-                           scan_date, total_directories
+                           scan_date, total_directories, total_files, total_bytes,
+                           generation
                     FROM scans 
                     WHERE serial_number = ?
                 """, (serial_number,))
@@ -316,7 +944,10 @@ class ScanStorage:
                         'volume_name': row[2],
                         'drive_path': row[3],
                         'scan_date': row[4],
-                        'total_directories': row[5]
+                        'total_directories': row[5],
+                        'total_files': row[6],
+                        'total_bytes': row[7],
+                        'generation': row[8]
                     }
                 return None
                 
@@ -324,26 +955,29 @@ class ScanStorage:
             logger.error(f"Error al buscar escaneo por serial {serial_number}: {e}")
             return None
     
-    def get_directories_by_scan(self, scan_id: int) -> List[str]:
+    def get_directories_by_scan(self, scan_id: int,
+                                generation: Optional[int] = None) -> List[str]:
         """
         Obtiene todos los directorios de un escaneo específico.
         
         Args:
             scan_id (int): ID del escaneo
+            generation (Optional[int]): Generación a consultar; por defecto la vigente
         
         Returns:
             List[str]: Lista de rutas de directorios
         """
         try:
-            with sqlite3.connect(self.db_path) as conn:
+            with self._connect() as conn:
                 cursor = conn.cursor()
                 
-                cursor.execute("""
+                live_sql, live_params = _generation_filter('directories', generation)
+                cursor.execute(f"""
                     SELECT directory_path 
                     FROM directories 
-                    WHERE scan_id = ?
+                    WHERE scan_id = ? AND {live_sql}
                     ORDER BY directory_path
-                """, (scan_id,))
+                """, (scan_id, *live_params))
                 
                 return [row[0] for row in cursor.fetchall()]
                 
@@ -351,96 +985,1391 @@ class ScanStorage:
             logger.error(f"Error al obtener directorios del escaneo {scan_id}: {e}")
             return []
     
-    def delete_scan(self, serial_number: str) -> bool:
+    def get_directory_size(self, serial_number: str, directory_path: str) -> Optional[Dict]:
         """
-        Elimina un escaneo y todos sus directorios asociados.
+        Obtiene el tamaño acumulado de una carpeta de un catálogo.
+        
+        Los acumulados se calculan al guardar el escaneo, así que la consulta es
+        una única búsqueda sobre el índice ``(scan_id, directory_path)`` y no
+        requiere que la unidad esté conectada.
         
         Args:
-            serial_number (str): Número de serie del volumen a eliminar
+            serial_number (str): Número de serie del volumen
+            directory_path (str): Ruta completa de la carpeta
         
         Returns:
-            bool: True si se eliminó correctamente, False en caso contrario
+            Optional[Dict]: Archivos y bytes directos y recursivos de la carpeta,
+            o None si no existe (los valores son None si no se recopilaron)
         """
         try:
-            with sqlite3.connect(self.db_path) as conn:
+            with self._connect() as conn:
                 cursor = conn.cursor()
                 
-                # Obtener el ID del escaneo
                 cursor.execute("""
-                    SELECT id FROM scans WHERE serial_number = ?
-                """, (serial_number,))
+                    SELECT d.directory_path, d.file_count, d.total_bytes,
+                           d.tree_file_count, d.tree_bytes
+                    FROM directories d
+                    JOIN scans s ON d.scan_id = s.id
+                    WHERE s.serial_number = ? AND d.directory_path = ?
+                      AND d.gen_removed IS NULL
+                """, (serial_number, directory_path))
                 
-                scan_row = cursor.fetchone()
-                if not scan_row:
-                    logger.warning(f"No se encontró escaneo con serial {serial_number}")
-                    return False
+                row = cursor.fetchone()
+                if row:
+                    return {
+                        'serial_number': serial_number,
+                        'directory_path': row[0],
+                        'file_count': row[1],
+                        'total_bytes': row[2],
+                        'tree_file_count': row[3],
+                        'tree_bytes': row[4]
+                    }
+                return None
                 
-                scan_id = scan_row[0]
+        except sqlite3.Error as e:
+            logger.error(f"Error al obtener el tamaño de {directory_path}: {e}")
+            return None
+    
+    def find_duplicate_directories(self, min_directories: int = 1,
+                                   limit: int = 100) -> List[Dict]:
+        """
+        Busca subárboles de carpetas idénticos repartidos entre varios catálogos.
+        
+        Las huellas se calculan al guardar cada escaneo, así que el informe es un
+        único GROUP BY sobre ``idx_fingerprint_live`` en lugar de comparar catálogos
+        por pares. Las copias de cada grupo se obtienen después con una segunda
+        consulta limitada a las huellas devueltas.
+        
+        Solo se informan los duplicados máximos: si todas las copias de un grupo
+        están dentro de carpetas padre con la misma huella, el grupo ya está
+        incluido en el de sus padres y se omite (ej: ``Fotos\\2024`` cuando
+        ``Fotos`` entero está duplicado).
+        
+        Args:
+            min_directories (int): Mínimo de subcarpetas que debe tener el
+                subárbol (evita listar carpetas vacías o triviales)
+            limit (int): Número máximo de grupos a devolver
+        
+        Returns:
+            List[Dict]: Grupos ordenados de mayor a menor subárbol, cada uno con
+            su huella, tamaño y la lista de copias (serial, volumen y ruta)
+        """
+        try:
+            with self._connect() as conn:
+                groups_cursor = conn.cursor()
+                cursor = conn.cursor()
                 
-                # Eliminar directorios (la clave foránea con CASCADE debería hacer esto automáticamente)
-                cursor.execute("""
-                    DELETE FROM directories WHERE scan_id = ?
-                """, (scan_id,))
+                groups_cursor.execute("""
+                    SELECT fingerprint, MAX(tree_dir_count), COUNT(*)
+                    FROM directories
+                    WHERE fingerprint IS NOT NULL AND tree_dir_count >= ?
+                      AND gen_removed IS NULL
+                      AND scan_id NOT IN (SELECT scan_id FROM pending_deletions)
+                    GROUP BY fingerprint
+                    HAVING COUNT(DISTINCT scan_id) > 1
+                    ORDER BY MAX(tree_dir_count) DESC, COUNT(*) DESC
+                """, (min_directories,))
                 
-                # Eliminar el escaneo
-                cursor.execute("""
-                    DELETE FROM scans WHERE id = ?
-                """, (scan_id,))
+                # Los grupos contenidos en otro se descartan, así que se leen por
+                # bloques hasta reunir ``limit`` grupos máximos
+                result = []
+                while len(result) < limit:
+                    rows = groups_cursor.fetchmany(limit)
+                    if not rows:
+                        break
+                    
+                    groups = {}
+                    for row in rows:
+                        groups[row[0]] = {
+                            'fingerprint': row[0],
+                            'tree_directories': row[1],
+                            'tree_bytes': None,
+                            'copies': []
+                        }
+                    parents = {fingerprint: set() for fingerprint in groups}
+                    
+                    placeholders = ','.join('?' * len(groups))
+                    cursor.execute(f"""
+                        SELECT d.fingerprint, s.serial_number, s.volume_name,
+                               d.directory_path, d.tree_bytes,
+                               (SELECT p.fingerprint FROM directories p
+                                WHERE p.scan_id = d.scan_id AND p.gen_removed IS NULL
+                                  AND p.directory_path <> d.directory_path
+                                  AND {_PARENT_SQL}
+                                LIMIT 1)
+                        FROM directories d
+                        JOIN scans s ON d.scan_id = s.id
+                        WHERE d.fingerprint IN ({placeholders}) AND d.gen_removed IS NULL
+                        ORDER BY s.volume_name, d.directory_path
+                    """, list(groups))
+                    
+                    for row in cursor.fetchall():
+                        group = groups[row[0]]
+                        if row[4] is not None:
+                            group['tree_bytes'] = row[4]
+                        group['copies'].append({
+                            'serial_number': row[1],
+                            'volume_name': row[2] or 'Desconocido',
+                            'directory_path': row[3]
+                        })
+                        parents[row[0]].add(row[5])
+                    
+                    for fingerprint, group in groups.items():
+                        # Padres idénticos en varios catálogos: forman un grupo mayor
+                        parent_fingerprints = parents[fingerprint]
+                        if len(parent_fingerprints) == 1 and None not in parent_fingerprints:
+                            continue
+                        result.append(group)
+                        if len(result) == limit:
+                            break
                 
-                conn.commit()
-                logger.info(f"Escaneo {serial_number} eliminado correctamente")
-                return True
+                logger.info(f"Se encontraron {len(result)} grupos de carpetas duplicadas")
+                return result
                 
         except sqlite3.Error as e:
-            logger.error(f"Error al eliminar escaneo {serial_number}: {e}")
-            return False
+            logger.error(f"Error al buscar carpetas duplicadas: {e}")
+            return []
     
-    def get_database_stats(self) -> Dict:
+    def list_generations(self, serial_number: str) -> List[Dict]:
         """
-        Obtiene estadísticas generales de la base de datos.
+        Obtiene las generaciones conservadas de un catálogo, de la más reciente
+        a la más antigua.
+        
+        Args:
+            serial_number (str): Número de serie del volumen
         
         Returns:
-            Dict: Diccionario con estadísticas de la base de datos
+            List[Dict]: Fecha, totales y tamaño del delta de cada generación
         """
         try:
-            with sqlite3.connect(self.db_path) as conn:
+            with self._connect() as conn:
                 cursor = conn.cursor()
                 
-                # Contar escaneos totales
-                cursor.execute("SELECT COUNT(*) FROM scans")
-                total_scans = cursor.fetchone()[0]
-                
-                # Contar directorios totales
-                cursor.execute("SELECT COUNT(*) FROM directories")
-                total_directories = cursor.fetchone()[0]
-                
-                # Obtener el escaneo más reciente
                 cursor.execute("""
-                    SELECT scan_date FROM scans 
-                    ORDER BY scan_date DESC LIMIT 1
-                """)
-                latest_scan = cursor.fetchone()
-                latest_scan_date = latest_scan[0] if latest_scan else None
-                
-                # Obtener el tamaño del archivo de base de datos
-                db_size = os.path.getsize(self.db_path) if os.path.exists(self.db_path) else 0
+                    SELECT g.generation, g.scan_date, g.total_directories,
+                           g.total_files, g.total_bytes,
+                           g.added_directories, g.removed_directories
+                    FROM scan_generations g
+                    JOIN scans s ON g.scan_id = s.id
+                    WHERE s.serial_number = ?
+                    ORDER BY g.generation DESC
+                """, (serial_number,))
                 
-                return {
-                    'total_scans': total_scans,
-                    'total_directories': total_directories,
-                    'latest_scan_date': latest_scan_date,
-                    'database_size_bytes': db_size,
-                    'database_size_mb': round(db_size / (1024 * 1024), 2)
-                }
+                return [{
+                    'generation': row[0],
+                    'scan_date': row[1],
+                    'total_directories': row[2],
+                    'total_files': row[3],
+                    'total_bytes': row[4],
+                    'added_directories': row[5],
+                    'removed_directories': row[6]
+                } for row in cursor.fetchall()]
                 
         except sqlite3.Error as e:
-            logger.error(f"Error al obtener estadísticas de la base de datos: {e}")
-            return {}
-
-
-# Instancia global del almacenamiento para mantener compatibilidad con el código existente
-_storage = None
-
+            logger.error(f"Error al obtener generaciones de {serial_number}: {e}")
+            return []
+    
+    def has_generation(self, serial_number: str, generation: int) -> bool:
+        """
+        Comprueba si una generación de un catálogo sigue disponible.
+        
+        Args:
+            serial_number (str): Número de serie del volumen
+            generation (int): Generación a comprobar
+        
+        Returns:
+            bool: False si el catálogo o la generación no existen o ya se compactó
+        """
+        try:
+            with self._connect() as conn:
+                return _generation_available(conn.cursor(), serial_number, generation)
+        except sqlite3.Error as e:
+            logger.error(f"Error al comprobar la generación {generation} de {serial_number}: {e}")
+            return False
+    
+    def diff_generations(self, serial_number: str, from_generation: int,
+                         to_generation: Optional[int] = None,
+                         limit: int = 1000) -> Optional[Dict]:
+        """
+        Compara dos generaciones de un catálogo.
+        
+        Un directorio está añadido si existe en ``to_generation`` y no en
+        ``from_generation``, y eliminado en el caso contrario. Los directorios
+        cuyo contenido cambió pero siguen existiendo no aparecen en ninguna lista.
+        
+        Args:
+            serial_number (str): Número de serie del volumen
+            from_generation (int): Generación de origen
+            to_generation (Optional[int]): Generación de destino (por defecto la vigente)
+            limit (int): Máximo de rutas devueltas en cada lista
+        
+        Returns:
+            Optional[Dict]: Recuentos y rutas añadidas/eliminadas, o None si el
+            catálogo o alguna de las generaciones no existe o ya se compactó
+        """
+        try:
+            with self._connect() as conn:
+                cursor = conn.cursor()
+                
+                cursor.execute("""
+                    SELECT id, generation FROM scans WHERE serial_number = ?
+                """, (serial_number,))
+                scan_row = cursor.fetchone()
+                if not scan_row:
+                    return None
+                scan_id = scan_row[0]
+                if to_generation is None:
+                    to_generation = scan_row[1]
+                
+                cursor.execute("""
+                    SELECT COUNT(*) FROM scan_generations
+                    WHERE scan_id = ? AND generation IN (?, ?)
+                """, (scan_id, from_generation, to_generation))
+                expected = 1 if from_generation == to_generation else 2
+                if cursor.fetchone()[0] != expected:
+                    logger.warning(f"Generación no disponible para el catálogo {serial_number}")
+                    return None
+                
+                result = {
+                    'serial_number': serial_number,
+                    'from_generation': from_generation,
+                    'to_generation': to_generation
+                }
+                for key, present, absent in (('added', to_generation, from_generation),
+                                             ('removed', from_generation, to_generation)):
+                    present_sql, present_params = _generation_filter('d', present)
+                    absent_sql, absent_params = _generation_filter('o', absent)
+                    cursor.execute(f"""
+                        SELECT d.directory_path
+                        FROM directories d
+                        WHERE d.scan_id = ? AND {present_sql}
+                          AND NOT EXISTS (
+                              SELECT 1 FROM directories o
+                              WHERE o.scan_id = d.scan_id
+                                AND o.directory_path = d.directory_path
+                                AND {absent_sql}
+                          )
+                        ORDER BY d.directory_path
+                    """, (scan_id, *present_params, *absent_params))
+                    
+                    paths = []
+                    count = 0
+                    for (path,) in cursor:
+                        if count < limit:
+                            paths.append(path)
+                        count += 1
+                    result[key] = paths
+                    result[f'{key}_count'] = count
+                
+                return result
+                
+        except sqlite3.Error as e:
+            logger.error(f"Error al comparar generaciones de {serial_number}: {e}")
+            return None
+    
+    def compact_generations(self, serial_number: Optional[str] = None,
+                            keep: Optional[int] = None) -> int:
+        """
+        Aplica la política de retención de generaciones.
+        
+        Conserva las ``keep`` generaciones más recientes de cada catálogo y borra
+        las filas que solo eran visibles en generaciones anteriores, junto con
+        sus registros en ``scan_generations``. Se ejecuta dentro del
+        mantenimiento (``run_maintenance``), no al guardar cada escaneo.
+        
+        Args:
+            serial_number (Optional[str]): Catálogo a compactar (por defecto todos)
+            keep (Optional[int]): Generaciones a conservar (por defecto
+                ``self.keep_generations``; 0 o menos desactiva la compactación)
+        
+        Returns:
+            int: Número de filas de directorios eliminadas
+        """
+        keep = self.keep_generations if keep is None else keep
+        if keep <= 0:
+            return 0
+        
+        try:
+            with self._connect() as conn:
+                cursor = conn.cursor()
+                
+                if serial_number is None:
+                    cursor.execute("SELECT id, generation FROM scans")
+                else:
+                    cursor.execute("""
+                        SELECT id, generation FROM scans WHERE serial_number = ?
+                    """, (serial_number,))
+                
+                reclaimed = 0
+                for scan_id, generation in cursor.fetchall():
+                    cutoff = generation - keep + 1
+                    if cutoff <= 1:
+                        continue
+                    
+                    # Filas que dejaron de estar vigentes antes de la primera
+                    # generación conservada
+                    cursor.execute("""
+                        DELETE FROM directories
+                        WHERE scan_id = ? AND gen_removed IS NOT NULL AND gen_removed <= ?
+                    """, (scan_id, cutoff))
+                    reclaimed += cursor.rowcount
+                    
+                    cursor.execute("""
+                        DELETE FROM scan_generations WHERE scan_id = ? AND generation < ?
+                    """, (scan_id, cutoff))
+                
+                if reclaimed:
+                    self._bump_catalog_version(cursor)
+                conn.commit()
+                if reclaimed:
+                    logger.info(f"Compactación de generaciones: {reclaimed} filas eliminadas")
+                return reclaimed
+                
+        except sqlite3.Error as e:
+            logger.error(f"Error al compactar generaciones: {e}")
+            return 0
+    
+    def rename_scan(self, serial_number: str, volume_name: str) -> bool:
+        """
+        Cambia el nombre de un catálogo sin reescribir sus directorios.
+        
+        Args:
+            serial_number (str): Número de serie del volumen
+            volume_name (str): Nuevo nombre del catálogo
+        
+        Returns:
+            bool: True si se renombró correctamente, False en caso contrario
+        """
+        try:
+            with self._connect() as conn:
+                cursor = conn.cursor()
+                
+                cursor.execute("""
+                    UPDATE scans SET volume_name = ? WHERE serial_number = ?
+                """, (volume_name, serial_number))
+                
+                if cursor.rowcount == 0:
+                    logger.warning(f"No se encontró escaneo con serial {serial_number}")
+                    return False
+                self._bump_catalog_version(cursor)
+                conn.commit()
+                logger.info(f"Escaneo {serial_number} renombrado a '{volume_name}'")
+                return True
+                
+        except sqlite3.Error as e:
+            logger.error(f"Error al renombrar escaneo {serial_number}: {e}")
+            return False
+    
+    def apply_directory_changes(self, serial_number: str,
+                                operations: List[Tuple[str, ...]]) -> Optional[Dict]:
+        """
+        Aplica cambios puntuales de directorios a la generación vigente.
+        
+        Pensado para la vigilancia en vivo (``watcher.py``): en lugar de crear
+        una generación por cada lote de eventos, los cambios corrigen la
+        generación vigente, que pasa a reflejar el estado actual de la unidad.
+        Las filas de generaciones anteriores se marcan con ``gen_removed`` y las
+        creadas en la propia generación vigente se borran, de modo que las
+        consultas "a fecha de" generaciones anteriores no cambian.
+        
+        Operaciones, aplicadas en orden dentro de una única transacción:
+        - ``('create', ruta)``: directorio nuevo (sin tamaños ni huella)
+        - ``('delete', ruta)``: elimina el directorio y todo su subárbol
+        - ``('move', origen, destino)``: renombra el subárbol conservando tamaños
+          y huellas (la huella solo depende de los nombres relativos)
+        
+        Las huellas de las carpetas antecesoras de cada cambio dejan de ser
+        válidas: su fila se sustituye por una nueva de la generación vigente sin
+        huella (la anterior sigue visible, con su huella, en las generaciones
+        previas). Se recalculan en el siguiente escaneo completo.
+        
+        Args:
+            serial_number (str): Número de serie del catálogo
+            operations (List[Tuple[str, ...]]): Operaciones a aplicar
+        
+        Returns:
+            Optional[Dict]: ``added`` y ``removed`` (filas) o None si el catálogo
+                no existe o falla la transacción
+        """
+        try:
+            with self._connect() as conn:
+                cursor = conn.cursor()
+                cursor.execute("""
+                    SELECT id, generation FROM scans WHERE serial_number = ?
+                """, (serial_number,))
+                scan_row = cursor.fetchone()
+                if not scan_row:
+                    logger.warning(f"No se encontró escaneo con serial {serial_number}")
+                    return None
+                scan_id, generation = scan_row
+                
+                counts = {'added': 0, 'removed': 0, 'discarded': 0}
+                touched = set()
+                for operation in operations:
+                    kind, path = operation[0], operation[1]
+                    if kind == 'create':
+                        counts['added'] += _insert_live_directory(cursor, scan_id, generation,
+                                                                  (path,) + (None,) * 6)
+                        touched.add(path)
+                    elif kind == 'delete':
+                        _remove_subtree(cursor, scan_id, generation, path, counts)
+                        touched.add(path)
+                    elif kind == 'move':
+                        target = operation[2]
+                        cursor.execute(f"""
+                            SELECT directory_path, fingerprint, tree_dir_count, file_count,
+                                   total_bytes, tree_file_count, tree_bytes
+                            FROM directories
+                            WHERE scan_id = ? AND gen_removed IS NULL AND {_SUBTREE_SQL}
+                        """, (scan_id, *_subtree_params(path)))
+                        moved = cursor.fetchall()
+                        _remove_subtree(cursor, scan_id, generation, path, counts)
+                        for row in moved:
+                            new_path = target + row[0][len(path):]
+                            counts['added'] += _insert_live_directory(cursor, scan_id,
+                                                                      generation,
+                                                                      (new_path,) + row[1:])
+                        touched.update((path, target))
+                    else:
+                        raise ValueError(f"Operación desconocida: {kind}")
+                
+                # Las huellas de los antecesores ya no describen su contenido
+                ancestors = {parent for path in touched for parent in _ancestor_paths(path)}
+                for parent in ancestors:
+                    _invalidate_fingerprint(cursor, scan_id, generation, parent)
+                
+                # Las filas creadas y borradas en la propia generación no cuentan
+                # como añadidas en su historial
+                cursor.execute("""
+                    UPDATE scans SET total_directories = total_directories + ? WHERE id = ?
+                """, (counts['added'] - counts['removed'] - counts['discarded'], scan_id))
+                cursor.execute("""
+                    UPDATE scan_generations
+                    SET total_directories = total_directories + ?,
+                        added_directories = added_directories + ?,
+                        removed_directories = removed_directories + ?
+                    WHERE scan_id = ? AND generation = ?
+                """, (counts['added'] - counts['removed'] - counts['discarded'],
+                      counts['added'] - counts['discarded'], counts['removed'],
+                      scan_id, generation))
+                
+                self._bump_catalog_version(cursor)
+                conn.commit()
+                logger.info(f"Cambios en vivo en {serial_number}: {counts['added']} añadidos, "
+                            f"{counts['removed'] + counts['discarded']} eliminados")
+                return {'added': counts['added'],
+                        'removed': counts['removed'] + counts['discarded']}
+                
+        except sqlite3.Error as e:
+            logger.error(f"Error al aplicar cambios en {serial_number}: {e}")
+            return None
+    
+    def delete_scan(self, serial_number: str) -> bool:
+        """
+        Elimina un escaneo; sus directorios se borran después en segundo plano.
+        
+        En una transacción corta se eliminan el escaneo y su historial de
+        generaciones y se registra el catálogo en ``pending_deletions``. Desde
+        ese momento deja de aparecer en búsquedas, historial y estadísticas, y
+        el número de serie queda libre para un nuevo escaneo. Las filas de
+        ``directories`` se borran por lotes con ``reclaim_deleted_scans`` sin
+        bloquear la escritura durante mucho tiempo.
+        
+        Args:
+            serial_number (str): Número de serie del volumen a eliminar
+        
+        Returns:
+            bool: True si se eliminó correctamente, False en caso contrario
+        """
+        try:
+            with self._connect() as conn:
+                cursor = conn.cursor()
+                # Sin ON DELETE CASCADE: el borrado de las filas es diferido
+                cursor.execute("PRAGMA foreign_keys = OFF")
+                
+                # Obtener el ID del escaneo
+                cursor.execute("""
+                    SELECT id, volume_name FROM scans WHERE serial_number = ?
+                """, (serial_number,))
+                
+                scan_row = cursor.fetchone()
+                if not scan_row:
+                    logger.warning(f"No se encontró escaneo con serial {serial_number}")
+                    return False
+                
+                scan_id, volume_name = scan_row
+                
+                # Contar antes de escribir: la lectura no bloquea a otros escritores
+                cursor.execute("""
+                    SELECT COUNT(*) FROM directories WHERE scan_id = ?
+                """, (scan_id,))
+                total_rows = cursor.fetchone()[0]
+                
+                cursor.execute("""
+                    INSERT INTO pending_deletions (scan_id, serial_number, volume_name,
+                                                   total_rows, requested_at)
+                    VALUES (?, ?, ?, ?, ?)
+                """, (scan_id, serial_number, volume_name, total_rows, datetime.now()))
+                
+                # Eliminar el historial de generaciones y el escaneo
+                cursor.execute("""
+                    DELETE FROM scan_generations WHERE scan_id = ?
+                """, (scan_id,))
+                cursor.execute("""
+                    DELETE FROM scans WHERE id = ?
+                """, (scan_id,))
+                
+                self._bump_catalog_version(cursor)
+                conn.commit()
+                logger.info(f"Escaneo {serial_number} eliminado; {total_rows} directorios "
+                            f"pendientes de borrar")
+                return True
+                
+        except sqlite3.Error as e:
+            logger.error(f"Error al eliminar escaneo {serial_number}: {e}")
+            return False
+    
+    def get_pending_deletions(self) -> List[Dict]:
+        """
+        Obtiene los catálogos eliminados cuyos directorios aún se están borrando.
+        
+        Returns:
+            List[Dict]: serial, nombre, filas totales y borradas y porcentaje
+        """
+        try:
+            with self._connect() as conn:
+                conn.row_factory = sqlite3.Row
+                cursor = conn.execute("""
+                    SELECT serial_number, volume_name, total_rows, deleted_rows,
+                           requested_at
+                    FROM pending_deletions
+                    ORDER BY requested_at
+                """)
+                deletions = []
+                for row in cursor.fetchall():
+                    deletion = dict(row)
+                    total = deletion['total_rows']
+                    deletion['progress'] = round(100 * min(deletion['deleted_rows'], total) / total,
+                                                 1) if total else 100.0
+                    deletions.append(deletion)
+                return deletions
+                
+        except sqlite3.Error as e:
+            logger.error(f"Error al obtener los borrados pendientes: {e}")
+            return []
+    
+    def reclaim_deleted_scans(self, chunk_size: int = DELETE_CHUNK_SIZE,
+                              max_rows: Optional[int] = None,
+                              should_stop: Optional[Callable[[], bool]] = None,
+                              pause: float = 0.0) -> int:
+        """
+        Borra por lotes los directorios de los catálogos eliminados.
+        
+        Cada lote es una transacción independiente de ``chunk_size`` filas, de
+        modo que otros escritores solo esperan lo que tarda un lote.
+        
+        Args:
+            chunk_size (int): Filas por transacción
+            max_rows (Optional[int]): Máximo de filas a borrar en esta llamada
+            should_stop (Optional[Callable[[], bool]]): Devuelve True para parar
+                entre lotes
+            pause (float): Segundos de espera entre lotes
+        
+        Returns:
+            int: Número de filas borradas
+        """
+        should_stop = should_stop or (lambda: False)
+        deleted = 0
+        
+        try:
+            with self._connect() as conn:
+                cursor = conn.cursor()
+                cursor.execute("SELECT scan_id, serial_number FROM pending_deletions ORDER BY requested_at")
+                
+                for scan_id, serial_number in cursor.fetchall():
+                    while max_rows is None or deleted < max_rows:
+                        if should_stop():
+                            return deleted
+                        batch = chunk_size if max_rows is None else min(chunk_size, max_rows - deleted)
+                        cursor.execute("""
+                            DELETE FROM directories WHERE id IN (
+                                SELECT id FROM directories WHERE scan_id = ? LIMIT ?
+                            )
+                        """, (scan_id, batch))
+                        removed = cursor.rowcount
+                        if removed:
+                            cursor.execute("""
+                                UPDATE pending_deletions SET deleted_rows = deleted_rows + ?
+                                WHERE scan_id = ?
+                            """, (removed, scan_id))
+                        else:
+                            cursor.execute("DELETE FROM pending_deletions WHERE scan_id = ?",
+                                           (scan_id,))
+                        conn.commit()
+                        deleted += removed
+                        
+                        if not removed:
+                            logger.info(f"Directorios del catálogo eliminado {serial_number} borrados")
+                            break
+                        if pause:
+                            time.sleep(pause)
+                
+                return deleted
+                
+        except sqlite3.Error as e:
+            logger.error(f"Error al borrar directorios de catálogos eliminados: {e}")
+            return deleted
+    
+    def run_maintenance(self, vacuum_pages: int = 2000, vacuum_step: int = 256,
+                        analysis_limit: int = 1000, checkpoint: str = 'PASSIVE',
+                        convert_auto_vacuum: bool = False,
+                        should_stop: Optional[Callable[[], bool]] = None) -> Optional[Dict]:
+        """
+        Ejecuta una pasada de mantenimiento de la base de datos y la registra.
+        
+        Pasos, en orden y comprobando ``should_stop`` entre ellos:
+        - Borrado por lotes de los catálogos eliminados pendientes
+        - Compactación de generaciones según ``keep_generations``
+        - Solo con ``convert_auto_vacuum``: conversión a ``auto_vacuum =
+          INCREMENTAL`` de las bases de datos creadas con versiones anteriores.
+          Es un VACUUM completo que reescribe el archivo y bloquea la escritura
+          mientras dura, así que nunca la pide el planificador
+        - ``PRAGMA incremental_vacuum`` en lotes de ``vacuum_step`` páginas
+          hasta liberar ``vacuum_pages`` o vaciar la lista de páginas libres
+          (sin conversión previa, en bases de datos antiguas se omite)
+        - ``ANALYZE`` acotado por ``PRAGMA analysis_limit``: solo actualiza las
+          estadísticas que usa el planificador para elegir índices; no
+          reconstruye ni desfragmenta ningún índice
+        - ``PRAGMA wal_checkpoint`` si la base de datos está en modo WAL
+        
+        Args:
+            vacuum_pages (int): Máximo de páginas a liberar en esta pasada
+            vacuum_step (int): Páginas por lote de incremental_vacuum
+            analysis_limit (int): Filas examinadas por índice en ANALYZE (0 = todas)
+            checkpoint (str): Modo del checkpoint (PASSIVE, FULL, RESTART o TRUNCATE)
+            convert_auto_vacuum (bool): Permitir el VACUUM completo de conversión
+                (desactivado por defecto)
+            should_stop (Optional[Callable[[], bool]]): Devuelve True para
+                interrumpir la pasada (ej: llega actividad de usuarios)
+        
+        Returns:
+            Optional[Dict]: Resumen de la ejecución (el mismo que se guarda en
+                ``maintenance_runs``) o None si falla
+        """
+        if checkpoint.upper() not in ('PASSIVE', 'FULL', 'RESTART', 'TRUNCATE'):
+            raise ValueError(f"Modo de checkpoint no válido: {checkpoint}")
+        should_stop = should_stop or (lambda: False)
+        started_at = datetime.now()
+        started = time.monotonic()
+        steps = []
+        pages_vacuumed = 0
+        interrupted = False
+        
+        if self.reclaim_deleted_scans(should_stop=should_stop):
+            steps.append('reclaim')
+        
+        # La retención se aplica aquí y no en cada escaneo o importación, para
+        # no alargar la transacción de escritura de las ingestas
+        if not should_stop() and self.compact_generations():
+            steps.append('compact')
+        
+        try:
+            conn = self._connect(isolation_level=None)
+            try:
+                cursor = conn.cursor()
+                bytes_before = _database_bytes(cursor)
+                
+                auto_vacuum = cursor.execute("PRAGMA auto_vacuum").fetchone()[0]
+                if auto_vacuum != 2 and convert_auto_vacuum and not should_stop():
+                    cursor.execute("PRAGMA auto_vacuum = INCREMENTAL")
+                    cursor.execute("VACUUM")
+                    steps.append('vacuum')
+                    auto_vacuum = 2
+                
+                if auto_vacuum == 2:
+                    while pages_vacuumed < vacuum_pages:
+                        free_pages = cursor.execute("PRAGMA freelist_count").fetchone()[0]
+                        if not free_pages:
+                            break
+                        if should_stop():
+                            interrupted = True
+                            break
+                        batch = min(vacuum_step, vacuum_pages - pages_vacuumed, free_pages)
+                        # executescript ejecuta el PRAGMA hasta el final; execute
+                        # solo avanza un paso y libera una única página
+                        cursor.executescript(f"PRAGMA incremental_vacuum({int(batch)})")
+                        pages_vacuumed += batch
+                    if pages_vacuumed:
+                        steps.append('incremental_vacuum')
+                
+                if not interrupted and not should_stop():
+                    cursor.execute(f"PRAGMA analysis_limit = {int(analysis_limit)}")
+                    cursor.execute("ANALYZE")
+                    steps.append('analyze')
+                else:
+                    interrupted = True
+                
+                journal_mode = cursor.execute("PRAGMA journal_mode").fetchone()[0]
+                if journal_mode == 'wal' and not interrupted and not should_stop():
+                    cursor.execute(f"PRAGMA wal_checkpoint({checkpoint.upper()})").fetchall()
+                    steps.append('checkpoint')
+                
+                bytes_after = _database_bytes(cursor)
+                run = {
+                    'started_at': started_at,
+                    'duration_ms': int((time.monotonic() - started) * 1000),
+                    'steps': ','.join(steps),
+                    'pages_vacuumed': pages_vacuumed,
+                    'bytes_before': bytes_before,
+                    'bytes_after': bytes_after,
+                    'bytes_reclaimed': max(0, bytes_before - bytes_after),
+                    'interrupted': interrupted
+                }
+                cursor.execute("""
+                    INSERT INTO maintenance_runs (started_at, duration_ms, steps,
+                                                  pages_vacuumed, bytes_before,
+                                                  bytes_after, bytes_reclaimed,
+                                                  interrupted)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                """, (run['started_at'], run['duration_ms'], run['steps'],
+                      run['pages_vacuumed'], run['bytes_before'], run['bytes_after'],
+                      run['bytes_reclaimed'], int(interrupted)))
+                cursor.execute("""
+                    DELETE FROM maintenance_runs
+                    WHERE id <= (SELECT MAX(id) FROM maintenance_runs) - ?
+                """, (MAINTENANCE_HISTORY,))
+            finally:
+                conn.close()
+            
+            logger.info(f"Mantenimiento completado en {run['duration_ms']} ms "
+                        f"({run['steps'] or 'sin pasos'}): "
+                        f"{run['bytes_reclaimed']} bytes liberados")
+            return run
+            
+        except sqlite3.Error as e:
+            logger.error(f"Error durante el mantenimiento de la base de datos: {e}")
+            return None
+    
+    def get_maintenance_runs(self, limit: int = 10) -> List[Dict]:
+        """
+        Obtiene las ejecuciones de mantenimiento más recientes.
+        
+        Args:
+            limit (int): Número máximo de ejecuciones
+        
+        Returns:
+            List[Dict]: Ejecuciones de la más reciente a la más antigua
+        """
+        try:
+            with self._connect() as conn:
+                conn.row_factory = sqlite3.Row
+                cursor = conn.execute("""
+                    SELECT started_at, duration_ms, steps, pages_vacuumed,
+                           bytes_before, bytes_after, bytes_reclaimed, interrupted
+                    FROM maintenance_runs
+                    ORDER BY id DESC
+                    LIMIT ?
+                """, (limit,))
+                return [{**dict(row), 'interrupted': bool(row['interrupted'])}
+                        for row in cursor.fetchall()]
+                
+        except sqlite3.Error as e:
+            logger.error(f"Error al obtener el historial de mantenimiento: {e}")
+            return []
+    
+    def get_database_stats(self) -> Dict:
+        """
+        Obtiene estadísticas generales de la base de datos.
+        
+        Returns:
+            Dict: Diccionario con estadísticas de la base de datos
+        """
+        try:
+            with self._connect() as conn:
+                cursor = conn.cursor()
+                
+                # Contar escaneos totales
+                cursor.execute("SELECT COUNT(*) FROM scans")
+                total_scans = cursor.fetchone()[0]
+                
+                # Contar directorios vigentes (sin los de catálogos eliminados)
+                cursor.execute("""
+                    SELECT COUNT(*) FROM directories
+                    WHERE gen_removed IS NULL
+                      AND scan_id NOT IN (SELECT scan_id FROM pending_deletions)
+                """)
+                total_directories = cursor.fetchone()[0]
+                
+                # Generaciones conservadas en el historial
+                cursor.execute("SELECT COUNT(*) FROM scan_generations")
+                total_generations = cursor.fetchone()[0]
+                
+                # Bytes catalogados (solo escaneos que incluyeron archivos)
+                cursor.execute("SELECT COALESCE(SUM(total_bytes), 0) FROM scans")
+                total_bytes = cursor.fetchone()[0]
+                
+                # Obtener el escaneo más reciente
+                cursor.execute("""
+                    SELECT scan_date FROM scans 
+                    ORDER BY scan_date DESC LIMIT 1
+                """)
+                latest_scan = cursor.fetchone()
+                latest_scan_date = latest_scan[0] if latest_scan else None
+                
+                # Obtener el tamaño del archivo de base de datos
+                db_size = os.path.getsize(self.db_path) if os.path.exists(self.db_path) else 0
+                
+                # Espacio libre dentro del archivo y resumen del mantenimiento
+                page_size = cursor.execute("PRAGMA page_size").fetchone()[0]
+                free_pages = cursor.execute("PRAGMA freelist_count").fetchone()[0]
+                auto_vacuum = cursor.execute("PRAGMA auto_vacuum").fetchone()[0]
+                cursor.execute("""
+                    SELECT COUNT(*), COALESCE(SUM(bytes_reclaimed), 0) FROM maintenance_runs
+                """)
+                maintenance_count, maintenance_reclaimed = cursor.fetchone()
+                
+                return {
+                    'total_scans': total_scans,
+                    'total_directories': total_directories,
+                    'total_generations': total_generations,
+                    'total_bytes': total_bytes,
+                    'latest_scan_date': latest_scan_date,
+                    'database_size_bytes': db_size,
+                    'database_size_mb': round(db_size / (1024 * 1024), 2),
+                    'pending_deletions': self.get_pending_deletions(),
+                    'maintenance': {
+                        'auto_vacuum': ('none', 'full', 'incremental')[auto_vacuum],
+                        'free_bytes': free_pages * page_size,
+                        'total_runs': maintenance_count,
+                        'total_bytes_reclaimed': maintenance_reclaimed,
+                        'recent_runs': self.get_maintenance_runs(5)
+                    }
+                }
+                
+        except sqlite3.Error as e:
+            logger.error(f"Error al obtener estadísticas de la base de datos: {e}")
+            return {}
+
+    def iter_catalog_export(self, serial_number: str,
+                            chunk_size: int = 64 * 1024) -> Iterator[bytes]:
+        """
+        Genera la exportación de un catálogo como bloques de bytes comprimidos.
+        
+        El formato es NDJSON comprimido con gzip. La primera línea es una cabecera
+        con los metadatos del escaneo; cada línea siguiente es un directorio con
+        codificación frontal sobre la ruta anterior (ordenadas alfabéticamente):
+        ``[prefijo_compartido, "sufijo", huella, subcarpetas]``, seguido de
+        ``archivos, bytes, archivos_subárbol, bytes_subárbol`` si el escaneo
+        incluyó archivos. Se exporta la generación vigente. Los directorios se
+        leen del cursor por lotes, por lo que el uso de memoria es constante.
+        
+        Args:
+            serial_number (str): Número de serie del catálogo a exportar
+            chunk_size (int): Tamaño aproximado de cada bloque emitido
+        
+        Yields:
+            bytes: Fragmentos del archivo .ndjson.gz
+        
+        Raises:
+            KeyError: Si no existe un catálogo con ese número de serie
+        """
+        scan_info = self.get_scan_by_serial(serial_number)
+        if not scan_info:
+            raise KeyError(serial_number)
+        
+        buffer = _ChunkBuffer()
+        with gzip.GzipFile(fileobj=buffer, mode='wb') as gz:
+            header = {
+                'format': EXPORT_FORMAT,
+                'version': EXPORT_VERSION,
+                'scan': {
+                    'serial_number': scan_info['serial_number'],
+                    'volume_name': scan_info['volume_name'],
+                    'drive_path': scan_info['drive_path'],
+                    'scan_date': scan_info['scan_date'],
+                    'total_directories': scan_info['total_directories'],
+                    'total_files': scan_info['total_files'],
+                    'total_bytes': scan_info['total_bytes']
+                }
+            }
+            gz.write(json.dumps(header, ensure_ascii=False).encode('utf-8') + b'\n')
+            
+            with self._connect() as conn:
+                cursor = conn.cursor()
+                cursor.execute("""
+                    SELECT directory_path, fingerprint, tree_dir_count, file_count,
+                           total_bytes, tree_file_count, tree_bytes
+                    FROM directories 
+                    WHERE scan_id = ? AND gen_removed IS NULL
+                    ORDER BY directory_path
+                """, (scan_info['id'],))
+                
+                previous = ''
+                while True:
+                    rows = cursor.fetchmany(BATCH_SIZE)
+                    if not rows:
+                        break
+                    for path, fingerprint, tree_dirs, *sizes in rows:
+                        shared = _common_prefix_length(previous, path)
+                        record = [shared, path[shared:], fingerprint, tree_dirs]
+                        if sizes[0] is not None:
+                            record.extend(sizes)
+                        line = json.dumps(record, ensure_ascii=False)
+                        gz.write(line.encode('utf-8') + b'\n')
+                        previous = path
+                    if buffer.size() >= chunk_size:
+                        yield buffer.drain()
+        
+        # Cerrar el GzipFile escribe el pie (CRC y tamaño) en el buffer
+        remaining = buffer.drain()
+        if remaining:
+            yield remaining
+        logger.info(f"Catálogo {serial_number} exportado")
+    
+    def export_catalog(self, serial_number: str, fileobj: BinaryIO) -> bool:
+        """
+        Exporta un catálogo a un archivo binario abierto.
+        
+        Args:
+            serial_number (str): Número de serie del catálogo a exportar
+            fileobj (BinaryIO): Destino abierto en modo binario
+        
+        Returns:
+            bool: True si se exportó correctamente, False en caso contrario
+        """
+        try:
+            for chunk in self.iter_catalog_export(serial_number):
+                fileobj.write(chunk)
+            return True
+        except KeyError:
+            logger.warning(f"No se encontró escaneo con serial {serial_number}")
+            return False
+        except (sqlite3.Error, OSError) as e:
+            logger.error(f"Error al exportar el catálogo {serial_number}: {e}")
+            return False
+    
+    def import_catalog(self, fileobj: BinaryIO,
+                       progress: Optional[Callable[[int], None]] = None) -> Optional[Dict]:
+        """
+        Importa un catálogo exportado con ``export_catalog``.
+        
+        El archivo se descomprime y se inserta en streaming, en lotes de
+        ``BATCH_SIZE`` filas dentro de una única transacción: si el archivo
+        está corrupto no se modifica nada. Si ya existe un catálogo con el mismo
+        número de serie, el contenido importado se guarda como una nueva
+        generación, igual que en ``add_scan``.
+        
+        Args:
+            fileobj (BinaryIO): Origen abierto en modo binario (.ndjson.gz)
+            progress (Optional[Callable[[int], None]]): Recibe el número de
+                directorios importados tras cada lote
+        
+        Returns:
+            Optional[Dict]: ``serial_number`` y ``total_directories`` importados,
+            o None si el archivo no es válido o falla la base de datos
+        """
+        try:
+            with gzip.GzipFile(fileobj=fileobj, mode='rb') as gz:
+                header = json.loads(gz.readline().decode('utf-8') or 'null')
+                if (not isinstance(header, dict)
+                        or header.get('format') != EXPORT_FORMAT
+                        or header.get('version') not in (1, EXPORT_VERSION)):
+                    logger.error("Archivo de importación no reconocido")
+                    return None
+                
+                scan = header['scan']
+                serial_number = scan['serial_number']
+                
+                conn = self._connect()
+                try:
+                    rows = ((path, *values)
+                            for path, values in _decode_front_coded(gz, header['version']))
+                    _, _, total = self._store_generation(
+                        conn.cursor(), serial_number, scan.get('volume_name'),
+                        scan.get('drive_path') or '', rows,
+                        scan.get('scan_date') or datetime.now(),
+                        scan.get('total_files'), scan.get('total_bytes'),
+                        progress=progress
+                    )
+                    
+                    conn.commit()
+                except BaseException:
+                    conn.rollback()
+                    raise
+                finally:
+                    conn.close()
+            
+            logger.info(f"Catálogo {serial_number} importado con {total} directorios")
+            return {'serial_number': serial_number, 'total_directories': total}
+            
+        except (OSError, EOFError, ValueError, KeyError, TypeError) as e:
+            logger.error(f"Archivo de importación inválido: {e}")
+            return None
+        except sqlite3.Error as e:
+            logger.error(f"Error al importar el catálogo: {e}")
+            return None
+
+
+class _ChunkBuffer:
+    """Destino de escritura mínimo que acumula bytes hasta que se vacían."""
+    
+    def __init__(self):
+        self._chunks = []
+        self._size = 0
+    
+    def write(self, data: bytes) -> int:
+        self._chunks.append(bytes(data))
+        self._size += len(data)
+        return len(data)
+    
+    def flush(self):
+        pass
+    
+    def size(self) -> int:
+        return self._size
+    
+    def drain(self) -> bytes:
+        data = b''.join(self._chunks)
+        self._chunks = []
+        self._size = 0
+        return data
+
+
+def _normalize_path(path: str) -> str:
+    """Elimina los separadores finales ('D:\\' -> 'D:', '/' -> '')."""
+    return path.rstrip('\\/')
+
+
+def _parent_path(path: str) -> Optional[str]:
+    """
+    Obtiene la ruta padre normalizada aceptando separadores de Windows y POSIX.
+    
+    Se usa en lugar de ``os.path.dirname`` porque los catálogos pueden haberse
+    creado en un sistema distinto al que los procesa.
+    """
+    trimmed = _normalize_path(path)
+    cut = max(trimmed.rfind('\\'), trimmed.rfind('/'))
+    if cut < 0:
+        return None
+    return trimmed[:cut]
+
+
+def compute_size_rollups(directories: List[str],
+                         file_stats: Dict[str, Tuple[int, int]]) -> Dict[str, Tuple[int, int]]:
+    """
+    Calcula los acumulados recursivos ``(archivos, bytes)`` de cada directorio.
+    
+    Los directorios se procesan de la ruta más larga a la más corta, de modo que
+    cada hijo está completo antes de sumarse a su antecesor catalogado más cercano.
+    
+    Args:
+        directories (List[str]): Rutas de directorios del escaneo
+        file_stats (Dict[str, Tuple[int, int]]): Archivos y bytes directos
+    
+    Returns:
+        Dict[str, Tuple[int, int]]: Acumulados del subárbol de cada directorio
+    """
+    totals = {}
+    for path in directories:
+        totals[_normalize_path(path)] = list(file_stats.get(path, (0, 0)))
+    
+    for key in sorted(totals, key=len, reverse=True):
+        ancestor = _parent_path(key)
+        while ancestor is not None and ancestor not in totals:
+            ancestor = _parent_path(ancestor)
+        if ancestor is not None:
+            totals[ancestor][0] += totals[key][0]
+            totals[ancestor][1] += totals[key][1]
+    
+    return {path: tuple(totals[_normalize_path(path)]) for path in directories}
+
+
+def compute_fingerprints(directories: List[str],
+                         file_stats: Optional[Dict[str, Tuple[int, int]]] = None
+                         ) -> Dict[str, Tuple[str, int]]:
+    """
+    Calcula la huella de cada subárbol de directorios, de abajo hacia arriba.
+    
+    La huella de una carpeta resume los nombres relativos y las huellas de sus
+    subcarpetas y, si se recopilaron, sus archivos y bytes directos. No depende
+    de la ruta absoluta, así que dos copias de la misma carpeta en discos o
+    ubicaciones distintas tienen la misma huella.
+    
+    Args:
+        directories (List[str]): Rutas de directorios del escaneo
+        file_stats (Optional[Dict[str, Tuple[int, int]]]): Archivos y bytes directos
+    
+    Returns:
+        Dict[str, Tuple[str, int]]: ``(huella, subcarpetas descendientes)`` por ruta
+    """
+    keys = {_normalize_path(path): path for path in directories}
+    children = {key: [] for key in keys}
+    result = {}
+    
+    for key in sorted(keys, key=len, reverse=True):
+        path = keys[key]
+        entries = sorted(children.pop(key))
+        digest = hashlib.blake2b(digest_size=16)
+        if file_stats is not None:
+            files, size = file_stats.get(path, (0, 0))
+            digest.update(f"{files}:{size}\n".encode('utf-8'))
+        descendants = 0
+        for name, child_fingerprint, child_descendants in entries:
+            digest.update(f"{name}\0{child_fingerprint}\n".encode('utf-8'))
+            descendants += child_descendants + 1
+        fingerprint = digest.hexdigest()
+        result[key] = (fingerprint, descendants)
+        
+        ancestor = _parent_path(key)
+        while ancestor is not None and ancestor not in children:
+            ancestor = _parent_path(ancestor)
+        if ancestor is not None:
+            # Nombre relativo con separador POSIX para comparar Windows y Linux
+            name = key[len(ancestor) + 1:].replace('\\', '/')
+            children[ancestor].append((name, fingerprint, descendants))
+    
+    return {path: result[_normalize_path(path)] for path in directories}
+
+
+# Condición de carpeta padre de ``d.directory_path`` para la tabla ``p``: el
+# rtrim elimina el último componente y deja el separador final; se busca con
+# y sin él porque la raíz de la unidad se guarda con separador (ej: 'D:\\')
+_PARENT_PATH_SQL = "rtrim(d.directory_path, replace(replace(d.directory_path, '\\', ''), '/', ''))"
+_PARENT_SQL = (f"p.directory_path IN ({_PARENT_PATH_SQL}, "
+               f"substr({_PARENT_PATH_SQL}, 1, length({_PARENT_PATH_SQL}) - 1))")
+
+
+# Condición de subárbol (la ruta y sus descendientes) usando el índice
+# (scan_id, directory_path): rango [ruta + sep, ruta + chr(ord(sep) + 1))
+_SUBTREE_SQL = "(directory_path = ? OR (directory_path >= ? AND directory_path < ?))"
+
+
+def _subtree_params(path: str) -> Tuple[str, str, str]:
+    """Parámetros de ``_SUBTREE_SQL`` para una ruta con separador \\ o /."""
+    sep = '\\' if '\\' in path else '/'
+    base = path.rstrip(sep)
+    return path, base + sep, base + chr(ord(sep) + 1)
+
+
+def _ancestor_paths(path: str) -> Iterator[str]:
+    """Rutas de las carpetas antecesoras de ``path`` tal como se guardan."""
+    sep = '\\' if '\\' in path else '/'
+    parent = _parent_path(path)
+    while parent is not None:
+        yield parent
+        # La raíz de la unidad se guarda con separador final (ej: 'D:\\')
+        if not parent.endswith(sep):
+            yield parent + sep
+        parent = _parent_path(parent)
+
+
+def _insert_live_directory(cursor: sqlite3.Cursor, scan_id: int, generation: int,
+                           row: Tuple) -> int:
+    """Inserta un directorio vigente si no existe; devuelve las filas insertadas."""
+    cursor.execute("""
+        INSERT INTO directories (scan_id, directory_path, fingerprint, tree_dir_count,
+                                 file_count, total_bytes, tree_file_count,
+                                 tree_bytes, gen_added)
+        SELECT ?, ?, ?, ?, ?, ?, ?, ?, ?
+        WHERE NOT EXISTS (
+            SELECT 1 FROM directories
+            WHERE scan_id = ? AND directory_path = ? AND gen_removed IS NULL
+        )
+    """, (scan_id, *row, generation, scan_id, row[0]))
+    return cursor.rowcount
+
+
+def _invalidate_fingerprint(cursor: sqlite3.Cursor, scan_id: int, generation: int,
+                            path: str):
+    """
+    Quita la huella de un directorio vigente sin alterar generaciones anteriores.
+    
+    Una fila creada en la propia generación se modifica; una heredada se
+    retira con ``gen_removed`` y se sustituye por una copia sin huella, de modo
+    que las consultas "a fecha de" generaciones previas no cambian. No cuenta
+    como directorio añadido ni eliminado: la ruta sigue existiendo.
+    """
+    cursor.execute("""
+        SELECT id, gen_added FROM directories
+        WHERE scan_id = ? AND directory_path = ? AND gen_removed IS NULL
+          AND fingerprint IS NOT NULL
+    """, (scan_id, path))
+    row = cursor.fetchone()
+    if row is None:
+        return
+    row_id, gen_added = row
+    if gen_added == generation:
+        cursor.execute("UPDATE directories SET fingerprint = NULL WHERE id = ?", (row_id,))
+        return
+    cursor.execute("UPDATE directories SET gen_removed = ? WHERE id = ?", (generation, row_id))
+    cursor.execute("""
+        INSERT INTO directories (scan_id, directory_path, fingerprint, tree_dir_count,
+                                 file_count, total_bytes, tree_file_count,
+                                 tree_bytes, gen_added)
+        SELECT scan_id, directory_path, NULL, tree_dir_count, file_count,
+               total_bytes, tree_file_count, tree_bytes, ?
+        FROM directories WHERE id = ?
+    """, (generation, row_id))
+
+
+def _remove_subtree(cursor: sqlite3.Cursor, scan_id: int, generation: int,
+                    path: str, counts: Dict[str, int]):
+    """
+    Retira de la generación vigente un directorio y sus descendientes.
+    
+    Las filas creadas en la propia generación se borran (``discarded``); las
+    heredadas de generaciones anteriores se marcan con ``gen_removed``.
+    """
+    params = _subtree_params(path)
+    cursor.execute(f"""
+        DELETE FROM directories
+        WHERE scan_id = ? AND gen_removed IS NULL AND gen_added = ? AND {_SUBTREE_SQL}
+    """, (scan_id, generation, *params))
+    counts['discarded'] += cursor.rowcount
+    cursor.execute(f"""
+        UPDATE directories SET gen_removed = ?
+        WHERE scan_id = ? AND gen_removed IS NULL AND {_SUBTREE_SQL}
+    """, (generation, scan_id, *params))
+    counts['removed'] += cursor.rowcount
+
+
+def _escape_like(text: str) -> str:
+    """Escapa los comodines de LIKE (``%`` y ``_``) para usar ``ESCAPE '\\'``."""
+    return text.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+
+def _encode_cursor(key, last_id: int) -> str:
+    """Codifica la posición de una página en un cursor opaco para la URL."""
+    raw = json.dumps([key, last_id], separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def _decode_cursor(cursor: str) -> Tuple:
+    """Decodifica un cursor de ``_encode_cursor``; ValueError si no es válido."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        key, last_id = json.loads(raw)
+    except (ValueError, TypeError) as e:
+        raise ValueError(f"Cursor no válido: {cursor}") from e
+    if not isinstance(last_id, int) or not isinstance(key, (str, int, float)):
+        raise ValueError(f"Cursor no válido: {cursor}")
+    return key, last_id
+
+
+def _database_bytes(cursor: sqlite3.Cursor) -> int:
+    """Tamaño en bytes del archivo principal según page_count y page_size."""
+    page_count = cursor.execute("PRAGMA page_count").fetchone()[0]
+    page_size = cursor.execute("PRAGMA page_size").fetchone()[0]
+    return page_count * page_size
+
+
+def _search_query(search_term: str, serial_number: Optional[str],
+                  generation: Optional[int]) -> Tuple[str, List]:
+    """Construye la consulta de búsqueda de directorios (sin ORDER BY ni LIMIT)."""
+    # Búsqueda case-insensitive usando LIKE con comodines
+    search_pattern = f"%{search_term.lower()}%"
+    live_sql, live_params = _generation_filter('d', generation)
+    conditions = [live_sql, "LOWER(d.directory_path) LIKE ?"]
+    params = [*live_params, search_pattern]
+    if serial_number is not None:
+        conditions.append("s.serial_number = ?")
+        params.append(serial_number)
+    
+    sql = f"""
+        SELECT s.serial_number, s.volume_name, s.drive_path,
+               d.directory_path, s.scan_date
+        FROM directories d
+        JOIN scans s ON d.scan_id = s.id
+        WHERE {' AND '.join(conditions)}
+    """
+    return sql, params
+
+
+def _search_result(row: Tuple) -> Dict:
+    """Convierte una fila de la búsqueda en el diccionario de resultado."""
+    return {
+        'serial_number': row[0],
+        'volume_name': row[1] or 'Desconocido',
+        'drive_path': row[2],
+        'directory_path': row[3],
+        'scan_date': row[4],
+        # Mantener compatibilidad con el formato anterior
+        'catalog_name': row[0],  # usar serial_number como catalog_name
+        'ruta': row[3]
+    }
+
+
+def _generation_available(cursor: sqlite3.Cursor, serial_number: Optional[str],
+                          generation: Optional[int]) -> bool:
+    """
+    Comprueba que una generación sigue registrada en ``scan_generations``.
+    
+    Las generaciones compactadas ya no pueden reconstruirse: sus filas se
+    fundieron con las posteriores y ``_generation_filter`` devolvería el estado
+    compactado como si fuera el de esa fecha. Sin generación (la vigente)
+    siempre es True.
+    """
+    if generation is None:
+        return True
+    cursor.execute("""
+        SELECT 1 FROM scan_generations g
+        JOIN scans s ON g.scan_id = s.id
+        WHERE s.serial_number = ? AND g.generation = ?
+    """, (serial_number, generation))
+    if cursor.fetchone() is None:
+        logger.warning(f"Generación {generation} no disponible para el catálogo {serial_number}")
+        return False
+    return True
+
+
+def _generation_filter(alias: str, generation: Optional[int]) -> Tuple[str, tuple]:
+    """
+    Condición SQL para las filas de ``directories`` visibles en una generación.
+    
+    Args:
+        alias (str): Alias de la tabla ``directories`` en la consulta
+        generation (Optional[int]): Generación a consultar (None = vigente)
+    
+    Returns:
+        Tuple[str, tuple]: Fragmento SQL y sus parámetros
+    """
+    if generation is None:
+        return f"{alias}.gen_removed IS NULL", ()
+    return (f"{alias}.gen_added <= ? AND ({alias}.gen_removed IS NULL "
+            f"OR {alias}.gen_removed > ?)", (generation, generation))
+
+
+def _common_prefix_length(a: str, b: str) -> int:
+    """Longitud del prefijo común entre dos cadenas."""
+    limit = min(len(a), len(b))
+    i = 0
+    while i < limit and a[i] == b[i]:
+        i += 1
+    return i
+
+
+def _decode_front_coded(lines, version: int = EXPORT_VERSION) -> Iterator[Tuple[str, list]]:
+    """
+    Reconstruye rutas completas a partir de líneas ``[prefijo, sufijo, ...]``.
+    
+    Devuelve cada ruta junto con huella, subcarpetas y sus cuatro tamaños
+    (None si no se exportaron). La versión 1 del formato no incluía huellas.
+    """
+    previous = ''
+    for raw in lines:
+        if not raw.strip():
+            continue
+        shared, suffix, *values = json.loads(raw.decode('utf-8'))
+        if version == 1:
+            values = [None, None] + values
+        path = previous[:shared] + suffix
+        yield path, (values + [None] * 6)[:6]
+        previous = path
+
+
+# Instancia global del almacenamiento para mantener compatibilidad con el código existente
+_storage = None
+
 
 def get_storage() -> ScanStorage:
     """
@@ -503,6 +2432,33 @@ def search_in_catalogs(search_term: str) -> List[Dict]:
     return get_storage().search_directories(search_term)
 
 
+def export_catalog(serial_number: str, fileobj: BinaryIO) -> bool:
+    """
+    Exporta un catálogo a un archivo .ndjson.gz.
+    
+    Args:
+        serial_number (str): Número de serie del catálogo
+        fileobj (BinaryIO): Destino abierto en modo binario
+    
+    Returns:
+        bool: True si se exportó correctamente
+    """
+    return get_storage().export_catalog(serial_number, fileobj)
+
+
+def import_catalog(fileobj: BinaryIO) -> Optional[Dict]:
+    """
+    Importa un catálogo desde un archivo .ndjson.gz.
+    
+    Args:
+        fileobj (BinaryIO): Origen abierto en modo binario
+    
+    Returns:
+        Optional[Dict]: Resumen de la importación o None si falla
+    """
+    return get_storage().import_catalog(fileobj)
+
+
 if __name__ == "__main__":
     # Código de prueba para verificar que todo funciona correctamente
     storage = ScanStorage("test_storage.db")  # Base de datos de prueba en archivo
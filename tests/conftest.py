@@ -0,0 +1,49 @@
+"""
+Fixtures comunes de las pruebas de ScanFolder.
+
+Cada prueba trabaja sobre una base de datos SQLite propia en ``tmp_path``; la
+aplicación Flask se importa una sola vez apuntando a una base de datos
+temporal para no crear ``scandata.db`` en el directorio del proyecto.
+"""
+
+import os
+import sys
+import threading
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import storage as storage_module
+from storage import ScanStorage
+
+
+@pytest.fixture
+def storage(tmp_path):
+    """Almacenamiento vacío en una base de datos temporal."""
+    return ScanStorage(str(tmp_path / 'scandata.db'))
+
+
+@pytest.fixture(scope='session')
+def app_module(tmp_path_factory):
+    """Módulo ``app`` importado con el almacenamiento global en un directorio temporal."""
+    if 'app' not in sys.modules:
+        storage_module._storage = ScanStorage(str(tmp_path_factory.mktemp('app') / 'scandata.db'))
+    import app
+    return app
+
+
+@pytest.fixture
+def client(app_module, storage, monkeypatch):
+    """Cliente de pruebas de Flask que usa el almacenamiento de la prueba."""
+    from maintenance import MaintenanceScheduler, DeletionReclaimer
+
+    maintenance = MaintenanceScheduler(storage)
+    maintenance.enabled = False
+    monkeypatch.setattr(app_module, 'storage', storage)
+    monkeypatch.setattr(app_module, 'maintenance', maintenance)
+    monkeypatch.setattr(app_module, 'reclaimer', DeletionReclaimer(storage))
+    monkeypatch.setattr(app_module, 'reclaimer_checked', threading.Event())
+    monkeypatch.setattr(app_module, 'searches', app_module.SearchRegistry())
+    app_module.app.config['TESTING'] = True
+    return app_module.app.test_client()
@@ -0,0 +1,301 @@
+"""
+Pruebas de la aplicación web (app.py).
+"""
+
+import gzip
+import json
+from datetime import datetime
+
+import pytest
+from flask.json.provider import DefaultJSONProvider
+
+from storage import ScanStorage
+
+
+def _add_catalog(storage, serial="SN-1", count=40):
+    directories = ["D:\\"] + [f"D:\\Proyectos\\carpeta_{n:03d}" for n in range(count)]
+    assert storage.add_scan(serial, "Backup", "D:\\", directories) is True
+
+
+def test_search_etag_and_not_modified(client, storage):
+    """Test que verifica que una búsqueda repetida con If-None-Match recibe un 304."""
+    _add_catalog(storage)
+
+    first = client.get('/search?q=carpeta')
+    etag = first.headers['ETag'].strip('"')
+    second = client.get('/search?q=carpeta', headers={'If-None-Match': f'"{etag}"'})
+
+    assert first.status_code == 200
+    assert second.status_code == 304
+    assert second.data == b''
+
+
+def test_etag_changes_with_writes_from_other_connections(client, storage):
+    """Test que verifica que la ETag cambia aunque escriba otro proceso sobre la misma base."""
+    _add_catalog(storage)
+    etag = client.get('/search?q=carpeta').headers['ETag']
+
+    # Otra instancia simula otro proceso: no comparte memoria con ``storage``
+    ScanStorage(storage.db_path).rename_scan("SN-1", "Renombrado")
+    response = client.get('/search?q=carpeta', headers={'If-None-Match': etag})
+
+    assert response.status_code == 200
+    assert response.headers['ETag'] != etag
+    assert response.get_json()[0]['catalog'] == "Renombrado"
+
+
+def test_catalog_version_is_persistent(storage):
+    """Test que verifica que la versión de los catálogos se guarda en la base de datos."""
+    before = storage.get_catalog_version()
+    _add_catalog(storage)
+
+    assert storage.get_catalog_version() != before
+    assert ScanStorage(storage.db_path).get_catalog_version() == storage.get_catalog_version()
+
+
+def test_gzip_negotiation(client, storage):
+    """Test que verifica la compresión gzip y la ETag propia de la representación comprimida."""
+    _add_catalog(storage)
+
+    plain = client.get('/search?q=carpeta')
+    compressed = client.get('/search?q=carpeta', headers={'Accept-Encoding': 'gzip'})
+
+    assert 'Content-Encoding' not in plain.headers
+    assert compressed.headers['Content-Encoding'] == 'gzip'
+    assert 'Accept-Encoding' in compressed.headers['Vary']
+    assert json.loads(gzip.decompress(compressed.data)) == plain.get_json()
+    assert compressed.headers['ETag'] == plain.headers['ETag'][:-1] + '-gzip"'
+
+    revalidated = client.get('/search?q=carpeta', headers={
+        'Accept-Encoding': 'gzip', 'If-None-Match': compressed.headers['ETag']})
+    assert revalidated.status_code == 304
+
+
+def test_brotli_preferred_when_available(client, storage, app_module):
+    """Test que verifica que se prefiere Brotli si el cliente y el servidor lo admiten."""
+    if app_module.brotli is None:
+        pytest.skip("brotli no está instalado")
+    _add_catalog(storage)
+
+    response = client.get('/search?q=carpeta', headers={'Accept-Encoding': 'gzip, br'})
+
+    assert response.headers['Content-Encoding'] == 'br'
+    assert response.headers['ETag'].endswith('-br"')
+
+
+def test_small_responses_not_compressed(client, storage):
+    """Test que verifica que las respuestas pequeñas se envían sin comprimir."""
+    _add_catalog(storage, count=1)
+
+    response = client.get('/search?q=carpeta', headers={'Accept-Encoding': 'gzip'})
+
+    assert 'Content-Encoding' not in response.headers
+
+
+def test_json_provider_matches_flask_output(app_module):
+    """Test que verifica que el serializador rápido escribe lo mismo que el de Flask."""
+    data = {'fecha': datetime(2024, 5, 6, 7, 8, 9), 1: 'uno', 'ruta': 'D:\\Música'}
+
+    fast = app_module.app.json.dumps(data)
+    standard = DefaultJSONProvider(app_module.app).dumps(data, ensure_ascii=False, sort_keys=False)
+
+    assert json.loads(fast) == json.loads(standard)
+
+
+def test_search_unknown_generation_not_found(client, storage):
+    """Test que verifica el 404 al buscar en una generación inexistente o compactada."""
+    _add_catalog(storage)
+
+    assert client.get('/search?q=carpeta&serial=SN-1&generation=1').status_code == 200
+    assert client.get('/search?q=carpeta&serial=SN-1&generation=7').status_code == 404
+
+
+def test_search_timeout_returns_empty_marked_response(client, storage, app_module, monkeypatch):
+    """Test que verifica que una búsqueda interrumpida responde vacía, marcada y sin cachear."""
+    import storage as storage_module
+    monkeypatch.setattr(storage_module, 'SEARCH_PROGRESS_STEPS', 100)
+    monkeypatch.setattr(app_module, 'SEARCH_TIMEOUT', 0)
+    _add_catalog(storage, count=2000)
+
+    response = client.get('/search?q=carpeta')
+
+    assert response.status_code == 200
+    assert response.headers['X-Search-Truncated'] == '1'
+    assert response.get_json() == []
+    assert 'ETag' not in response.headers
+
+
+def test_new_search_cancels_previous_of_same_session(app_module):
+    """Test que verifica que una búsqueda nueva de la misma sesión cancela la anterior."""
+    registry = app_module.SearchRegistry()
+
+    first = registry.start('pestaña-1')
+    other = registry.start('pestaña-2')
+    second = registry.start('pestaña-1')
+
+    assert first.is_set()
+    assert not other.is_set()
+    assert not second.is_set()
+    # Terminar una búsqueda ya sustituida no borra la vigente del registro
+    registry.finish('pestaña-1', first)
+    registry.start('pestaña-1')
+    assert second.is_set()
+
+
+def _wait_for(condition, timeout=5.0):
+    import time
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "la condición no se cumplió a tiempo"
+        time.sleep(0.01)
+
+
+class _BlockingSearch:
+    """Búsqueda falsa que espera a ``release`` y registra sus cancelaciones."""
+
+    def __init__(self):
+        import threading
+        self.release = threading.Event()
+        self.calls = 0
+        self.cancel_event = None
+
+    def __call__(self, cancel_event, **kwargs):
+        self.calls += 1
+        self.cancel_event = cancel_event
+        self.release.wait(5)
+        return {'results': [kwargs['search_term']], 'truncated': False, 'cancelled': False}
+
+
+def test_identical_searches_share_one_query(app_module):
+    """Test que verifica que dos búsquedas idénticas simultáneas ejecutan una sola consulta."""
+    import threading
+    search = _BlockingSearch()
+    coalescer = app_module.SearchCoalescer(search)
+    key = coalescer.key("  Fotos ", None, None, 100)
+    outcomes = []
+
+    def run():
+        outcomes.append(coalescer.run(key, threading.Event(), search_term="fotos"))
+
+    threads = [threading.Thread(target=run) for _ in range(2)]
+    threads[0].start()
+    _wait_for(lambda: search.calls == 1)
+    threads[1].start()
+    _wait_for(lambda: coalescer.get_stats()['coalesced'] == 1)
+    search.release.set()
+    for thread in threads:
+        thread.join(5)
+
+    assert search.calls == 1
+    assert outcomes[0] is outcomes[1]
+    assert coalescer.get_stats() == {'executed': 1, 'coalesced': 1, 'in_flight': 0}
+    assert key == coalescer.key("fotos", None, None, 100)
+
+
+def test_shared_query_cancelled_only_when_all_clients_leave(app_module):
+    """Test que verifica que la consulta compartida sigue mientras quede algún cliente."""
+    import threading
+    search = _BlockingSearch()
+    coalescer = app_module.SearchCoalescer(search)
+    key = coalescer.key("fotos", None, None, 100)
+    leader_cancel, follower_cancel = threading.Event(), threading.Event()
+    follower_outcome = []
+
+    leader = threading.Thread(target=coalescer.run, args=(key, leader_cancel),
+                              kwargs={'search_term': "fotos"})
+    leader.start()
+    _wait_for(lambda: search.calls == 1)
+    follower = threading.Thread(target=lambda: follower_outcome.append(
+        coalescer.run(key, follower_cancel, search_term="fotos")))
+    follower.start()
+    _wait_for(lambda: coalescer.get_stats()['coalesced'] == 1)
+
+    leader_cancel.set()
+    assert not search.cancel_event.is_set()
+
+    follower_cancel.set()
+    follower.join(5)
+    assert follower_outcome[0]['cancelled'] is True
+    assert search.cancel_event.is_set()
+
+    search.release.set()
+    leader.join(5)
+
+
+def test_search_stats_exposed(client, storage):
+    """Test que verifica que /stats incluye los contadores de búsquedas agrupadas."""
+    _add_catalog(storage)
+    client.get('/search?q=carpeta')
+
+    stats = client.get('/stats').get_json()
+
+    assert stats['total_scans'] == 1
+    assert {'executed', 'coalesced', 'in_flight'} <= set(stats['search'])
+
+
+def test_per_worker_state_is_labelled(client, admin):
+    """Test que verifica que los estados en memoria indican el proceso que responde."""
+    import os
+
+    stats = client.get('/stats').get_json()
+    watchers = client.get('/watchers').get_json()
+    profiles = client.get('/admin/profiles', headers=admin).get_json()
+
+    assert stats['search']['scope'] == 'worker'
+    assert stats['worker'] == {'pid': os.getpid(), 'maintenance': False, 'watchers': 0}
+    assert (watchers['scope'], watchers['pid']) == ('worker', os.getpid())
+    assert (profiles['scope'], profiles['pid']) == ('worker', os.getpid())
+
+
+def test_catalogs_paging_endpoint(client, storage):
+    """Test que verifica la paginación de /catalogs y el error con un cursor no válido."""
+    for n in range(3):
+        _add_catalog(storage, serial=f"SN-{n}", count=1)
+
+    first = client.get('/catalogs?sort=name&order=asc&limit=2').get_json()
+    second = client.get(f"/catalogs?sort=name&order=asc&limit=2&after={first['next']}").get_json()
+
+    assert first['total'] == 3
+    assert len(first['catalogs']) + len(second['catalogs']) == 3
+    assert second['next'] is None
+    assert client.get('/catalogs?after=basura').status_code == 400
+    assert client.get('/catalogs?limit=x').status_code == 400
+
+
+@pytest.fixture
+def admin(app_module, monkeypatch):
+    """Token de administración configurado y un perfilador limpio."""
+    monkeypatch.setattr(app_module, 'ADMIN_TOKEN', 'secreto')
+    monkeypatch.setattr(app_module, 'profiler', app_module.RequestProfiler(threshold=None))
+    return {'X-Admin-Token': 'secreto'}
+
+
+def test_admin_disabled_without_token(client, app_module, monkeypatch):
+    """Test que verifica que sin token configurado /admin/* no es accesible ni desde 127.0.0.1."""
+    monkeypatch.setattr(app_module, 'ADMIN_TOKEN', None)
+
+    response = client.get('/admin/profiles', environ_base={'REMOTE_ADDR': '127.0.0.1'})
+
+    assert response.status_code == 403
+
+
+def test_admin_requires_matching_token(client, admin):
+    """Test que verifica que /admin/* exige el token en la cabecera X-Admin-Token."""
+    assert client.get('/admin/profiles').status_code == 403
+    assert client.get('/admin/profiles', headers={'X-Admin-Token': 'otro'}).status_code == 403
+
+    response = client.post('/admin/profiling', data={'enabled': '1'}, headers=admin)
+
+    assert response.status_code == 200
+    assert response.get_json()['enabled'] is True
+
+
+def test_profile_header_requires_token(client, storage, admin):
+    """Test que verifica que la cabecera X-Profile solo se atiende con el token."""
+    _add_catalog(storage)
+
+    anonymous = client.get('/search?q=carpeta', headers={'X-Profile': '1'})
+    profiled = client.get('/search?q=carpeta', headers={'X-Profile': '1', **admin})
+
+    assert 'X-Profile-Id' not in anonymous.headers
+    assert 'X-Profile-Id' in profiled.headers
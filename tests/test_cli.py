@@ -0,0 +1,47 @@
+"""
+Pruebas de la interfaz de línea de comandos (cli.py).
+"""
+
+import cli
+import scanner
+from storage import ScanStorage
+
+
+def _fail_vol(drive):
+    raise AssertionError("no se debe ejecutar 'vol' fuera de Windows")
+
+
+def test_scan_requires_serial_outside_windows(tmp_path, monkeypatch):
+    """Test que verifica que fuera de Windows se exige --serial sin ejecutar 'vol'."""
+    monkeypatch.setattr(cli.platform, 'system', lambda: 'Linux')
+    monkeypatch.setattr(scanner, 'get_volume_info_windows', _fail_vol)
+
+    code = cli.main(['--db', str(tmp_path / 'scandata.db'), '-q', 'scan', str(tmp_path)])
+
+    assert code == cli.EXIT_USAGE
+
+
+def test_scan_uses_volume_serial_on_windows(tmp_path, monkeypatch):
+    """Test que verifica que en Windows el serial se obtiene del volumen."""
+    monkeypatch.setattr(cli.platform, 'system', lambda: 'Windows')
+    monkeypatch.setattr(scanner, 'get_volume_info_windows', lambda drive: ("Datos", "ABCD-1234"))
+    db = str(tmp_path / 'scandata.db')
+    (tmp_path / 'disco' / 'fotos').mkdir(parents=True)
+
+    code = cli.main(['--db', db, '-q', 'scan', str(tmp_path / 'disco')])
+
+    assert code == cli.EXIT_OK
+    assert ScanStorage(db).get_scan_by_serial("ABCD-1234")['volume_name'] == "Datos"
+
+
+def test_scan_with_serial_and_search(tmp_path, capsys):
+    """Test que verifica el ciclo scan + search con códigos de salida para scripts."""
+    db = str(tmp_path / 'scandata.db')
+    (tmp_path / 'disco' / 'fotos' / 'verano').mkdir(parents=True)
+
+    assert cli.main(['--db', db, '-q', 'scan', str(tmp_path / 'disco'), '--serial', 'SN-1']) == cli.EXIT_OK
+    capsys.readouterr()
+
+    assert cli.main(['--db', db, '-q', 'search', 'verano']) == cli.EXIT_OK
+    assert 'verano' in capsys.readouterr().out
+    assert cli.main(['--db', db, '-q', 'search', 'invierno']) == cli.EXIT_NOT_FOUND
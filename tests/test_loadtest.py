@@ -0,0 +1,110 @@
+"""
+Pruebas de la prueba de carga (loadtest.py).
+"""
+
+import argparse
+
+import pytest
+
+import loadtest
+
+
+def _samples(route, latencies_ms, ok=True, truncated=False, start=0.0):
+    """Muestras ``(ruta, programada, fin, ok, truncada)`` con las latencias dadas."""
+    return [(route, start, start + latency / 1000, ok, truncated) for latency in latencies_ms]
+
+
+def test_percentile_nearest_rank():
+    """Test que verifica el percentil por rango más cercano en muestras pequeñas."""
+    ordered = [10, 20, 30, 40, 50, 60, 70, 80, 90, 100]
+
+    assert loadtest._percentile(ordered, 0.50) == 50
+    assert loadtest._percentile(ordered, 0.95) == 100
+    assert loadtest._percentile(ordered, 0.10) == 10
+    assert loadtest._percentile(ordered, 0.11) == 20
+    assert loadtest._percentile([7], 0.99) == 7
+
+
+def test_summarize_per_route_and_total():
+    """Test que verifica latencias, errores y rendimiento por ruta y en total."""
+    samples = (_samples('search', [100, 200, 300, 400])
+               + _samples('drives', [1000], ok=False))
+
+    report = loadtest.summarize(samples)
+
+    assert report['search']['requests'] == 4
+    assert (report['search']['p50'], report['search']['p95'], report['search']['max']) == (200, 400, 400)
+    assert report['drives']['error_rate'] == 1.0
+    assert report['total']['requests'] == 5
+    assert report['total']['errors'] == 1
+    # 4 respuestas correctas en 1 s (de la primera programada a la última respuesta)
+    assert report['total']['throughput'] == 4.0
+    assert loadtest.summarize([]) == {}
+
+
+def test_truncated_searches_counted_apart():
+    """Test que verifica que las búsquedas truncadas no cuentan como correctas."""
+    samples = _samples('search', [50] * 8) + _samples('search', [40] * 2, truncated=True)
+
+    report = loadtest.summarize(samples)
+
+    assert report['search']['errors'] == 0
+    assert report['search']['truncated'] == 2
+    assert report['search']['truncated_rate'] == 0.2
+    assert report['search']['throughput'] == 160.0
+
+
+def test_check_slos_detects_violations():
+    """Test que verifica la detección de latencia, errores y truncadas por encima del límite."""
+    report = loadtest.summarize(_samples('search', [100] * 9 + [900])
+                                + _samples('drives', [10] * 9) + _samples('drives', [10], ok=False)
+                                + _samples('catalog', [10] * 9) + _samples('catalog', [10], truncated=True))
+
+    violations = loadtest.check_slos(report, {'search': {'p95': 300, 'p50': 500},
+                                              'drives': {'p95': 100}}, 0.05)
+
+    assert violations == ["search: p95 900.0 ms > 300 ms",
+                          "drives: tasa de errores 10.00% > 5.00%",
+                          "catalog: respuestas truncadas 10.00% > 5.00%"]
+    assert loadtest.check_slos(report, {'search': {'p99': 1000}}, 0.1) == []
+
+
+def test_parse_mix():
+    """Test que verifica los pesos por ruta y el rechazo de mezclas mal formadas."""
+    assert loadtest.parse_mix("search=60, scan=5") == {'search': 60, 'catalog': 0, 'drives': 0, 'scan': 5}
+
+    for text in ("search", "busqueda=10", "search=x", "search=-1", "search=0,scan=0", ""):
+        with pytest.raises(argparse.ArgumentTypeError):
+            loadtest.parse_mix(text)
+
+
+def test_parse_slo():
+    """Test que verifica el formato RUTA.pNN=MS y el rechazo de los mal formados."""
+    assert loadtest.parse_slo("search.p95=250") == ('search', 'p95', 250.0)
+
+    for text in ("search.p95", "search.p90=100", "otra.p95=100", "search=100", "search.p95=rápido"):
+        with pytest.raises(argparse.ArgumentTypeError):
+            loadtest.parse_slo(text)
+
+
+def test_invalid_arguments_exit_with_usage(capsys):
+    """Test que verifica el código de uso incorrecto con argumentos mal formados."""
+    with pytest.raises(SystemExit) as exit_info:
+        loadtest.main(['--mix', 'search=x'])
+
+    assert exit_info.value.code == loadtest.EXIT_USAGE
+    assert loadtest.main(['--rate', '0']) == loadtest.EXIT_USAGE
+
+
+def test_violation_exits_with_failure(tmp_path, capsys):
+    """Test que verifica que una prueba real con un SLO superado termina con código 1."""
+    args = ['--catalogs', '1', '--dirs', '20', '--drive-dirs', '5', '--rate', '20',
+            '--duration', '0.5', '--warmup', '0', '--mix', 'search=1',
+            '--db', str(tmp_path / 'carga.db'), '--json']
+
+    failed = loadtest.main(args + ['--slo', 'search.p50=0.0001'])
+    passed = loadtest.main(args + ['--slo', 'search.p95=60000', '--slo', 'search.p99=60000'])
+
+    assert failed == loadtest.EXIT_FAILURE
+    assert passed == loadtest.EXIT_OK
+    assert '"violations": ["search: p50' in capsys.readouterr().out
@@ -0,0 +1,214 @@
+"""
+Pruebas del mantenimiento de la base de datos (maintenance.py y run_maintenance).
+"""
+
+import sqlite3
+from datetime import datetime
+
+import cli
+from maintenance import MaintenanceScheduler
+from storage import ScanStorage
+
+
+def _legacy_storage(tmp_path):
+    """Base de datos creada antes de auto_vacuum incremental (auto_vacuum = NONE)."""
+    db = str(tmp_path / 'antigua.db')
+    conn = sqlite3.connect(db)
+    conn.execute("CREATE TABLE legado (id INTEGER)")
+    conn.close()
+    return ScanStorage(db)
+
+
+def _pragma(storage, name):
+    return sqlite3.connect(storage.db_path).execute(f"PRAGMA {name}").fetchone()[0]
+
+
+def _fill_and_delete(storage, count=3000):
+    directories = [f"D:\\carpeta_larga_para_ocupar_paginas_{n:05d}" for n in range(count)]
+    storage.add_scan("SN-1", "Temporal", "D:\\", directories)
+    storage.delete_scan("SN-1")
+    storage.reclaim_deleted_scans()
+
+
+def test_maintenance_does_not_convert_by_default(tmp_path):
+    """Test que verifica que el mantenimiento no hace el VACUUM completo sin pedirlo."""
+    storage = _legacy_storage(tmp_path)
+
+    run = storage.run_maintenance()
+
+    assert 'vacuum' not in run['steps'].split(',')
+    assert _pragma(storage, 'auto_vacuum') == 0
+
+
+def test_maintenance_converts_on_request(tmp_path):
+    """Test que verifica la conversión explícita a auto_vacuum incremental."""
+    storage = _legacy_storage(tmp_path)
+
+    run = storage.run_maintenance(convert_auto_vacuum=True)
+
+    assert 'vacuum' in run['steps'].split(',')
+    assert _pragma(storage, 'auto_vacuum') == 2
+
+
+def test_cli_maintenance_convert_flag(tmp_path):
+    """Test que verifica que la CLI solo convierte con --convert."""
+    storage = _legacy_storage(tmp_path)
+
+    assert cli.main(['--db', storage.db_path, '-q', 'maintenance']) == cli.EXIT_OK
+    assert _pragma(storage, 'auto_vacuum') == 0
+    assert cli.main(['--db', storage.db_path, '-q', 'maintenance', '--convert']) == cli.EXIT_OK
+    assert _pragma(storage, 'auto_vacuum') == 2
+
+
+def test_incremental_vacuum_respects_page_budget(storage):
+    """Test que verifica que cada pasada libera como mucho ``vacuum_pages`` páginas."""
+    _fill_and_delete(storage)
+    pages_before = _pragma(storage, 'page_count')
+    assert _pragma(storage, 'freelist_count') > 20
+
+    run = storage.run_maintenance(vacuum_pages=10, vacuum_step=4)
+
+    # El archivo se acorta exactamente en el presupuesto; quedan páginas libres
+    assert run['pages_vacuumed'] == 10
+    assert _pragma(storage, 'page_count') == pages_before - 10
+    assert _pragma(storage, 'freelist_count') > 0
+
+
+def test_maintenance_stops_when_requested(storage):
+    """Test que verifica que la pasada se interrumpe y queda registrada como tal."""
+    _fill_and_delete(storage)
+
+    run = storage.run_maintenance(should_stop=lambda: True)
+
+    assert run['interrupted'] is True
+    assert run['pages_vacuumed'] == 0
+    assert 'analyze' not in run['steps'].split(',')
+    assert storage.get_maintenance_runs(1)[0]['interrupted'] is True
+
+
+class _RecordingStorage:
+    def __init__(self):
+        self.calls = []
+
+    def run_maintenance(self, **kwargs):
+        self.calls.append(kwargs)
+        return {}
+
+
+def test_scheduler_never_requests_conversion():
+    """Test que verifica que el planificador no pide nunca el VACUUM completo."""
+    storage = _RecordingStorage()
+    scheduler = MaintenanceScheduler(storage, vacuum_pages=50, analysis_limit=10)
+
+    scheduler.run_once()
+
+    assert storage.calls[0]['convert_auto_vacuum'] is False
+    assert storage.calls[0]['vacuum_pages'] == 50
+    assert storage.calls[0]['analysis_limit'] == 10
+
+
+def test_scheduler_waits_for_idle_and_window():
+    """Test que verifica la inactividad necesaria y las ventanas que cruzan la medianoche."""
+    scheduler = MaintenanceScheduler(_RecordingStorage(), windows=[("23:00", "02:00")],
+                                     idle_seconds=0)
+
+    assert scheduler.in_window(datetime(2024, 1, 1, 23, 30))
+    assert scheduler.in_window(datetime(2024, 1, 2, 1, 59))
+    assert not scheduler.in_window(datetime(2024, 1, 2, 12, 0))
+
+    scheduler.windows = []
+    scheduler.request_started()
+    assert scheduler.is_due() is False
+    scheduler.request_finished()
+    assert scheduler.is_due() is True
+    scheduler.run_once()
+    assert scheduler.is_due() is False
+
+
+def test_disabled_scheduler_does_not_start():
+    """Test que verifica que un planificador deshabilitado no arranca su hilo."""
+    scheduler = MaintenanceScheduler(_RecordingStorage())
+    scheduler.enabled = False
+
+    scheduler.start()
+
+    assert scheduler._thread is None
+
+
+def _live_rows(storage):
+    return sqlite3.connect(storage.db_path).execute("SELECT COUNT(*) FROM directories").fetchone()[0]
+
+
+def test_delete_scan_hides_catalog_immediately(storage):
+    """Test que verifica que un catálogo eliminado desaparece antes de borrar sus filas."""
+    storage.add_scan("SN-1", "Temporal", "D:\\", [f"D:\\dir_{n}" for n in range(50)])
+
+    assert storage.delete_scan("SN-1") is True
+
+    assert storage.get_scan_by_serial("SN-1") is None
+    assert storage.search_directories("dir_") == []
+    assert storage.get_database_stats()['total_directories'] == 0
+    assert _live_rows(storage) == 50
+    pending = storage.get_pending_deletions()
+    assert [(p['serial_number'], p['total_rows'], p['progress']) for p in pending] == [("SN-1", 50, 0.0)]
+    assert storage.delete_scan("SN-1") is False
+
+
+def test_deleted_serial_can_be_scanned_again(storage):
+    """Test que verifica que el serial queda libre y las filas antiguas no se mezclan."""
+    storage.add_scan("SN-1", "Temporal", "D:\\", ["D:\\viejo"])
+    storage.delete_scan("SN-1")
+
+    storage.add_scan("SN-1", "Nuevo", "D:\\", ["D:\\nuevo"])
+
+    scan = storage.get_scan_by_serial("SN-1")
+    assert scan['generation'] == 1
+    assert storage.get_directories_by_scan(scan['id']) == ["D:\\nuevo"]
+    assert storage.search_directories("viejo") == []
+
+
+def test_reclaim_deletes_in_chunks(storage):
+    """Test que verifica el borrado por lotes, el límite por llamada y el progreso."""
+    storage.add_scan("SN-1", "Temporal", "D:\\", [f"D:\\dir_{n}" for n in range(500)])
+    storage.delete_scan("SN-1")
+
+    assert storage.reclaim_deleted_scans(chunk_size=100, max_rows=250) == 250
+    assert _live_rows(storage) == 250
+    assert storage.get_pending_deletions()[0]['progress'] == 50.0
+
+    assert storage.reclaim_deleted_scans(chunk_size=100) == 250
+    assert _live_rows(storage) == 0
+    assert storage.get_pending_deletions() == []
+
+
+def test_reclaim_stops_between_chunks(storage):
+    """Test que verifica que ``should_stop`` se comprueba entre lotes."""
+    storage.add_scan("SN-1", "Temporal", "D:\\", [f"D:\\dir_{n}" for n in range(300)])
+    storage.delete_scan("SN-1")
+    batches = []
+
+    def stop_after_two():
+        batches.append(1)
+        return len(batches) > 2
+
+    assert storage.reclaim_deleted_scans(chunk_size=100, should_stop=stop_after_two) == 200
+    assert storage.get_pending_deletions()[0]['deleted_rows'] == 200
+
+
+def test_reclaimer_thread_empties_pending_deletions(storage):
+    """Test que verifica que el hilo de borrado termina el trabajo pendiente al despertarlo."""
+    import time
+    from maintenance import DeletionReclaimer
+
+    storage.add_scan("SN-1", "Temporal", "D:\\", [f"D:\\dir_{n}" for n in range(300)])
+    storage.delete_scan("SN-1")
+    reclaimer = DeletionReclaimer(storage, pause=0)
+
+    reclaimer.wake()
+    deadline = time.monotonic() + 5
+    while storage.get_pending_deletions() and time.monotonic() < deadline:
+        time.sleep(0.01)
+    reclaimer.stop(5)
+
+    assert storage.get_pending_deletions() == []
+    assert _live_rows(storage) == 0
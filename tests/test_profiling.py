@@ -0,0 +1,76 @@
+"""
+Pruebas del perfilador por muestreo (profiling.py).
+"""
+
+import threading
+import time
+
+from profiling import RequestProfiler
+
+
+def _busy(seconds):
+    deadline = time.monotonic() + seconds
+    while time.monotonic() < deadline:
+        pass
+
+
+def test_header_profile_is_saved():
+    """Test que verifica que un perfil pedido por cabecera guarda sus pilas."""
+    profiler = RequestProfiler(interval=0.001, threshold=None)
+
+    capture = profiler.begin("GET /search", force=True)
+    _busy(0.05)
+    summary = profiler.end(capture, 200)
+
+    assert summary['trigger'] == 'header'
+    assert summary['samples'] > 0
+    assert profiler.list_profiles()[0]['id'] == capture.id
+    assert profiler.get_profile(capture.id)['stacks']
+    assert any('_busy' in line for line in profiler.folded(profiler.get_profile(capture.id)).splitlines())
+
+
+def test_threshold_starts_sampling_late():
+    """Test que verifica que solo las peticiones que superan el umbral se guardan."""
+    profiler = RequestProfiler(interval=0.001, threshold=0.03)
+
+    fast = profiler.begin("GET /rapida")
+    assert profiler.end(fast, 200) is None
+
+    slow = profiler.begin("GET /lenta")
+    _busy(0.1)
+    summary = profiler.end(slow, 200)
+
+    assert summary['trigger'] == 'threshold'
+    assert [p['label'] for p in profiler.list_profiles()] == ["GET /lenta"]
+
+
+def test_listing_while_profiles_are_added():
+    """Test que verifica que listar perfiles mientras otros hilos los añaden no falla."""
+    profiler = RequestProfiler(interval=0.001, capacity=5, threshold=None)
+    stop = threading.Event()
+    errors = []
+
+    def produce():
+        while not stop.is_set():
+            capture = profiler.begin("GET /search", force=True)
+            capture.samples = 1  # sin esperar al hilo de muestreo
+            profiler.end(capture, 200)
+
+    def read():
+        try:
+            while not stop.is_set():
+                for summary in profiler.list_profiles():
+                    profiler.get_profile(summary['id'])
+        except RuntimeError as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=produce) for _ in range(2)] + [threading.Thread(target=read)]
+    for thread in threads:
+        thread.start()
+    time.sleep(0.5)
+    stop.set()
+    for thread in threads:
+        thread.join(5)
+
+    assert errors == []
+    assert len(profiler.list_profiles()) == 5
@@ -0,0 +1,147 @@
+"""
+Pruebas del servidor de producción (serve.py).
+"""
+
+import http.client
+import signal
+import socket
+import threading
+
+import pytest
+
+import serve
+
+
+class _SlowApp:
+    """Aplicación WSGI que no responde hasta ``release``."""
+
+    def __init__(self):
+        self.started = threading.Event()
+        self.release = threading.Event()
+
+    def __call__(self, environ, start_response):
+        self.started.set()
+        self.release.wait(5)
+        start_response('200 OK', [('Content-Type', 'text/plain'), ('Content-Length', '2')])
+        return [b'ok']
+
+
+@pytest.fixture
+def worker():
+    """Servidor de un proceso de trabajo sobre un socket local, ya sirviendo."""
+    sock = socket.create_server(('127.0.0.1', 0))
+    app = _SlowApp()
+    server = serve._WorkerServer(sock, app)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server, app, sock.getsockname()[1]
+    app.release.set()
+    thread.join(5)
+    server.server_close()
+    sock.close()
+
+
+def _request_in_background(port):
+    outcome = {}
+
+    def run():
+        conn = http.client.HTTPConnection('127.0.0.1', port, timeout=5)
+        conn.request('GET', '/')
+        response = conn.getresponse()
+        outcome.update(status=response.status, body=response.read(),
+                       connection=response.getheader('Connection'))
+        conn.close()
+
+    thread = threading.Thread(target=run)
+    thread.start()
+    return thread, outcome
+
+
+def test_drain_waits_for_requests_in_flight(worker):
+    """Test que verifica que drain espera a la petición en curso y cierra su conexión."""
+    server, app, port = worker
+    client, outcome = _request_in_background(port)
+    assert app.started.wait(5)
+
+    drained = []
+    drainer = threading.Thread(target=lambda: drained.append(server.drain(5)))
+    drainer.start()
+    drainer.join(0.3)
+    assert drainer.is_alive() and server.draining
+
+    app.release.set()
+    drainer.join(5)
+    client.join(5)
+
+    assert drained == [True]
+    assert outcome == {'status': 200, 'body': b'ok', 'connection': 'close'}
+
+
+def test_drain_reports_timeout(worker):
+    """Test que verifica que drain devuelve False si la petición no termina a tiempo."""
+    server, app, port = worker
+    client, _ = _request_in_background(port)
+    assert app.started.wait(5)
+
+    assert server.drain(0.1) is False
+
+    app.release.set()
+    client.join(5)
+
+
+def test_reload_defers_maintenance_until_old_leader_exits(monkeypatch):
+    """Test que verifica que el nuevo primer proceso solo asume el mantenimiento al recoger al anterior."""
+    server = serve.PreforkServer(workers=2)
+    pids = iter(range(100, 200))
+    waiting_for = []
+    killed = []
+    exited = []
+    monkeypatch.setattr(serve.os, 'fork', lambda: next(pids))
+    monkeypatch.setattr(serve.os, 'kill', lambda pid, signum: killed.append((pid, signum)))
+    monkeypatch.setattr(serve.os, 'waitpid',
+                        lambda pid, options: (exited.pop(0), 0) if exited else (0, 0))
+    monkeypatch.setattr(serve.importlib, 'reload', lambda module: module)
+    monkeypatch.setattr(server, 'prepare', lambda: True)
+    spawn = server._spawn
+
+    def record_spawn(index):
+        # Proceso con el mantenimiento que aún no ha terminado al crear cada uno
+        waiting_for.append((index, server._old_leader))
+        spawn(index)
+
+    monkeypatch.setattr(server, '_spawn', record_spawn)
+
+    for index in range(2):
+        server._spawn(index)
+    server._reload()
+
+    assert waiting_for == [(0, None), (1, None), (0, 100), (1, 100)]
+    assert killed == [(100, signal.SIGTERM), (101, signal.SIGTERM)]
+
+    # Se retira el segundo proceso anterior: el primero sigue con el mantenimiento
+    exited.append(101)
+    server._reap()
+    assert killed[2:] == []
+
+    exited.append(100)
+    server._reap()
+    assert server._old_leader is None
+    assert killed[2:] == [(102, signal.SIGUSR1)]
+
+
+def test_second_reload_keeps_waiting_for_original_leader(monkeypatch):
+    """Test que verifica que una recarga encadenada sigue esperando al proceso con el mantenimiento."""
+    server = serve.PreforkServer(workers=1)
+    pids = iter(range(100, 200))
+    killed = []
+    monkeypatch.setattr(serve.os, 'fork', lambda: next(pids))
+    monkeypatch.setattr(serve.os, 'kill', lambda pid, signum: killed.append((pid, signum)))
+    monkeypatch.setattr(serve.importlib, 'reload', lambda module: module)
+    monkeypatch.setattr(server, 'prepare', lambda: True)
+
+    server._spawn(0)
+    server._reload()
+    server._reload()
+
+    assert server._old_leader == 100
+    assert list(server._workers) == [102]
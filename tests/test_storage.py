@@ -0,0 +1,474 @@
+"""
+Pruebas del almacenamiento SQLite (storage.py).
+"""
+
+import gzip
+import io
+import json
+
+from storage import ScanStorage
+
+
+DIRECTORIES = [
+    "D:\\",
+    "D:\\Fotos",
+    "D:\\Fotos\\2023",
+    "D:\\Fotos\\2024",
+    "D:\\Música",
+]
+
+FILE_STATS = {
+    "D:\\": (1, 100),
+    "D:\\Fotos": (2, 200),
+    "D:\\Fotos\\2023": (3, 300),
+    "D:\\Fotos\\2024": (4, 400),
+    "D:\\Música": (5, 500),
+}
+
+
+def _export(storage, serial):
+    buffer = io.BytesIO()
+    assert storage.export_catalog(serial, buffer) is True
+    buffer.seek(0)
+    return buffer
+
+
+def test_export_import_round_trip(storage, tmp_path):
+    """Test que verifica que un catálogo exportado se importa idéntico en otra base de datos."""
+    storage.add_scan("SN-1", "Backup", "D:\\", DIRECTORIES, FILE_STATS)
+    target = ScanStorage(str(tmp_path / 'otra.db'))
+
+    result = target.import_catalog(_export(storage, "SN-1"))
+
+    assert result == {'serial_number': "SN-1", 'total_directories': len(DIRECTORIES)}
+    imported = target.get_scan_by_serial("SN-1")
+    assert imported['volume_name'] == "Backup"
+    assert imported['total_files'] == 15
+    assert imported['total_bytes'] == 1500
+    assert target.get_directories_by_scan(imported['id']) == sorted(DIRECTORIES)
+    assert target.get_directory_size("SN-1", "D:\\Fotos") == storage.get_directory_size("SN-1", "D:\\Fotos")
+
+
+def test_export_uses_front_coding(storage):
+    """Test que verifica que cada línea guarda solo el sufijo distinto de la ruta anterior."""
+    storage.add_scan("SN-1", "Backup", "D:\\", DIRECTORIES)
+
+    lines = gzip.decompress(_export(storage, "SN-1").read()).decode('utf-8').splitlines()
+    header = json.loads(lines[0])
+    records = [json.loads(line) for line in lines[1:]]
+
+    assert header['scan']['serial_number'] == "SN-1"
+    assert [record[:2] for record in records] == [
+        [0, "D:\\"],
+        [3, "Fotos"],
+        [8, "\\2023"],
+        [12, "4"],
+        [3, "Música"],
+    ]
+    # Sin estadísticas de archivos no se exportan los tamaños
+    assert all(len(record) == 4 for record in records)
+
+
+def test_import_rejects_corrupt_file(storage):
+    """Test que verifica que un archivo truncado no deja un catálogo a medias."""
+    storage.add_scan("SN-1", "Backup", "D:\\", DIRECTORIES)
+    data = _export(storage, "SN-1").read()
+    target_data = io.BytesIO(data[:len(data) // 2])
+    storage.delete_scan("SN-1")
+
+    assert storage.import_catalog(target_data) is None
+    assert storage.get_scan_by_serial("SN-1") is None
+
+
+def test_import_existing_serial_adds_generation(storage):
+    """Test que verifica que importar un catálogo existente crea una nueva generación."""
+    storage.add_scan("SN-1", "Backup", "D:\\", DIRECTORIES)
+    exported = _export(storage, "SN-1")
+
+    storage.import_catalog(exported)
+
+    assert storage.get_scan_by_serial("SN-1")['generation'] == 2
+    assert storage.search_directories("2024")[0]['directory_path'] == "D:\\Fotos\\2024"
+
+
+def test_size_rollups_sum_subtree():
+    """Test que verifica que los acumulados suman el subárbol sin contar carpetas ajenas."""
+    from storage import compute_size_rollups
+
+    rollups = compute_size_rollups(DIRECTORIES, FILE_STATS)
+
+    assert rollups["D:\\Fotos\\2023"] == (3, 300)
+    assert rollups["D:\\Fotos"] == (9, 900)
+    assert rollups["D:\\"] == (15, 1500)
+
+
+def test_size_rollups_skip_missing_levels():
+    """Test que verifica que un hijo se suma al antecesor catalogado más cercano."""
+    from storage import compute_size_rollups
+
+    directories = ["/mnt/a", "/mnt/a/b/c"]
+    rollups = compute_size_rollups(directories, {"/mnt/a": (1, 10), "/mnt/a/b/c": (2, 20)})
+
+    assert rollups["/mnt/a"] == (3, 30)
+
+
+def test_directory_size_is_stored(storage):
+    """Test que verifica que el tamaño de una carpeta se consulta sin recalcular."""
+    storage.add_scan("SN-1", "Backup", "D:\\", DIRECTORIES, FILE_STATS)
+
+    size = storage.get_directory_size("SN-1", "D:\\Fotos")
+
+    assert size['file_count'] == 2
+    assert size['total_bytes'] == 200
+    assert size['tree_file_count'] == 9
+    assert size['tree_bytes'] == 900
+    assert storage.get_directory_size("SN-1", "D:\\NoExiste") is None
+
+
+def test_rename_scan_keeps_directories(storage):
+    """Test que verifica que renombrar un catálogo no toca sus directorios ni su generación."""
+    storage.add_scan("SN-1", "Backup", "D:\\", DIRECTORIES, FILE_STATS)
+
+    assert storage.rename_scan("SN-1", "Archivo 2024") is True
+    assert storage.rename_scan("SN-X", "Nada") is False
+
+    scan = storage.get_scan_by_serial("SN-1")
+    assert scan['volume_name'] == "Archivo 2024"
+    assert scan['generation'] == 1
+    assert len(storage.get_directories_by_scan(scan['id'])) == len(DIRECTORIES)
+    assert storage.search_directories("Música")[0]['volume_name'] == "Archivo 2024"
+
+
+def test_duplicates_across_catalogs(storage):
+    """Test que verifica que una carpeta copiada en dos discos forma un grupo."""
+    storage.add_scan("SN-1", "Disco A", "D:\\", ["D:\\", "D:\\Fotos", "D:\\Fotos\\2024", "D:\\Otros"])
+    storage.add_scan("SN-2", "Disco B", "E:\\", ["E:\\", "E:\\Copia", "E:\\Copia\\2024", "E:\\Varios"])
+
+    groups = storage.find_duplicate_directories()
+
+    assert len(groups) == 1
+    assert groups[0]['tree_directories'] == 1
+    assert {copy['directory_path'] for copy in groups[0]['copies']} == {"D:\\Fotos", "E:\\Copia"}
+
+
+def test_duplicates_report_only_maximal_groups(storage):
+    """Test que verifica que no se listan las subcarpetas de un subárbol ya duplicado."""
+    tree = ["{0}Proyecto", "{0}Proyecto\\src", "{0}Proyecto\\src\\core", "{0}Proyecto\\docs"]
+    storage.add_scan("SN-1", "Disco A", "D:\\", ["D:\\", "D:\\Trabajo"] + [p.format("D:\\Trabajo\\") for p in tree])
+    storage.add_scan("SN-2", "Disco B", "E:\\", ["E:\\", "E:\\Backup"] + [p.format("E:\\Backup\\") for p in tree])
+    storage.add_scan("SN-3", "Disco C", "F:\\", ["F:\\", "F:\\src", "F:\\src\\core", "F:\\fuentes"])
+
+    groups = storage.find_duplicate_directories()
+    copies = [sorted(copy['directory_path'] for copy in group['copies']) for group in groups]
+
+    # Trabajo y Backup contienen lo mismo: el grupo máximo es el de sus padres,
+    # y src también está en F:\ con otro padre, así que se sigue informando
+    assert copies == [
+        ["D:\\Trabajo", "E:\\Backup"],
+        ["D:\\Trabajo\\Proyecto\\src", "E:\\Backup\\Proyecto\\src", "F:\\src"],
+    ]
+
+
+def test_duplicates_limit_counts_maximal_groups(storage):
+    """Test que verifica que el límite se aplica después de descartar los grupos contenidos."""
+    storage.add_scan("SN-1", "Disco A", "D:\\", ["D:\\", "D:\\A", "D:\\A\\x", "D:\\A\\x\\y", "D:\\B", "D:\\B\\z"])
+    storage.add_scan("SN-2", "Disco B", "E:\\", ["E:\\", "E:\\A", "E:\\A\\x", "E:\\A\\x\\y", "E:\\C", "E:\\C\\z"])
+
+    groups = storage.find_duplicate_directories(min_directories=0, limit=2)
+
+    assert [sorted(copy['directory_path'] for copy in group['copies']) for group in groups] == [
+        ["D:\\A", "E:\\A"],
+        ["D:\\B", "E:\\C"],
+    ]
+
+
+def _rescan(storage, generations):
+    for directories in generations:
+        assert storage.add_scan("SN-1", "Backup", "D:\\", directories) is True
+
+
+def test_generation_counts_only_added_and_removed_paths(storage):
+    """Test que verifica que los antecesores modificados no cuentan en el delta."""
+    _rescan(storage, [DIRECTORIES, DIRECTORIES[:3] + ["D:\\Fotos\\2025", "D:\\Música"]])
+
+    latest = storage.list_generations("SN-1")[0]
+
+    assert latest['generation'] == 2
+    assert latest['added_directories'] == 1
+    assert latest['removed_directories'] == 1
+    assert latest['total_directories'] == len(DIRECTORIES)
+
+
+def test_diff_generations(storage):
+    """Test que verifica las rutas añadidas y eliminadas entre dos generaciones."""
+    _rescan(storage, [DIRECTORIES, DIRECTORIES[:3] + ["D:\\Fotos\\2025", "D:\\Música"]])
+
+    diff = storage.diff_generations("SN-1", 1)
+
+    assert diff['added'] == ["D:\\Fotos\\2025"]
+    assert diff['removed'] == ["D:\\Fotos\\2024"]
+    assert diff['added_count'] == diff['removed_count'] == 1
+    assert storage.diff_generations("SN-1", 7) is None
+
+
+def test_search_as_of_generation(storage):
+    """Test que verifica que las búsquedas "a fecha de" ven el catálogo de esa generación."""
+    _rescan(storage, [DIRECTORIES, ["D:\\", "D:\\Fotos", "D:\\Fotos\\2025"]])
+    scan_id = storage.get_scan_by_serial("SN-1")['id']
+
+    assert [r['directory_path'] for r in storage.search_directories("2024", "SN-1", generation=1)] == ["D:\\Fotos\\2024"]
+    assert storage.search_directories("2024") == []
+    assert storage.search_directories("2025", "SN-1", generation=1) == []
+    assert storage.get_directories_by_scan(scan_id, generation=1) == sorted(DIRECTORIES)
+    assert storage.get_directories_by_scan(scan_id) == ["D:\\", "D:\\Fotos", "D:\\Fotos\\2025"]
+
+
+def test_ingest_does_not_compact(tmp_path):
+    """Test que verifica que guardar escaneos no aplica la retención por sí solo."""
+    storage = ScanStorage(str(tmp_path / 'scandata.db'), keep_generations=2)
+    _rescan(storage, [[f"D:\\v{n}"] for n in range(4)])
+
+    assert len(storage.list_generations("SN-1")) == 4
+
+
+def test_compaction_keeps_recent_generations(tmp_path):
+    """Test que verifica que la compactación conserva las generaciones recientes intactas."""
+    storage = ScanStorage(str(tmp_path / 'scandata.db'), keep_generations=2)
+    _rescan(storage, [["D:\\", f"D:\\v{n}"] for n in range(4)])
+
+    # D:\\v0, D:\\v1 y las dos versiones de D:\\ que solo eran visibles en 1 y 2
+    assert storage.compact_generations() == 4
+
+    assert [g['generation'] for g in storage.list_generations("SN-1")] == [4, 3]
+    assert storage.diff_generations("SN-1", 3)['added'] == ["D:\\v3"]
+    assert storage.diff_generations("SN-1", 2) is None
+    assert [r['directory_path'] for r in storage.search_directories("v", "SN-1", generation=3)] == ["D:\\v2"]
+
+
+def test_search_rejects_compacted_generation(tmp_path):
+    """Test que verifica que una generación compactada no devuelve el estado posterior."""
+    storage = ScanStorage(str(tmp_path / 'scandata.db'), keep_generations=2)
+    _rescan(storage, [["D:\\", f"D:\\v{n}"] for n in range(4)])
+    storage.compact_generations()
+
+    # La generación 1 ya no puede reconstruirse: se indica en lugar de devolver
+    # un resultado vacío como si esa fecha no tuviera carpetas
+    assert storage.has_generation("SN-1", 1) is False
+    assert storage.has_generation("SN-1", 3) is True
+    assert storage.has_generation("SN-X", 3) is False
+    assert storage.search_directories("v", "SN-1", generation=1) == []
+    assert storage.search_directories_bounded("v", "SN-1", generation=1)['results'] == []
+
+
+def test_maintenance_runs_compaction(tmp_path):
+    """Test que verifica que el mantenimiento aplica la política de retención."""
+    storage = ScanStorage(str(tmp_path / 'scandata.db'), keep_generations=1)
+    _rescan(storage, [["D:\\a"], ["D:\\b"]])
+
+    run = storage.run_maintenance()
+
+    assert 'compact' in run['steps'].split(',')
+    assert [g['generation'] for g in storage.list_generations("SN-1")] == [2]
+
+
+def test_init_db_skips_schema_when_up_to_date(storage, monkeypatch):
+    """Test que verifica que con user_version al día init_db no ejecuta DDL."""
+    import sqlite3
+    from storage import SCHEMA_VERSION
+
+    statements = []
+    connect = storage._connect
+
+    def traced_connect(**kwargs):
+        conn = connect(**kwargs)
+        conn.set_trace_callback(statements.append)
+        return conn
+
+    monkeypatch.setattr(storage, '_connect', traced_connect)
+    storage.init_db()
+
+    assert statements == ["PRAGMA user_version"]
+    version = sqlite3.connect(storage.db_path).execute("PRAGMA user_version").fetchone()[0]
+    assert version == SCHEMA_VERSION
+
+
+def test_init_db_migrates_old_schema(tmp_path):
+    """Test que verifica que una base de datos antigua se migra al abrirla."""
+    import sqlite3
+
+    db = str(tmp_path / 'antigua.db')
+    conn = sqlite3.connect(db)
+    conn.executescript("""
+        CREATE TABLE scans (id INTEGER PRIMARY KEY AUTOINCREMENT,
+                            serial_number TEXT NOT NULL UNIQUE, volume_name TEXT,
+                            drive_path TEXT NOT NULL, scan_date TIMESTAMP,
+                            total_directories INTEGER DEFAULT 0,
+                            created_at TIMESTAMP);
+        CREATE TABLE directories (id INTEGER PRIMARY KEY AUTOINCREMENT,
+                                  scan_id INTEGER NOT NULL, directory_path TEXT NOT NULL);
+        INSERT INTO scans (serial_number, volume_name, drive_path, total_directories)
+        VALUES ('SN-OLD', 'Viejo', 'D:\\', 1);
+        INSERT INTO directories (scan_id, directory_path) VALUES (1, 'D:\\Antiguo');
+    """)
+    conn.close()
+
+    storage = ScanStorage(db)
+
+    assert storage.get_scan_by_serial("SN-OLD")['generation'] == 1
+    assert storage.list_generations("SN-OLD")[0]['total_directories'] == 1
+    assert storage.search_directories("antiguo")[0]['directory_path'] == "D:\\Antiguo"
+
+
+def _add_many(storage, count=2000):
+    directories = ["D:\\"] + [f"D:\\datos\\carpeta_{n:05d}" for n in range(count)]
+    storage.add_scan("SN-2", "Zeta", "D:\\", directories[:10])
+    storage.add_scan("SN-1", "Alfa", "D:\\", directories)
+
+
+def test_bounded_search_orders_and_limits_in_sql(storage):
+    """Test que verifica que la búsqueda acotada devuelve lo mismo que la normal."""
+    _add_many(storage)
+
+    outcome = storage.search_directories_bounded("carpeta", limit=25, timeout=10)
+
+    assert outcome['truncated'] is False
+    assert outcome['results'] == storage.search_directories("carpeta", limit=25)
+    assert outcome['results'][0]['volume_name'] == "Alfa"
+
+
+def test_bounded_search_truncates_on_deadline(storage, monkeypatch):
+    """Test que verifica que al agotarse el plazo se devuelve un resultado vacío marcado como truncado."""
+    import storage as storage_module
+    monkeypatch.setattr(storage_module, 'SEARCH_PROGRESS_STEPS', 100)
+    _add_many(storage)
+
+    outcome = storage.search_directories_bounded("carpeta", limit=25, timeout=0)
+
+    assert outcome['truncated'] is True
+    assert outcome['cancelled'] is False
+    assert outcome['results'] == []
+
+
+def test_bounded_search_cancellation(storage, monkeypatch):
+    """Test que verifica que un evento de cancelación activo detiene la consulta."""
+    import threading
+    import storage as storage_module
+    monkeypatch.setattr(storage_module, 'SEARCH_PROGRESS_STEPS', 100)
+    _add_many(storage)
+    cancel = threading.Event()
+    cancel.set()
+
+    outcome = storage.search_directories_bounded("carpeta", cancel_event=cancel)
+
+    assert outcome['truncated'] is True
+    assert outcome['cancelled'] is True
+
+
+CATALOGS = [
+    # serial, nombre, fecha, bytes (con empates en cada criterio)
+    ("SN-1", "Beta", "2024-01-02 10:00:00", 500),
+    ("SN-2", "alfa", "2024-01-01 10:00:00", None),
+    ("SN-3", "Alfa", "2024-01-02 10:00:00", 500),
+    ("SN-4", "Gamma", "2024-01-03 10:00:00", 100),
+    ("SN-5", "beta", "2024-01-02 10:00:00", 900),
+    ("SN-6", None, "2024-01-01 10:00:00", 100),
+    ("SN-7", "Delta", "2024-01-04 10:00:00", 500),
+]
+
+
+def _add_catalogs(storage):
+    import sqlite3
+    for serial, name, _, _ in CATALOGS:
+        storage.add_scan(serial, name, "D:\\", ["D:\\"])
+    with sqlite3.connect(storage.db_path) as conn:
+        conn.executemany("""
+            UPDATE scans SET volume_name = ?, scan_date = ?, total_bytes = ? WHERE serial_number = ?
+        """, [(name, date, size, serial) for serial, name, date, size in CATALOGS])
+
+
+def _expected_order(sort, descending):
+    keys = {
+        'date': lambda c: c[2],
+        'name': lambda c: (c[1] or '').lower(),
+        'size': lambda c: -1 if c[3] is None else c[3],
+    }
+    # El id sigue el orden de inserción y desempata
+    ordered = sorted(enumerate(CATALOGS), key=lambda item: (keys[sort](item[1]), item[0]),
+                     reverse=descending)
+    return [catalog[0] for _, catalog in ordered]
+
+
+def _page_through(storage, limit=2, **kwargs):
+    serials, after, pages = [], None, 0
+    while True:
+        page = storage.list_catalogs(after=after, limit=limit, **kwargs)
+        serials.extend(catalog['serial_number'] for catalog in page['catalogs'])
+        pages += 1
+        after = page['next']
+        if after is None:
+            return serials, pages
+
+
+def test_keyset_paging_across_sort_keys_and_ties(storage):
+    """Test que verifica que recorrer las páginas devuelve cada catálogo una vez y en orden."""
+    _add_catalogs(storage)
+
+    for sort in ('date', 'name', 'size'):
+        for descending in (True, False):
+            serials, pages = _page_through(storage, sort=sort, descending=descending)
+            assert serials == _expected_order(sort, descending), (sort, descending)
+            assert pages == 4
+
+
+def test_keyset_paging_unaffected_by_new_catalogs(storage):
+    """Test que verifica que un catálogo añadido entre páginas no desplaza los resultados."""
+    _add_catalogs(storage)
+    first = storage.list_catalogs(sort='name', descending=False, limit=3)
+
+    storage.add_scan("SN-0", "Aaa", "D:\\", ["D:\\"])
+    second = storage.list_catalogs(sort='name', descending=False, limit=3, after=first['next'])
+
+    assert [c['serial_number'] for c in first['catalogs'] + second['catalogs']] == \
+        _expected_order('name', False)[:6]
+    assert first['total'] == 7
+    assert 'total' not in second
+
+
+def test_keyset_paging_with_filter_and_fields(storage):
+    """Test que verifica el filtro por nombre o serial y la selección de campos."""
+    _add_catalogs(storage)
+
+    page = storage.list_catalogs(sort='size', name_filter="alfa", fields=['serial_number'])
+    serials, _ = _page_through(storage, limit=1, sort='name', name_filter="beta")
+
+    assert page == {'catalogs': [{'serial_number': "SN-3"}, {'serial_number': "SN-2"}],
+                    'next': None, 'total': 2}
+    assert serials == ["SN-5", "SN-1"]
+
+
+def test_catalog_filter_matches_wildcards_literally(storage):
+    """Test que verifica que % y _ del filtro se buscan como texto, no como comodines."""
+    for serial, name in [("SN-1", "foto_2024"), ("SN-2", "fotoX2024"),
+                         ("SN-3", "100% fotos"), ("SN-4", "1000 fotos"), ("SN-5", "C:\\copia")]:
+        storage.add_scan(serial, name, "D:\\", ["D:\\"])
+
+    def matching(text):
+        page = storage.list_catalogs(sort='name', descending=False, name_filter=text)
+        return [catalog['serial_number'] for catalog in page['catalogs']]
+
+    assert matching("foto_") == ["SN-1"]
+    assert matching("100%") == ["SN-3"]
+    assert matching("C:\\c") == ["SN-5"]
+    assert storage.list_catalogs(name_filter="_")['total'] == 1
+
+
+def test_keyset_paging_rejects_invalid_input(storage):
+    """Test que verifica que un criterio, un campo o un cursor no válidos devuelven None."""
+    import base64
+    _add_catalogs(storage)
+    bad_cursor = base64.urlsafe_b64encode(b'["x","no-es-id"]').decode('ascii')
+
+    assert storage.list_catalogs(sort='serial') is None
+    assert storage.list_catalogs(fields=['id']) is None
+    assert storage.list_catalogs(after="%%%") is None
+    assert storage.list_catalogs(after=bad_cursor) is None
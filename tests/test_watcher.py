@@ -0,0 +1,145 @@
+"""
+Pruebas de la vigilancia en vivo (watcher.py y apply_directory_changes).
+"""
+
+import os
+import sqlite3
+import time
+
+from watcher import DriveWatcher, same_serial
+
+
+TREE = ["D:\\", "D:\\Fotos", "D:\\Fotos\\2023", "D:\\Fotos\\2024", "D:\\Música"]
+
+
+def _fingerprints(storage, path):
+    """Huellas de las filas de una ruta: (gen_added, gen_removed, huella)."""
+    return sqlite3.connect(storage.db_path).execute("""
+        SELECT gen_added, gen_removed, fingerprint FROM directories
+        WHERE directory_path = ? ORDER BY id
+    """, (path,)).fetchall()
+
+
+def _wait_for(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "la condición no se cumplió a tiempo"
+        time.sleep(0.02)
+
+
+def test_apply_create_delete_and_move(storage):
+    """Test que verifica las tres operaciones sobre la generación vigente."""
+    storage.add_scan("SN-1", "Backup", "D:\\", TREE)
+
+    result = storage.apply_directory_changes("SN-1", [
+        ('create', "D:\\Fotos\\2025"),
+        ('delete', "D:\\Música"),
+        ('move', "D:\\Fotos", "D:\\Imágenes"),
+    ])
+
+    scan = storage.get_scan_by_serial("SN-1")
+    assert storage.get_directories_by_scan(scan['id']) == [
+        "D:\\", "D:\\Imágenes", "D:\\Imágenes\\2023", "D:\\Imágenes\\2024", "D:\\Imágenes\\2025"]
+    assert scan['total_directories'] == 5
+    assert scan['generation'] == 1
+    assert result == {'added': 5, 'removed': 5}
+    assert storage.apply_directory_changes("SN-X", [('create', "X:\\a")]) is None
+
+
+def test_live_changes_keep_earlier_generations(storage):
+    """Test que verifica que las huellas de generaciones anteriores no se modifican."""
+    storage.add_scan("SN-1", "Backup", "D:\\", TREE)
+    storage.add_scan("SN-1", "Backup", "D:\\", TREE + ["D:\\Música\\Jazz"])
+
+    storage.apply_directory_changes("SN-1", [('create', "D:\\Fotos\\2025")])
+
+    rows = _fingerprints(storage, "D:\\Fotos")
+    # La fila de la generación 1 sigue con su huella para las consultas "a fecha de"
+    assert rows[0][:2] == (1, 2) and rows[0][2] is not None
+    assert rows[1] == (2, None, None)
+    assert [r['directory_path'] for r in storage.search_directories("2025", "SN-1", generation=1)] == []
+    assert storage.diff_generations("SN-1", 1)['added'] == ["D:\\Fotos\\2025", "D:\\Música\\Jazz"]
+
+    latest = storage.list_generations("SN-1")[0]
+    assert (latest['added_directories'], latest['removed_directories']) == (2, 0)
+
+
+def test_live_changes_update_rows_of_current_generation_in_place(storage):
+    """Test que verifica que las filas creadas en la generación vigente no se duplican."""
+    storage.add_scan("SN-1", "Backup", "D:\\", TREE)
+
+    storage.apply_directory_changes("SN-1", [('create', "D:\\Fotos\\2025")])
+
+    assert _fingerprints(storage, "D:\\Fotos") == [(1, None, None)]
+
+
+def test_invalidated_folders_leave_duplicate_report(storage):
+    """Test que verifica que una carpeta modificada en vivo deja de contar como duplicada."""
+    storage.add_scan("SN-1", "A", "D:\\", ["D:\\", "D:\\Copia", "D:\\Copia\\x"])
+    storage.add_scan("SN-2", "B", "E:\\", ["E:\\", "E:\\Copia", "E:\\Copia\\x"])
+    assert len(storage.find_duplicate_directories()) == 1
+
+    storage.apply_directory_changes("SN-1", [('create', "D:\\Copia\\y")])
+
+    assert storage.find_duplicate_directories() == []
+
+
+def test_same_serial():
+    """Test que verifica la comparación de seriales de volumen y de catálogo."""
+    assert same_serial("44fa-62aa", "44FA-62AA")
+    assert same_serial("0123456789ABCDEF", "89AB-CDEF")
+    assert not same_serial("44FA-62AB", "44FA-62AA")
+
+
+def _catalog_folder(storage, tmp_path, serial="SN-1"):
+    root = tmp_path / 'disco'
+    (root / 'fotos').mkdir(parents=True)
+    storage.add_scan(serial, "Disco", str(root), [str(root), str(root / 'fotos')])
+    return root
+
+
+def test_watcher_refuses_other_volume(storage, tmp_path):
+    """Test que verifica que no se vigila una unidad con otro serial o sin serial legible."""
+    _catalog_folder(storage, tmp_path)
+
+    other = DriveWatcher(storage, "SN-1", use_inotify=False, identify=lambda path: "OTRO")
+    unknown = DriveWatcher(storage, "SN-1", use_inotify=False, identify=lambda path: None)
+
+    assert other.start() is False
+    assert 'no corresponde' in other.last_error
+    assert unknown.start() is False
+    assert not other.running and not unknown.running
+
+
+def test_polling_watcher_applies_changes(storage, tmp_path, caplog):
+    """Test que verifica el sondeo por turnos aplicando una carpeta nueva al catálogo."""
+    root = _catalog_folder(storage, tmp_path)
+    caplog.set_level('INFO', logger='watcher')
+    watcher = DriveWatcher(storage, "SN-1", use_inotify=False, batch_seconds=0,
+                           poll_interval=0.02, poll_max_directories=1,
+                           identify=lambda path: "SN-1")
+    assert watcher.start() is True
+    try:
+        # El sondeo anuncia el arranque tras tomar las marcas de tiempo iniciales
+        _wait_for(lambda: 'por sondeo' in caplog.text)
+        os.mkdir(root / 'fotos' / 'nueva')
+        _wait_for(lambda: storage.search_directories("nueva"))
+    finally:
+        watcher.stop(5)
+
+    assert watcher.status()['operations_applied'] == 1
+    assert watcher.last_error is None
+
+
+def test_polling_watcher_stops_when_volume_changes(storage, tmp_path, monkeypatch):
+    """Test que verifica que el sondeo se detiene si cambia el volumen montado."""
+    root = _catalog_folder(storage, tmp_path)
+    watcher = DriveWatcher(storage, "SN-1", use_inotify=False, poll_interval=0.02,
+                           verify_serial=False)
+    assert watcher.start() is True
+    monkeypatch.setattr(watcher, '_same_volume', lambda: False)
+    os.mkdir(root / 'fotos' / 'otra')
+
+    _wait_for(lambda: not watcher.running)
+
+    assert storage.search_directories("otra") == []
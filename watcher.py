@@ -0,0 +1,517 @@
+"""
+Vigilancia en vivo de unidades catalogadas
+==========================================
+
+Mantiene al día el catálogo de una unidad conectada sin volver a recorrerla:
+escucha la creación, el renombrado y la eliminación de carpetas y los aplica
+por lotes con ``ScanStorage.apply_directory_changes`` (una transacción pequeña
+cada ``BATCH_SECONDS``).
+
+Backends:
+    - inotify (Linux): un watch por carpeta, registrado a partir de las rutas
+      ya catalogadas, sin leer el contenido de la unidad
+    - Sondeo: compara la fecha de modificación de las carpetas catalogadas y
+      solo lista las que cambiaron, como mucho ``POLL_MAX_DIRECTORIES`` por
+      pasada. Se usa fuera de Linux o si se agota ``fs.inotify.max_user_watches``
+
+Antes de vigilar se comprueba que el número de serie del volumen montado
+coincide con el del catálogo (``volume_serial``), y el sondeo comprueba en
+cada pasada que sigue montado el mismo volumen, para no aplicar los cambios de
+otro disco conectado en la misma ruta.
+
+Conviene iniciar la vigilancia justo después de un escaneo o actualización:
+los cambios anteriores al arranque no se detectan.
+
+Autor: Paulo Felix
+Versión: 1.0.0
+Licencia: MIT
+"""
+
+import ctypes
+import ctypes.util
+import errno
+import logging
+import os
+import platform
+import select
+import struct
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Set, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Segundos que se acumulan eventos antes de aplicarlos en una transacción
+BATCH_SECONDS = 2.0
+
+# Operaciones que fuerzan la aplicación del lote sin esperar
+BATCH_MAX_OPERATIONS = 500
+
+# Segundos entre pasadas del backend de sondeo
+POLL_INTERVAL = 30.0
+
+# Carpetas cuya fecha consulta cada pasada del sondeo; con más carpetas se
+# recorren por turnos, de modo que una vuelta completa ocupa varias pasadas
+POLL_MAX_DIRECTORIES = 20000
+
+# Constantes de inotify (linux/inotify.h)
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_UNMOUNT = 0x00002000
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+IN_DONT_FOLLOW = 0x02000000
+IN_ISDIR = 0x40000000
+IN_CLOEXEC = 0o2000000
+IN_NONBLOCK = 0o4000
+
+WATCH_MASK = (IN_CREATE | IN_DELETE | IN_MOVED_FROM | IN_MOVED_TO | IN_DELETE_SELF
+              | IN_MOVE_SELF | IN_ONLYDIR | IN_DONT_FOLLOW)
+
+_EVENT = struct.Struct('iIII')
+
+
+class WatchLimitError(OSError):
+    """Se agotaron los watches de inotify del usuario."""
+
+
+def _load_inotify():
+    """Carga las funciones de inotify de la libc, o None si no están disponibles."""
+    if platform.system() != 'Linux':
+        return None
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+        libc.inotify_init1.argtypes = [ctypes.c_int]
+        libc.inotify_add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+        libc.inotify_rm_watch.argtypes = [ctypes.c_int, ctypes.c_int]
+        return libc
+    except (OSError, AttributeError):
+        return None
+
+
+def volume_serial(path: str) -> Optional[str]:
+    """
+    Obtiene el número de serie del volumen que contiene ``path``.
+
+    En Windows es el serial del comando ``vol`` (ej: ``44FA-62AA``); en Linux,
+    el UUID del sistema de archivos según ``/dev/disk/by-uuid``.
+
+    Returns:
+        Optional[str]: Serial del volumen o None si no se puede determinar
+    """
+    if platform.system() == 'Windows':
+        from scanner import get_volume_info_windows
+        drive = os.path.splitdrive(os.path.abspath(path))[0]
+        return get_volume_info_windows(drive[:1].upper())[1] if drive else None
+    try:
+        device = os.stat(path).st_dev
+        with os.scandir('/dev/disk/by-uuid') as entries:
+            for entry in entries:
+                try:
+                    if os.stat(entry.path).st_rdev == device:
+                        return entry.name
+                except OSError:
+                    continue
+    except OSError:
+        pass
+    return None
+
+
+def same_serial(volume: str, catalog: str) -> bool:
+    """
+    Compara el serial de un volumen con el de un catálogo.
+
+    Ignora mayúsculas y guiones, y acepta que el catálogo guarde el serial
+    corto de Windows (8 cifras) de un volumen NTFS, cuyo UUID en Linux tiene 16.
+    """
+    volume = volume.replace('-', '').upper()
+    catalog = catalog.replace('-', '').upper()
+    return volume == catalog or (len(catalog) == 8 and len(volume) == 16
+                                 and volume.endswith(catalog))
+
+
+def _walk_subdirectories(path: str) -> List[str]:
+    """Carpetas descendientes de ``path`` (solo se usa para subárboles nuevos)."""
+    found = []
+    pending = [path]
+    while pending:
+        current = pending.pop()
+        try:
+            with os.scandir(current) as entries:
+                for entry in entries:
+                    try:
+                        if entry.is_dir(follow_symlinks=False):
+                            found.append(entry.path)
+                            pending.append(entry.path)
+                    except OSError:
+                        continue
+        except OSError:
+            continue
+    return found
+
+
+class DriveWatcher:
+    """
+    Vigila una unidad catalogada y aplica sus cambios de carpetas al catálogo.
+
+    Un hilo recoge los eventos del backend; las operaciones se agrupan y se
+    aplican cada ``batch_seconds`` o al llegar a ``BATCH_MAX_OPERATIONS``. Si la
+    unidad se desmonta o el catálogo desaparece, la vigilancia se detiene.
+    """
+
+    def __init__(self, storage, serial_number: str, root: Optional[str] = None,
+                 batch_seconds: float = BATCH_SECONDS, poll_interval: float = POLL_INTERVAL,
+                 poll_max_directories: int = POLL_MAX_DIRECTORIES,
+                 use_inotify: bool = True, verify_serial: bool = True,
+                 identify: Callable[[str], Optional[str]] = volume_serial):
+        """
+        Args:
+            storage (ScanStorage): Almacenamiento del catálogo
+            serial_number (str): Número de serie del catálogo a mantener
+            root (Optional[str]): Punto de montaje actual (por defecto la ruta
+                guardada en el catálogo)
+            batch_seconds (float): Segundos que se acumulan eventos por lote
+            poll_interval (float): Periodo del backend de sondeo
+            poll_max_directories (int): Carpetas consultadas por pasada del sondeo
+            use_inotify (bool): Permitir inotify (False fuerza el sondeo)
+            verify_serial (bool): Exigir que el serial del volumen montado
+                coincida con el del catálogo (False si no se puede leer, ej:
+                catálogos con un serial elegido a mano)
+            identify (Callable[[str], Optional[str]]): Obtiene el serial del
+                volumen de una ruta
+        """
+        self.storage = storage
+        self.serial_number = serial_number
+        self.root = root
+        self.batch_seconds = batch_seconds
+        self.poll_interval = poll_interval
+        self.poll_max_directories = max(1, poll_max_directories)
+        self.use_inotify = use_inotify
+        self.verify_serial = verify_serial
+        self.identify = identify
+
+        self.backend = None
+        self.drive_path = None
+        self.batches = 0
+        self.operations_applied = 0
+        self.events_lost = False
+        self.last_error = None
+
+        self._lock = threading.Lock()
+        self._pending: List[Tuple[str, ...]] = []
+        self._first_pending = None
+        self._stop = threading.Event()
+        self._thread = None
+        self._device = None
+
+    # -- Ciclo de vida -----------------------------------------------------
+
+    def start(self) -> bool:
+        """
+        Comprueba que la unidad del catálogo está conectada y arranca la vigilancia.
+
+        Returns:
+            bool: False si el catálogo no existe, la unidad no está montada o
+                el volumen montado no es el del catálogo
+        """
+        scan_info = self.storage.get_scan_by_serial(self.serial_number)
+        if not scan_info:
+            self.last_error = 'Catálogo no encontrado'
+            return False
+        self.drive_path = scan_info['drive_path']
+        self.root = self.root or self.drive_path
+        if not os.path.isdir(self.root):
+            self.last_error = f'La unidad {self.root} no está conectada'
+            return False
+        if self.verify_serial:
+            serial = self.identify(self.root)
+            if serial is None:
+                self.last_error = (f'No se pudo leer el número de serie de la unidad {self.root} '
+                                   f'para comprobar que es la del catálogo')
+                return False
+            if not same_serial(serial, self.serial_number):
+                self.last_error = (f'La unidad conectada en {self.root} (serie {serial}) '
+                                   f'no corresponde al catálogo')
+                return False
+        self._device = os.stat(self.root).st_dev
+
+        paths = [self._to_local(path) for path in
+                 self.storage.get_directories_by_scan(scan_info['id'])]
+        self._thread = threading.Thread(target=self._run, args=(paths,), daemon=True,
+                                        name=f'scanfolder-watch-{self.serial_number}')
+        self._thread.start()
+        return True
+
+    def stop(self, timeout: Optional[float] = None):
+        """Detiene la vigilancia aplicando antes los cambios pendientes."""
+        self._stop.set()
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join(timeout)
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def status(self) -> Dict:
+        """Estado de la vigilancia para la API y la CLI."""
+        with self._lock:
+            pending = len(self._pending)
+        return {
+            'serial_number': self.serial_number,
+            'root': self.root,
+            'backend': self.backend,
+            'running': self.running,
+            'batches': self.batches,
+            'operations_applied': self.operations_applied,
+            'pending_operations': pending,
+            'events_lost': self.events_lost,
+            'last_error': self.last_error
+        }
+
+    def _run(self, paths: List[str]):
+        try:
+            libc = _load_inotify() if self.use_inotify else None
+            if libc is not None:
+                try:
+                    self.backend = 'inotify'
+                    self._run_inotify(libc, paths)
+                    return
+                except WatchLimitError:
+                    logger.warning(f"Límite de watches de inotify alcanzado en {self.root}; "
+                                   f"se usa el sondeo")
+            self.backend = 'polling'
+            self._run_polling(paths)
+        except Exception as e:
+            self.last_error = str(e)
+            logger.error(f"Error vigilando {self.serial_number}: {e}")
+        finally:
+            self._flush()
+            logger.info(f"Vigilancia de {self.serial_number} detenida")
+
+    # -- Lotes -------------------------------------------------------------
+
+    def _record(self, *operation: str):
+        with self._lock:
+            if not self._pending:
+                self._first_pending = time.monotonic()
+            self._pending.append(operation)
+
+    def _flush_due(self) -> bool:
+        with self._lock:
+            return bool(self._pending) and (
+                len(self._pending) >= BATCH_MAX_OPERATIONS
+                or time.monotonic() - self._first_pending >= self.batch_seconds)
+
+    def _flush(self):
+        with self._lock:
+            operations, self._pending = self._pending, []
+        if not operations:
+            return
+        catalog_operations = [(kind, *(self._to_catalog(path) for path in paths))
+                              for kind, *paths in operations]
+        result = self.storage.apply_directory_changes(self.serial_number, catalog_operations)
+        if result is None:
+            # Catálogo eliminado o error de base de datos: no seguir acumulando
+            self.last_error = 'No se pudieron aplicar los cambios al catálogo'
+            self._stop.set()
+            return
+        self.batches += 1
+        self.operations_applied += len(operations)
+
+    def _to_catalog(self, path: str) -> str:
+        """Traduce una ruta del punto de montaje actual a la guardada en el catálogo."""
+        if self.root == self.drive_path:
+            return path
+        return self.drive_path.rstrip('\\/') + path[len(self.root.rstrip('\\/')):]
+
+    def _to_local(self, path: str) -> str:
+        if self.root == self.drive_path:
+            return path
+        return self.root.rstrip('\\/') + path[len(self.drive_path.rstrip('\\/')):]
+
+    def _is_root(self, path: str) -> bool:
+        return os.path.normpath(path) == os.path.normpath(self.root)
+
+    def _same_volume(self) -> bool:
+        """True si en la ruta vigilada sigue montado el volumen comprobado al arrancar."""
+        try:
+            return os.stat(self.root).st_dev == self._device
+        except OSError:
+            return False
+
+    # -- Backend inotify ---------------------------------------------------
+
+    def _run_inotify(self, libc, paths: List[str]):
+        fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if fd < 0:
+            raise OSError(ctypes.get_errno(), 'inotify_init1')
+        watches: Dict[int, str] = {}
+        moves: Dict[int, str] = {}
+
+        def add_watch(path: str) -> bool:
+            wd = libc.inotify_add_watch(fd, os.fsencode(path), WATCH_MASK)
+            if wd < 0:
+                error = ctypes.get_errno()
+                if error == errno.ENOSPC:
+                    raise WatchLimitError(error, 'inotify_add_watch')
+                return False  # carpeta ya eliminada o sin permisos
+            watches[wd] = path
+            return True
+
+        def add_tree(path: str):
+            # Subárbol nuevo: vigilarlo y registrar las carpetas que ya contenga
+            add_watch(path)
+            self._record('create', path)
+            for child in _walk_subdirectories(path):
+                add_watch(child)
+                self._record('create', child)
+
+        def rename_watches(old: str, new: str):
+            prefix = old.rstrip(os.sep) + os.sep
+            for wd, path in list(watches.items()):
+                if path == old:
+                    watches[wd] = new
+                elif path.startswith(prefix):
+                    watches[wd] = new + path[len(old):]
+
+        try:
+            for index, path in enumerate(paths):
+                add_watch(path)
+                if index % 10000 == 0 and self._stop.is_set():
+                    return
+            logger.info(f"Vigilando {self.root} con inotify ({len(watches)} carpetas)")
+
+            while not self._stop.is_set():
+                ready, _, _ = select.select([fd], [], [], min(0.5, self.batch_seconds))
+                if ready:
+                    data = os.read(fd, 64 * 1024)
+                    offset = 0
+                    while offset < len(data):
+                        wd, mask, cookie, length = _EVENT.unpack_from(data, offset)
+                        offset += _EVENT.size
+                        name = os.fsdecode(data[offset:offset + length].rstrip(b'\0'))
+                        offset += length
+
+                        if mask & IN_Q_OVERFLOW:
+                            self.events_lost = True
+                            logger.warning(f"Se perdieron eventos de {self.root}; "
+                                           f"actualice el catálogo para resincronizarlo")
+                            continue
+                        parent = watches.get(wd)
+                        if mask & IN_IGNORED:
+                            watches.pop(wd, None)
+                            continue
+                        if parent is None:
+                            continue
+                        if mask & (IN_UNMOUNT | IN_DELETE_SELF | IN_MOVE_SELF) and self._is_root(parent):
+                            logger.info(f"La unidad {self.root} ya no está disponible")
+                            self._stop.set()
+                            break
+                        if not mask & IN_ISDIR:
+                            continue
+
+                        path = os.path.join(parent, name)
+                        if mask & IN_CREATE:
+                            add_tree(path)
+                        elif mask & IN_DELETE:
+                            self._record('delete', path)
+                        elif mask & IN_MOVED_FROM:
+                            moves[cookie] = path
+                        elif mask & IN_MOVED_TO:
+                            source = moves.pop(cookie, None)
+                            if source is None:
+                                add_tree(path)  # movida desde fuera de la unidad
+                            else:
+                                rename_watches(source, path)
+                                self._record('move', source, path)
+
+                # Salidas sin su IN_MOVED_TO: movidas fuera de la unidad
+                if moves and not ready:
+                    for source in moves.values():
+                        self._record('delete', source)
+                    moves.clear()
+                if self._flush_due():
+                    self._flush()
+        finally:
+            os.close(fd)
+
+    # -- Backend de sondeo -------------------------------------------------
+
+    def _run_polling(self, paths: List[str]):
+        mtimes: Dict[str, int] = {}
+        children: Dict[str, Set[str]] = {}
+        for path in paths:
+            try:
+                mtimes[path] = os.stat(path).st_mtime_ns
+            except OSError:
+                continue
+        for path in mtimes:
+            parent = os.path.dirname(path.rstrip(os.sep)) if not self._is_root(path) else None
+            if parent in mtimes:
+                children.setdefault(parent, set()).add(path)
+        logger.info(f"Vigilando {self.root} por sondeo ({len(mtimes)} carpetas, "
+                    f"{self.poll_max_directories} por pasada)")
+        position = 0
+
+        def forget(path: str):
+            prefix = path.rstrip(os.sep) + os.sep
+            for known in [p for p in mtimes if p == path or p.startswith(prefix)]:
+                mtimes.pop(known, None)
+                children.pop(known, None)
+
+        def remember(path: str, parent: str):
+            children.setdefault(parent, set()).add(path)
+            try:
+                mtimes[path] = os.stat(path).st_mtime_ns
+            except OSError:
+                pass
+
+        while not self._stop.wait(self.poll_interval):
+            if not self._same_volume():
+                # Desmontada, o sustituida por otro disco en la misma ruta
+                logger.info(f"La unidad {self.root} ya no está disponible")
+                break
+            # Turno de esta pasada: como mucho poll_max_directories carpetas
+            known_paths = list(mtimes)
+            if position >= len(known_paths):
+                position = 0
+            turn = known_paths[position:position + self.poll_max_directories]
+            position += len(turn)
+            for path in turn:
+                if self._stop.is_set():
+                    break
+                if path not in mtimes:
+                    continue  # eliminada en esta misma pasada
+                try:
+                    mtime = os.stat(path).st_mtime_ns
+                except OSError:
+                    continue  # el padre detecta la eliminación
+                if mtime == mtimes[path]:
+                    continue
+                mtimes[path] = mtime
+
+                try:
+                    with os.scandir(path) as entries:
+                        current = {entry.path for entry in entries
+                                   if entry.is_dir(follow_symlinks=False)}
+                except OSError:
+                    continue
+                known = children.get(path, set())
+                for gone in known - current:
+                    self._record('delete', gone)
+                    forget(gone)
+                for new in sorted(current - known):
+                    self._record('create', new)
+                    remember(new, path)
+                    for child in _walk_subdirectories(new):
+                        self._record('create', child)
+                        remember(child, os.path.dirname(child))
+                children[path] = current
+                if self._flush_due():
+                    self._flush()
+            self._flush()